@@ -5,20 +5,63 @@ import os
 import json
 import base64
 import re
+import time
+from typing import Dict, Iterator, List
 from Model.Model_Vector_DB import VectorDB
+from Model.Model_provider import get_vector_db
+from LLM_Model.Model_response_cache import SemanticResponseCache
 
 load_dotenv()
 
+# Question used for image-only requests, both for retrieval and in the prompt
+IMAGE_ONLY_QUESTION = "ช่วยวิเคราะห์รูปภาพนี้"
+
 class Gemini:
-    def __init__(self):
+    def __init__(self, vector_db: VectorDB = None):
         self.systemagent = "คุณเป็นผู้เชี่ยวชาญด้านโรคพืชและการดูแลพืช สามารถให้ข้อมูลเกี่ยวกับโรคพืช, อาการ, สาเหตุ, วิธีการรักษา และการป้องกันโรคพืชต่างๆ รวมถึงแนะนำการดูแลพืช เช่น การรดน้ำ, แสงแดด, และการจัดการกับศัตรูพืชให้พืชมีสุขภาพดี"
         genai.configure(api_key=os.getenv("APIKEY"))
         self.model = genai.GenerativeModel(os.getenv("MODEL"))
-        self.vector_db = VectorDB()
-
-    def _get_relevant_context(self, text: str, k: int = 3) -> str:
-        """Get relevant context from vector DB"""
-        results = self.vector_db.search_for_rag(text, k)
+        self._vector_db = vector_db
+        # Opt-in cache of answers for near-identical questions over the same retrieved chunks
+        self.response_cache_enabled = os.getenv("RESPONSE_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+        self.response_cache = SemanticResponseCache(
+            max_entries=int(os.getenv("RESPONSE_CACHE_SIZE", 512)),
+            threshold=float(os.getenv("RESPONSE_CACHE_THRESHOLD", 0.95)),
+            ttl=float(os.getenv("RESPONSE_CACHE_TTL", 3600))
+        )
+        self._cache_source = None
+
+    @property
+    def vector_db(self) -> VectorDB:
+        """Vector DB shared with the upload routes unless one was injected"""
+        db = self._vector_db if self._vector_db is not None else get_vector_db()
+        if db is not self._cache_source:
+            # New (or reloaded) DB: cached answers may cite chunks it does not have
+            self.response_cache.clear()
+            db.add_change_listener(self.response_cache.invalidate_documents)
+            self._cache_source = db
+        return db
+
+    def retrieve(self, text: str = None, image: str = None, agent: bool = False, k: int = 3) -> List[Dict]:
+        """Retrieve RAG results for agent mode (empty list when agent is off)"""
+        if not agent or (not text and not image):
+            return []
+        return self.vector_db.search_for_rag(text if text else IMAGE_ONLY_QUESTION, k)
+
+    @staticmethod
+    def citations(results: List[Dict]) -> List[Dict]:
+        """Compact source list for the client (no chunk text)"""
+        return [
+            {
+                'id': result['id'],
+                'source': result['metadata'].get('source', 'ไม่ระบุแหล่งที่มา'),
+                'chunk_id': result['metadata'].get('chunk_id'),
+                'relevance': result['relevance']
+            }
+            for result in results
+        ]
+
+    def _format_context(self, results: List[Dict]) -> str:
         if not results:
             return ""
             
@@ -30,6 +73,10 @@ class Gemini:
             
         return "\n".join(context_parts)
 
+    def _get_relevant_context(self, text: str, k: int = 3) -> str:
+        """Get relevant context from vector DB"""
+        return self._format_context(self.vector_db.search_for_rag(text, k))
+
     def _validate_base64(self, image_data: str) -> bool:
         """Validate base64 image data"""
         try:
@@ -46,78 +93,129 @@ class Gemini:
         except Exception:
             return False
 
-    def grminichat(self, text: str = None, image: str = None, agent: bool = False):
+    def _build_prompt(self, text: str, agent: bool, results: List[Dict]) -> str:
+        if agent:
+            # Build enhanced prompt with context
+            context = self._format_context(results)
+            if context:
+                return f"""ใช้ข้อมูลต่อไปนี้ในการตอบคำถาม:
+
+{context}
+
+คำถามหรือข้อความ: {text if text else IMAGE_ONLY_QUESTION}
+
+{self.systemagent}
+
+โปรดตอบโดยอ้างอิงข้อมูลที่ให้มาด้วย"""
+            return f"{self.systemagent} {text if text else IMAGE_ONLY_QUESTION}"
+        return text if text else IMAGE_ONLY_QUESTION
+
+    def _build_contents(self, prompt: str, image: str = None):
+        """Model input for a prompt and optional base64 image (raises ValueError on bad image data)"""
+        if not image:
+            return prompt
+
+        # Validate base64 data
+        if not self._validate_base64(image):
+            raise ValueError("รูปแบบข้อมูลรูปภาพไม่ถูกต้อง กรุณาตรวจสอบ base64 string")
+
+        # Clean and format image data
+        if not image.startswith('data:image/'):
+            image = 'data:image/jpeg;base64,' + image
+        
+        image_data = image.split('base64,')[1]
+        image_data = re.sub(r'\s+', '', image_data)
+
+        # Create content parts for the model
+        return [
+            {
+                "parts": [
+                    {"text": prompt},
+                    {
+                        "inline_data": {
+                            "mime_type": "image/jpeg",
+                            "data": image_data
+                        }
+                    }
+                ]
+            }
+        ]
+
+    def grminichat(self, text: str = None, image: str = None, agent: bool = False, use_cache: bool = None):
+        return "".join(self.grminichat_stream(text, image, agent, stream=False, use_cache=use_cache))
+
+    def grminichat_stream(self, text: str = None, image: str = None, agent: bool = False,
+                          results: List[Dict] = None, stream: bool = True,
+                          use_cache: bool = None) -> Iterator[str]:
+        """Yield the answer as the model generates it
+
+        Pass ``results`` from :meth:`retrieve` to skip retrieval (e.g. when the
+        caller already sent the citations to the client). ``use_cache`` turns the
+        response cache on or off for this call (None = RESPONSE_CACHE_ENABLED);
+        requests with an image are never cached.
+
+        With ``stream=True`` errors are raised to the caller (the chat route
+        turns them into ``event: error``); otherwise they are returned as the
+        answer text.
+        """
         try:
             # Handle empty inputs
             if not text and not image:
-                return "กรุณาระบุข้อความหรือรูปภาพ"
+                yield "กรุณาระบุข้อความหรือรูปภาพ"
+                return
 
             # Set default text for image-only requests
             if not text and image:
-                text = "ช่วยวิเคราะห์รูปภาพนี้"
+                text = IMAGE_ONLY_QUESTION
 
-            if agent:
-                # Get relevant context from vector DB
-                context = self._get_relevant_context(text if text else "โรคพืช")
-                
-                # Build enhanced prompt with context
-                if context:
-                    enhanced_prompt = f"""ใช้ข้อมูลต่อไปนี้ในการตอบคำถาม:
+            if results is None:
+                results = self.retrieve(text, image, agent)
 
-{context}
+            cache_key = None
+            if (self.response_cache_enabled if use_cache is None else use_cache) and not image:
+                query_vector = self.vector_db.encode_query(text)
+                cache_key = self.response_cache.context_key(
+                    [result['id'] for result in results], self.systemagent if agent else ""
+                )
+                cached = self.response_cache.lookup(query_vector, cache_key)
+                if cached is not None:
+                    yield cached
+                    return
 
-คำถามหรือข้อความ: {text if text else 'ช่วยวิเคราะห์รูปภาพนี้'}
+            prompt = self._build_prompt(text, agent, results)
+            print(f"Prompt: {prompt}")
 
-{self.systemagent}
-
-โปรดตอบโดยอ้างอิงข้อมูลที่ให้มาด้วย"""
-                    self.prompt = enhanced_prompt
-                else:
-                    self.prompt = f"{self.systemagent} {text if text else 'ช่วยวิเคราะห์รูปภาพนี้'}"
-            else:
-                self.prompt = text if text else "ช่วยวิเคราะห์รูปภาพนี้"
-
-            print(f"Prompt: {self.prompt}")
             # Process request based on inputs
-            if image:
-                try:
-                    # Validate base64 data
-                    if not self._validate_base64(image):
-                        return "รูปแบบข้อมูลรูปภาพไม่ถูกต้อง กรุณาตรวจสอบ base64 string"
-
-                    # Clean and format image data
-                    if not image.startswith('data:image/'):
-                        image = 'data:image/jpeg;base64,' + image
-                    
-                    image_data = image.split('base64,')[1]
-                    image_data = re.sub(r'\s+', '', image_data)
-
-                    # Create content parts for the model
-                    contents = [
-                        {
-                            "parts": [
-                                {"text": self.prompt},
-                                {
-                                    "inline_data": {
-                                        "mime_type": "image/jpeg",
-                                        "data": image_data
-                                    }
-                                }
-                            ]
-                        }
-                    ]
-
-                    response = self.model.generate_content(contents)
-                    return response.text
-
-                except Exception as img_error:
-                    print(f"Image processing error: {str(img_error)}")
-                    return "เกิดข้อผิดพลาดในการประมวลผลรูปภาพ: " + str(img_error)
-            else:
-                # For text-only request
-                response = self.model.generate_content(self.prompt)
-                return response.text
+            try:
+                contents = self._build_contents(prompt, image)
+            except ValueError as e:
+                if stream:
+                    raise
+                yield str(e)
+                return
+
+            try:
+                start = time.perf_counter()
+                parts = []
+                if stream:
+                    for chunk in self.model.generate_content(contents, stream=True):
+                        if chunk.text:
+                            parts.append(chunk.text)
+                            yield chunk.text
+                else:
+                    parts.append(self.model.generate_content(contents).text)
+                    yield parts[0]
+                if cache_key is not None:
+                    self.response_cache.store(query_vector, cache_key, [result['id'] for result in results],
+                                              "".join(parts), time.perf_counter() - start)
+            except Exception as model_error:
+                if not image or stream:
+                    raise
+                print(f"Image processing error: {str(model_error)}")
+                yield "เกิดข้อผิดพลาดในการประมวลผลรูปภาพ: " + str(model_error)
 
         except Exception as e:
             print(f"Error: {str(e)}")
-            return f"เกิดข้อผิดพลาด: {str(e)}"
\ No newline at end of file
+            if stream:
+                raise
+            yield f"เกิดข้อผิดพลาด: {str(e)}"
@@ -0,0 +1,135 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+
+class CachedResponse:
+    __slots__ = ('key', 'context_key', 'vector', 'doc_ids', 'answer', 'latency', 'created')
+
+    def __init__(self, key, context_key, vector, doc_ids, answer, latency):
+        self.key = key
+        self.context_key = context_key
+        self.vector = vector
+        self.doc_ids = doc_ids
+        self.answer = answer
+        self.latency = latency
+        self.created = time.monotonic()
+
+
+class SemanticResponseCache:
+    """Cache of model answers looked up by query-embedding similarity
+
+    An entry is only reused when the retrieved chunk ids and the system prompt
+    hash to the same context key and the cosine similarity of the query
+    embeddings is at least ``threshold``. Entries are evicted LRU by count and
+    by TTL, and dropped when one of their source chunks is updated or deleted.
+    """
+
+    def __init__(self, max_entries: int = 512, threshold: float = 0.95, ttl: Optional[float] = 3600):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.latency_saved = 0.0
+        self._entries = OrderedDict()   # key -> CachedResponse (LRU order)
+        self._by_context = {}           # context key -> set of entry keys
+        self._by_document = {}          # document id -> set of entry keys
+        self._next_key = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def context_key(doc_ids: Iterable[str], system_prompt: str) -> str:
+        digest = hashlib.sha256(system_prompt.encode('utf-8'))
+        for doc_id in doc_ids:
+            digest.update(b'\0' + doc_id.encode('utf-8'))
+        return digest.hexdigest()
+
+    @staticmethod
+    def _unit(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype='float32')
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, query_vector, context_key: str) -> Optional[str]:
+        query = self._unit(query_vector)
+        now = time.monotonic()
+        with self._lock:
+            best, best_score = None, self.threshold
+            for key in list(self._by_context.get(context_key, ())):
+                entry = self._entries[key]
+                if self.ttl and now - entry.created > self.ttl:
+                    self._remove(key)
+                    continue
+                score = float(np.dot(entry.vector, query))
+                if score >= best_score:
+                    best, best_score = entry, score
+            if best is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best.key)
+            self.hits += 1
+            self.latency_saved += best.latency
+            return best.answer
+
+    def store(self, query_vector, context_key: str, doc_ids: List[str], answer: str, latency: float):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            key = self._next_key
+            self._next_key += 1
+            self._entries[key] = CachedResponse(
+                key, context_key, self._unit(query_vector), tuple(doc_ids), answer, latency
+            )
+            self._by_context.setdefault(context_key, set()).add(key)
+            for doc_id in doc_ids:
+                self._by_document.setdefault(doc_id, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate_documents(self, doc_ids: Iterable[str]):
+        """Drop every cached answer built from one of these document chunks"""
+        with self._lock:
+            for doc_id in doc_ids:
+                for key in list(self._by_document.get(doc_id, ())):
+                    self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_context.clear()
+            self._by_document.clear()
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        keys = self._by_context.get(entry.context_key)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_context[entry.context_key]
+        for doc_id in entry.doc_ids:
+            keys = self._by_document.get(doc_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_document[doc_id]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'threshold': self.threshold,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'latency_saved_seconds': round(self.latency_saved, 3)
+            }
@@ -0,0 +1,115 @@
+# document_store.py
+import numpy as np
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from Tools.Tools_document import Document
+from Model.Model_Metadata_Index import UNINDEXED_FIELDS
+
+
+class DocumentStore:
+    """ที่เก็บเอกสารในหน่วยความจำแบบแยกคอลัมน์ ใช้ FAISS id (แถวใน VectorStore) เป็นตำแหน่ง
+
+    คอลัมน์ต่อแถว: doc id, ข้อความ และ metadata แบบบีบอัด (None = แถวที่ถูกลบหรือถูกแทนที่แล้ว)
+    metadata เก็บเป็น tuple (keys, ค่า...) โดย keys และค่าที่ซ้ำกันบ่อย (source, type, file_hash, chunk_id)
+    ใช้ object เดียวกันร่วมกัน แทนการมี dict และ Document หนึ่งชุดต่อ chunk
+    ค้นหาแถวจาก doc id ผ่าน dict ในเวลา O(1)
+
+    document(row) สร้าง Document ใหม่ทุกครั้ง การแก้ไข Document ที่ได้ไปจึงต้องเรียก put ซ้ำ
+
+    ผู้เขียนมีได้คนเดียว ผู้อ่านอ่านพร้อมกันได้โดยไม่ล็อก: ข้อมูลของแถวไม่เปลี่ยนหลัง put
+    และ remove(row, release=False) เก็บข้อมูลแถวไว้ให้ผู้ค้นหาที่ยังถือ snapshot เก่าอยู่ จนกว่าจะ release
+    """
+
+    def __init__(self, unique_fields=UNINDEXED_FIELDS):
+        self.unique_fields = set(unique_fields)  # ฟิลด์ที่ค่าไม่ซ้ำกันเลย (ไม่ต้อง intern)
+        self.clear()
+
+    def clear(self):
+        self.ids: List[Optional[str]] = []
+        self.texts: List[Optional[str]] = []
+        self.metadata: List[Optional[tuple]] = []
+        self.alive = bytearray()
+        self.rows: Dict[str, int] = {}  # doc id -> แถว
+        self._keys: Dict[tuple, tuple] = {}
+        self._values: Dict[tuple, object] = {}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self.rows
+
+    def row_of(self, doc_id: str) -> Optional[int]:
+        return self.rows.get(doc_id)
+
+    # ---------- metadata แบบบีบอัด ----------
+    def _intern(self, field: str, value):
+        if field in self.unique_fields:
+            return value
+        try:
+            return self._values.setdefault((type(value), value), value)
+        except TypeError:  # เช่น list ของ tag
+            return value
+
+    def _pack(self, metadata: Dict) -> tuple:
+        keys = tuple(metadata)
+        keys = self._keys.setdefault(keys, keys)
+        return (keys,) + tuple(self._intern(field, value) for field, value in metadata.items())
+
+    @staticmethod
+    def _unpack(packed: tuple) -> Dict:
+        return dict(zip(packed[0], packed[1:]))
+
+    # ---------- เพิ่ม / ลบ ----------
+    def put(self, row: int, doc_id: str, doc: Document):
+        """เก็บเอกสารที่แถว row (แทนที่ของเดิมในแถวนั้นถ้ามี)"""
+        if row >= len(self.ids):
+            missing = row + 1 - len(self.ids)
+            self.ids.extend([None] * missing)
+            self.texts.extend([None] * missing)
+            self.metadata.extend([None] * missing)
+            self.alive.extend(bytes(missing))
+        self.ids[row] = doc_id
+        self.texts[row] = doc.page_content
+        self.metadata[row] = self._pack(doc.metadata)
+        self.alive[row] = 1
+        self.rows[doc_id] = row
+
+    def remove(self, row: int, release: bool = True):
+        doc_id = self.ids[row]
+        if doc_id is None:
+            return
+        if self.rows.get(doc_id) == row:
+            del self.rows[doc_id]
+        self.alive[row] = 0
+        if release:
+            self.release([row])
+
+    def release(self, rows: List[int]):
+        """คืนหน่วยความจำของแถวที่ถูกลบแล้ว"""
+        for row in rows:
+            if not self.alive[row]:
+                self.ids[row] = self.texts[row] = self.metadata[row] = None
+
+    # ---------- อ่าน ----------
+    def doc_id(self, row: int) -> Optional[str]:
+        return self.ids[row] if 0 <= row < len(self.ids) else None
+
+    def text(self, row: int) -> str:
+        return self.texts[row]
+
+    def metadata_of(self, row: int) -> Dict:
+        return self._unpack(self.metadata[row])
+
+    def document(self, row: int) -> Document:
+        return Document(page_content=self.texts[row], metadata=self._unpack(self.metadata[row]))
+
+    def live_rows(self) -> np.ndarray:
+        """แถวของเอกสารที่ยังอยู่ เรียงตามเลขแถว (int64)"""
+        # bytes() คัดลอกก่อน: view ที่ค้างอยู่จะทำให้ผู้เขียนขยาย bytearray ไม่ได้
+        return np.flatnonzero(np.frombuffer(bytes(self.alive), dtype='uint8')).astype('int64')
+
+    def items(self) -> Iterator[Tuple[int, str, Document]]:
+        """(row, doc id, Document) ของทุกเอกสารที่ยังอยู่ เรียงตามเลขแถว"""
+        for row in self.live_rows().tolist():
+            yield row, self.ids[row], self.document(row)
@@ -0,0 +1,102 @@
+# embedding_batcher.py
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Dict, List
+
+import numpy as np
+
+
+class EmbeddingBatcher:
+    """ใช้แทน encoder (SentenceTransformer): รวมคำขอ encode ขนาดเล็กที่มาพร้อมกันเป็น batch เดียว
+
+    คำขอแรกที่เข้าคิวจะรอได้ไม่เกิน max_wait_ms มิลลิวินาที หรือจนมีข้อความครบ max_batch
+    แล้วเธรด encoder รัน forward pass ครั้งเดียวและส่งเวกเตอร์คืนให้แต่ละผู้เรียก
+    ระหว่างที่ forward pass ทำงาน คำขอใหม่จะสะสมเป็น batch ถัดไป (max_wait_ms=0 จึงยังรวม batch ได้เมื่อมีโหลด)
+    คำขอที่มีข้อความตั้งแต่ max_batch ขึ้นไป (เช่น ตอนนำเข้าไฟล์) หรือส่ง argument อื่นมา จะ encode ทันทีไม่ผ่านคิว
+
+    เธรด encoder เริ่มเมื่อมีงานและจบเองเมื่อว่างนาน idle_seconds เช่นเดียวกับ Model.Model_Snapshot.WriteQueue
+    """
+
+    def __init__(self, encoder, max_batch: int = int(os.getenv('EMBED_MAX_BATCH', 32)),
+                 max_wait_ms: float = float(os.getenv('EMBED_MAX_WAIT_MS', 2)), idle_seconds: float = 5.0):
+        self.encoder = encoder
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.idle_seconds = idle_seconds
+        self.batches = 0
+        self.batched_texts = 0
+        self._queue = deque()  # (เวลาที่เข้าคิว, ข้อความ, future)
+        self._queued_texts = 0
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def __getattr__(self, name):
+        return getattr(self.encoder, name)  # tokenizer และ attribute อื่นของโมเดล
+
+    def encode(self, texts: List[str], batch_size: int = 32, **kwargs) -> np.ndarray:
+        if kwargs or len(texts) >= self.max_batch or self.max_batch <= 1:
+            return self.encoder.encode(texts, batch_size=batch_size, **kwargs)
+        if not texts:
+            return self.encoder.encode(texts)
+        future = Future()
+        with self._cond:
+            self._queue.append((time.monotonic(), list(texts), future))
+            self._queued_texts += len(texts)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='embedding-batcher', daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return future.result()
+
+    def _next_batch(self):
+        """รอจนมีข้อความครบ max_batch หรือคำขอแรกรอครบ max_wait แล้วดึงคำขอออกจากคิว (ถือ self._cond อยู่)"""
+        if not self._queue:
+            self._cond.wait(self.idle_seconds)
+        if not self._queue:
+            return None
+        deadline = self._queue[0][0] + self.max_wait
+        while self._queued_texts < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            self._cond.wait(remaining)
+        batch, count = [], 0
+        while self._queue and (not batch or count + len(self._queue[0][1]) <= self.max_batch):
+            request = self._queue.popleft()
+            batch.append(request)
+            count += len(request[1])
+        self._queued_texts -= count
+        return batch
+
+    def _run(self):
+        while True:
+            with self._cond:
+                batch = self._next_batch()
+                if batch is None:
+                    self._thread = None
+                    return
+            texts = [text for _, request_texts, _ in batch for text in request_texts]
+            try:
+                vectors = np.asarray(self.encoder.encode(texts, batch_size=len(texts)))
+            except BaseException as e:
+                for _, _, future in batch:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.batched_texts += len(texts)
+            start = 0
+            for _, request_texts, future in batch:
+                future.set_result(vectors[start:start + len(request_texts)])
+                start += len(request_texts)
+
+    def stats(self) -> Dict:
+        return {
+            'batches': self.batches,
+            'texts': self.batched_texts,
+            'mean_batch': self.batched_texts / self.batches if self.batches else 0.0,
+            'max_batch': self.max_batch,
+            'max_wait_ms': self.max_wait * 1000
+        }
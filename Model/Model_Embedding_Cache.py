@@ -0,0 +1,185 @@
+# embedding_cache.py
+import hashlib
+import json
+import os
+import re
+import threading
+import numpy as np
+from typing import Dict, List, Tuple
+
+from Tools.Tools_file_lock import FileLock
+
+MANIFEST_FILE = 'manifest.json'
+VECTORS_FILE = 'vectors.bin'
+KEYS_FILE = 'keys.bin'
+KEY_BYTES = 32  # sha256
+FORMAT_VERSION = 1
+
+
+def text_key(text: str) -> bytes:
+    """คีย์ของข้อความ: sha256 ของข้อความตามที่ส่งให้ encoder (ไม่ normalize เพราะเวกเตอร์ขึ้นกับข้อความจริง)"""
+    return hashlib.sha256(text.encode('utf-8')).digest()
+
+
+def cache_dir(path: str, model_name: str, revision: str, dtype: str) -> str:
+    return os.path.join(path, re.sub(r'[^A-Za-z0-9._@-]+', '--', f"{model_name}@{revision}.{np.dtype(dtype).name}"))
+
+
+class EmbeddingCache:
+    """แคชเวกเตอร์ของ chunk บนดิสก์ แยกตาม (ชื่อโมเดล, revision) และใช้ sha256 ของข้อความเป็นคีย์
+
+    โครงสร้างโฟลเดอร์ <path>/<model>@<revision>.<dtype>/:
+        vectors.bin    เวกเตอร์ (float16 หรือ float32) เรียงต่อกัน อ่านด้วย memmap
+        keys.bin       คีย์ 32 ไบต์ต่อแถว เรียงตรงกับ vectors.bin
+        manifest.json  จำนวนแถวที่ commit แล้ว
+
+    เขียนแบบต่อท้ายและ commit ด้วยการสลับ manifest เหมือน VectorStore
+    ข้อมูลอยู่นอก index จึงใช้ได้ต่อแม้เปลี่ยนชนิด index หรือสร้างฐานข้อมูลใหม่จาก backup
+    หลาย process ใช้แคชเดียวกันได้: การเขียนถือ lock ไฟล์ <โฟลเดอร์>.lock และอ่านคีย์ที่ process อื่นเพิ่มก่อนเขียน
+    """
+
+    def __init__(self, path: str, model_name: str, revision: str, dimension: int, dtype: str = 'float16'):
+        self.path = cache_dir(path, model_name, revision, dtype)
+        self.model_name = model_name
+        self.revision = revision
+        self.dimension = dimension
+        self.dtype = np.dtype(dtype)
+        self.rows = 0
+        self.hits = 0
+        self.misses = 0
+        self._keys: Dict[bytes, int] = {}
+        self._vectors = None
+        self._lock = threading.Lock()
+        self._file_lock = FileLock(self.path + '.lock')
+        with self._file_lock:
+            self._load()
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _load(self):
+        if not os.path.exists(self._file(MANIFEST_FILE)):
+            os.makedirs(self.path, exist_ok=True)
+            for name in (VECTORS_FILE, KEYS_FILE):
+                open(self._file(name), 'wb').close()
+            self._write_manifest()
+            return
+        with open(self._file(MANIFEST_FILE), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest['dimension'] != self.dimension or manifest['dtype'] != self.dtype.name:
+            raise ValueError(f"Embedding cache {self.path} holds {manifest['dimension']}-d {manifest['dtype']} "
+                             f"vectors, expected {self.dimension}-d {self.dtype.name}")
+        self._catch_up(manifest['rows'])
+
+    def _catch_up(self, rows: int):
+        """เพิ่มคีย์ของแถวที่ commit แล้วแต่ยังไม่รู้จัก (process อื่นเขียนไว้)"""
+        if rows <= self.rows:
+            return
+        with open(self._file(KEYS_FILE), 'rb') as f:
+            f.seek(self.rows * KEY_BYTES)
+            data = f.read((rows - self.rows) * KEY_BYTES)
+        for i in range(rows - self.rows):
+            self._keys[data[i * KEY_BYTES:(i + 1) * KEY_BYTES]] = self.rows + i
+        self.rows = rows
+
+    def _committed_rows(self) -> int:
+        with open(self._file(MANIFEST_FILE), 'r', encoding='utf-8') as f:
+            return json.load(f)['rows']
+
+    def _write_manifest(self):
+        tmp = self._file(MANIFEST_FILE + '.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({
+                'version': FORMAT_VERSION,
+                'model': self.model_name,
+                'revision': self.revision,
+                'dimension': self.dimension,
+                'dtype': self.dtype.name,
+                'rows': self.rows
+            }, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self._file(MANIFEST_FILE))
+
+    def _matrix(self) -> np.ndarray:
+        if self._vectors is None or self._vectors.shape[0] != self.rows:
+            self._vectors = np.memmap(self._file(VECTORS_FILE), dtype=self.dtype, mode='r',
+                                      shape=(self.rows, self.dimension))
+        return self._vectors
+
+    def __len__(self):
+        return self.rows
+
+    def get_many(self, keys: List[bytes]) -> Tuple[np.ndarray, List[bool]]:
+        """เวกเตอร์ float32 (len(keys) x dimension) และรายการว่าพบคีย์ไหนบ้าง (แถวที่ไม่พบเป็นศูนย์)"""
+        out = np.zeros((len(keys), self.dimension), dtype='float32')
+        with self._lock:
+            rows = [self._keys.get(key) for key in keys]
+            if None in rows:
+                committed = self._committed_rows()
+                if committed > self.rows:  # process อื่นเพิ่มเวกเตอร์ไว้แล้ว
+                    self._catch_up(committed)
+                    rows = [self._keys.get(key) for key in keys]
+            found = [row is not None for row in rows]
+            if any(found):
+                positions = [i for i, ok in enumerate(found) if ok]
+                out[positions] = self._matrix()[[rows[i] for i in positions]]
+            self.hits += sum(found)
+            self.misses += len(keys) - sum(found)
+        return out, found
+
+    def put_many(self, keys: List[bytes], vectors: np.ndarray) -> int:
+        """เพิ่มเวกเตอร์ของคีย์ที่ยังไม่มีแล้ว commit คืนจำนวนแถวที่เพิ่ม"""
+        with self._lock, self._file_lock:
+            self._catch_up(self._committed_rows())
+            seen, new = set(), []
+            for i, key in enumerate(keys):
+                if key not in self._keys and key not in seen:
+                    seen.add(key)
+                    new.append(i)
+            if not new:
+                return 0
+            data = np.ascontiguousarray(np.asarray(vectors)[new], dtype=self.dtype)
+            for name, payload, row_bytes in (
+                (VECTORS_FILE, data.tobytes(), self.dimension * self.dtype.itemsize),
+                (KEYS_FILE, b''.join(keys[i] for i in new), KEY_BYTES)
+            ):
+                with open(self._file(name), 'r+b') as f:
+                    f.truncate(self.rows * row_bytes)  # ตัดส่วนที่ยังไม่ commit จากการล่มครั้งก่อน
+                    f.seek(0, os.SEEK_END)
+                    f.write(payload)
+                    f.flush()
+                    os.fsync(f.fileno())
+            for offset, i in enumerate(new):
+                self._keys[keys[i]] = self.rows + offset
+            self.rows += len(new)
+            self._write_manifest()
+            return len(new)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'model': self.model_name,
+                'revision': self.revision,
+                'dtype': self.dtype.name,
+                'size': self.rows,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0
+            }
+
+
+_lock = threading.Lock()
+_caches: Dict[str, EmbeddingCache] = {}
+
+
+def open_embedding_cache(path: str, model_name: str, revision: str, dimension: int,
+                         dtype: str = 'float16') -> EmbeddingCache:
+    """EmbeddingCache ที่ใช้ร่วมกันทั้ง process ต่อหนึ่งโฟลเดอร์ (VectorDB ที่โหลดใหม่จะได้ตัวเดิม ไม่เขียนไฟล์ชนกัน)"""
+    key = os.path.abspath(cache_dir(path, model_name, revision, dtype))
+    with _lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = _caches[key] = EmbeddingCache(path, model_name, revision, dimension, dtype)
+    return cache
@@ -0,0 +1,105 @@
+# index_factory.py
+import math
+import faiss
+import numpy as np
+from typing import Optional
+
+INDEX_TYPES = ('auto', 'flat', 'hnsw', 'ivf', 'ivfpq')
+
+
+class IndexFactory:
+    """สร้าง FAISS index ตามชนิดที่ตั้งค่าไว้ (IVF ถูก train ใหม่ทุกครั้งที่ VectorDB สร้างหรือรวม segment)
+
+    ชนิดของ index:
+        flat   IndexFlatL2 ค้นหาแบบ brute-force (แม่นยำ 100%)
+        hnsw   IndexHNSWFlat ปรับความแม่นยำตอนค้นหาด้วย ef_search (ลบเวกเตอร์ไม่ได้ จึงใช้ tombstone)
+        ivf    IndexIVFFlat ต้อง train จากเวกเตอร์ที่มีอยู่ ปรับด้วย nprobe
+        ivfpq  IndexIVFPQ บีบอัดเวกเตอร์เหลือ pq_m ไบต์ ปรับด้วย nprobe
+        auto   เลือกตามขนาดข้อมูล: flat -> ivf (>= ivf_threshold) -> ivfpq (>= ivfpq_threshold)
+
+    FAISS id ของทุกชนิดตรงกับเลขแถวใน VectorStore: flat/hnsw ห่อด้วย IndexIDMap2
+    ส่วน IVF รับ id เองได้โดยตรง (IndexIDMap ลบ id จาก IVF ไม่ถูกต้องเพราะ IVF ไม่ขยับ id ภายใน)
+    """
+
+    def __init__(self, dimension: int, index_type: str = 'auto',
+                 hnsw_m: int = 32, ef_construction: int = 80, ef_search: int = 64,
+                 nprobe: int = 16, pq_m: int = 64, pq_bits: int = 8,
+                 ivf_threshold: int = 50_000, ivfpq_threshold: int = 2_000_000,
+                 max_tombstone_ratio: float = 0.2):
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type '{index_type}', expected one of {INDEX_TYPES}")
+        self.dimension = dimension
+        self.index_type = index_type
+        self.hnsw_m = hnsw_m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.nprobe = nprobe
+        self.pq_m = pq_m
+        self.pq_bits = pq_bits
+        self.ivf_threshold = ivf_threshold
+        self.ivfpq_threshold = ivfpq_threshold
+        self.max_tombstone_ratio = max_tombstone_ratio
+
+    def kind_for(self, n: int) -> str:
+        """ชนิด index ที่ควรใช้กับข้อมูล n เวกเตอร์"""
+        if self.index_type != 'auto':
+            kind = self.index_type
+        elif n >= self.ivfpq_threshold:
+            kind = 'ivfpq'
+        elif n >= self.ivf_threshold:
+            kind = 'ivf'
+        else:
+            kind = 'flat'
+        # IVF ต้องมีข้อมูลพอสำหรับ train ถ้ายังไม่พอให้ใช้ flat ไปก่อน
+        if kind in ('ivf', 'ivfpq') and n < self._min_train_size(kind):
+            return 'flat'
+        return kind
+
+    def _nlist(self, n: int) -> int:
+        return max(1, min(int(4 * math.sqrt(n)), n // 39))
+
+    def _min_train_size(self, kind: str) -> int:
+        # k-means ต้องการประมาณ 39 จุดต่อ centroid (IVFPQ มี 2^pq_bits centroid ต่อ sub-quantizer)
+        return 39 * 2 ** self.pq_bits if kind == 'ivfpq' else 39
+
+    def build(self, vectors: np.ndarray, row_ids: np.ndarray):
+        """สร้าง index จากเวกเตอร์ที่เก็บไว้ (train ถ้าจำเป็น) คืน (index, kind)"""
+        n = len(vectors)
+        kind = self.kind_for(n)
+        vectors = np.ascontiguousarray(vectors, dtype='float32')
+
+        if kind == 'flat':
+            base = faiss.IndexFlatL2(self.dimension)
+        elif kind == 'hnsw':
+            base = faiss.IndexHNSWFlat(self.dimension, self.hnsw_m)
+            base.hnsw.efConstruction = self.ef_construction
+            base.hnsw.efSearch = self.ef_search
+        else:
+            nlist = self._nlist(n)
+            quantizer = faiss.IndexFlatL2(self.dimension)
+            if kind == 'ivf':
+                base = faiss.IndexIVFFlat(quantizer, self.dimension, nlist)
+            else:
+                base = faiss.IndexIVFPQ(quantizer, self.dimension, nlist, self.pq_m, self.pq_bits)
+            sample = vectors
+            max_train = 256 * nlist
+            if n > max_train:
+                sample = vectors[np.random.default_rng(0).choice(n, max_train, replace=False)]
+            base.train(sample)
+            base.nprobe = min(self.nprobe, nlist)
+
+        index = base if kind in ('ivf', 'ivfpq') else faiss.IndexIDMap2(base)
+        if n:
+            index.add_with_ids(vectors, np.ascontiguousarray(row_ids, dtype='int64'))
+        return index, kind
+
+    def search_params(self, kind: str, nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+                      selector=None):
+        """พารามิเตอร์การค้นหาต่อคำขอ (None = ใช้ค่าที่ตั้งไว้ใน index)"""
+        if not (nprobe or ef_search or selector is not None):
+            return None
+        if kind in ('ivf', 'ivfpq'):
+            return faiss.SearchParametersIVF(nprobe=nprobe or self.nprobe, sel=selector)
+        if kind == 'hnsw':
+            return faiss.SearchParametersHNSW(efSearch=ef_search or self.ef_search, sel=selector)
+        return faiss.SearchParameters(sel=selector)
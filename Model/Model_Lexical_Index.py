@@ -0,0 +1,444 @@
+# lexical_index.py
+import functools
+import math
+import os
+import re
+import threading
+import unicodedata
+from array import array
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from pythainlp import word_tokenize
+
+# ช่วงอักษรไทย หรือคำ/รหัสที่ไม่ใช่ภาษาไทย (รวมรหัสที่มี - . / เช่น 15-15-15, 2.4-D, NPK)
+_TOKEN = re.compile(r'[\u0E00-\u0E7F]+|[^\W_]+(?:[-./][^\W_]+)*')
+_THAI = re.compile(r'[\u0E00-\u0E7F]')
+
+VOCAB_FILE = 'vocab.txt'
+DOCS_FILE = 'docs.bin'
+TERMS_FILE = 'terms.bin'
+TFS_FILE = 'tfs.bin'
+DOC_DTYPE = np.dtype([('row', '<i8'), ('count', '<u4'), ('length', '<u4')])
+# คำที่พบในเอกสารเกินสัดส่วนนี้ (เช่น ที่ และ ของ) ให้คะแนนเฉพาะเอกสารที่คำอื่นในคำค้นหาเจอแล้ว
+COMMON_TERM_RATIO = 0.02
+# เมื่อเอกสารที่ถูกลบแต่ยังมี posting อยู่เกินสัดส่วนนี้ของเอกสารที่ใช้งาน ให้รวม posting ใหม่โดยตัดแถวที่ถูกลบทิ้ง
+# (posting ของแถวที่ถูกลบยังถูกนับใน df ของคำ ทำให้ idf เพี้ยนไปเรื่อย ๆ ถ้าไม่ตัดออก)
+DEAD_RATIO = 0.1
+
+Analyzed = Tuple[List[str], List[int], int]  # (คำ, ความถี่ของแต่ละคำ, จำนวนคำทั้งหมด)
+
+
+def tokenize(text: str) -> List[str]:
+    """ตัดคำสำหรับค้นหาแบบ lexical: ภาษาไทยตัดด้วย pythainlp newmm ส่วนอื่นตัดเป็นคำ/รหัส (ตัวพิมพ์เล็ก)"""
+    tokens = []
+    for match in _TOKEN.finditer(unicodedata.normalize('NFC', text).lower()):
+        token = match.group()
+        if _THAI.match(token):
+            tokens.extend(word for word in word_tokenize(token, engine='newmm', keep_whitespace=False)
+                          if word.strip())
+        else:
+            tokens.append(token)
+    return tokens
+
+
+def analyze(text: str) -> Analyzed:
+    counts = Counter(tokenize(text))
+    return list(counts), list(counts.values()), sum(counts.values())
+
+
+def _stable_order(terms: np.ndarray) -> np.ndarray:
+    """argsort แบบ stable ของ term id: เรียงทีละ 16 บิต (numpy ใช้ radix sort กับ uint16 ซึ่งเร็วกว่ามาก)"""
+    order = np.argsort((terms & 0xFFFF).astype('uint16'), kind='stable')
+    if len(terms) and terms.max() > 0xFFFF:
+        order = order[np.argsort((terms[order] >> 16).astype('uint16'), kind='stable')]
+    return order
+
+
+def _locked(method):
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+class BM25Index:
+    """inverted index สำหรับค้นหาแบบ BM25 ใช้ FAISS id (แถวใน VectorStore) เป็นเลขเอกสาร
+
+    posting ของเอกสารที่โหลดตอนเริ่มทำงานเก็บแบบ CSR (numpy) ส่วนที่เพิ่มภายหลังเก็บใน array ต่อคำ
+    การลบแค่ทำเครื่องหมายแถว (แถวที่แก้ไขจะได้เลขแถวใหม่เสมอ) จึงเพิ่ม/ลบได้ทีละเอกสาร
+    เมื่อแถวที่ถูกลบเกิน DEAD_RATIO ของเอกสารที่ใช้งาน จะรวม posting ใหม่โดยไม่มีแถวเหล่านั้น (df ไม่นับเอกสารที่ลบไปนาน)
+
+    ผลการตัดคำถูกเขียนต่อท้ายไฟล์ใน path เพื่อไม่ต้องตัดคำทั้งคลังใหม่ตอนเริ่มทำงาน:
+        vocab.txt  คำละบรรทัด (term id = เลขบรรทัด)
+        docs.bin   (row, จำนวนคำไม่ซ้ำ, ความยาว) ต่อเอกสาร
+        terms.bin  term id (uint32) ของทุกเอกสารต่อกัน
+        tfs.bin    ความถี่ (uint16) ตรงกับ terms.bin
+    ไฟล์เป็นเพียงแคชของการตัดคำ ถ้าขาดหายหรือเขียนไม่ครบ แถวที่ขาดจะถูกตัดคำใหม่ตอนโหลด
+
+    add / remove / load / search ใช้ lock ภายใน (posting ใน array ขยายไม่ได้ระหว่างที่ผู้ค้นหาอ่านอยู่)
+
+    หลาย process เขียนไฟล์ชุดเดียวกันได้ถ้าผลัดกันเขียนภายใต้ lock ร่วมกัน และเรียก refresh() ก่อนเขียน
+    term id ในหน่วยความจำจึงตรงกับ vocab.txt เสมอ
+    """
+
+    def __init__(self, path: Optional[str] = None, k1: float = 1.2, b: float = 0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self.vocab: Dict[str, int] = {}
+        self.terms: List[str] = []
+        # posting ชุดหลัก (CSR): แถวของคำ t อยู่ที่ base_rows[base_ptr[t]:base_ptr[t + 1]]
+        self.base_ptr = np.zeros(1, dtype='int64')
+        self.base_rows = np.empty(0, dtype='int64')
+        self.base_tfs = np.empty(0, dtype='uint16')
+        # posting ที่เพิ่มหลังโหลด: term id -> (rows, tfs)
+        self.delta: Dict[int, Tuple[array, array]] = {}
+        self.lengths = array('I')
+        self.alive = bytearray()
+        self.live_count = 0
+        self.total_length = 0
+        # จำนวนแถวที่ถูกลบแต่ posting ยังอยู่ (ถูกตัดทิ้งตอน _compact)
+        self.dead_count = 0
+        # posting ของทุกคำเรียงตามแถวหรือไม่ (เงื่อนไขของการค้นหาแบบตัดคำที่พบบ่อย)
+        self.last_row = -1
+        self.postings_sorted = True
+        # ขนาดของไฟล์ที่อ่าน/เขียนแล้ว: (ไบต์ของ vocab, จำนวนระเบียนใน docs.bin, จำนวน term ใน terms.bin)
+        self._offsets = (0, 0, 0)
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def __len__(self):
+        return self.live_count
+
+    # ---------- เพิ่ม / ลบ ----------
+    def _term_id(self, term: str, new_terms: List[str]) -> int:
+        term_id = self.vocab.get(term)
+        if term_id is None:
+            term_id = self.vocab[term] = len(self.terms)
+            self.terms.append(term)
+            new_terms.append(term)
+        return term_id
+
+    def _grow(self, row: int):
+        if row >= len(self.lengths):
+            missing = row + 1 - len(self.lengths)
+            self.lengths.extend([0] * missing)
+            self.alive.extend(bytes(missing))
+
+    @_locked
+    def add(self, rows: Iterable[int], analyzed: Iterable[Analyzed], persist: bool = True):
+        """เพิ่มเอกสาร (ผลจาก analyze) ที่แถว rows"""
+        new_terms, records, all_ids, all_tfs = [], [], array('I'), array('H')
+        for row, (terms, counts, length) in zip(rows, analyzed):
+            term_ids = [self._term_id(term, new_terms) for term in terms]
+            tfs = [min(count, 65535) for count in counts]
+            for term_id, tf in zip(term_ids, tfs):
+                postings = self.delta.get(term_id)
+                if postings is None:
+                    postings = self.delta[term_id] = (array('q'), array('H'))
+                postings[0].append(row)
+                postings[1].append(tf)
+            self._grow(row)
+            if row <= self.last_row:
+                self.postings_sorted = False
+            self.last_row = max(self.last_row, row)
+            self.lengths[row] = length
+            if not self.alive[row]:
+                self.alive[row] = 1
+                self.live_count += 1
+                self.total_length += length
+            records.append((row, len(term_ids), length))
+            all_ids.extend(term_ids)
+            all_tfs.extend(tfs)
+        if persist and self.path and records:
+            self._append_files(new_terms, records, all_ids, all_tfs)
+
+    @_locked
+    def remove(self, rows: Iterable[int]):
+        for row in rows:
+            if row < len(self.alive) and self.alive[row]:
+                self.alive[row] = 0
+                self.live_count -= 1
+                self.total_length -= self.lengths[row]
+                self.dead_count += 1
+        if self.dead_count > DEAD_RATIO * self.live_count:
+            self._compact()
+
+    def _append_files(self, new_terms, records, term_ids, tfs):
+        os.makedirs(self.path, exist_ok=True)
+        vocab_bytes, doc_count, term_count = self._offsets
+        vocab = ''.join(term + '\n' for term in new_terms).encode('utf-8')
+        # vocab และ posting ก่อน docs.bin: เอกสารจะนับว่าครบเมื่อมีระเบียนใน docs.bin แล้วเท่านั้น
+        # ตัดส่วนที่เขียนไม่ครบ (จาก process ที่ล่มระหว่างเขียน) ก่อนต่อท้ายทุกครั้ง
+        for name, size, data in ((VOCAB_FILE, vocab_bytes, vocab),
+                                 (TERMS_FILE, term_count * 4, term_ids.tobytes()),
+                                 (TFS_FILE, term_count * 2, tfs.tobytes()),
+                                 (DOCS_FILE, doc_count * DOC_DTYPE.itemsize,
+                                  np.array(records, dtype=DOC_DTYPE).tobytes())):
+            with open(self._file(name), 'ab') as f:
+                f.truncate(size)
+                f.write(data)
+        self._offsets = (vocab_bytes + len(vocab), doc_count + len(records), term_count + len(term_ids))
+
+    @_locked
+    def refresh(self) -> int:
+        """อ่านเอกสารที่ process อื่นเขียนต่อท้ายไฟล์หลังจากที่อ่านครั้งก่อน คืนจำนวนเอกสาร
+
+        เรียกขณะถือ lock ของผู้เขียน (ไม่มีใครเขียนไฟล์อยู่) แถวที่ถูกลบไปแล้วต้อง remove เองภายหลัง
+        """
+        if not self.path or not os.path.exists(self._file(DOCS_FILE)):
+            return 0
+        vocab_bytes, doc_count, term_count = self._offsets
+        docs = np.fromfile(self._file(DOCS_FILE), dtype=DOC_DTYPE, offset=doc_count * DOC_DTYPE.itemsize)
+        if not len(docs):
+            return 0
+        with open(self._file(VOCAB_FILE), 'rb') as f:
+            f.seek(vocab_bytes)
+            vocab = f.read()
+        vocab = vocab[:vocab.rfind(b'\n') + 1]
+        total = int(docs['count'].sum())
+        term_ids = np.fromfile(self._file(TERMS_FILE), dtype='uint32', count=total, offset=term_count * 4)
+        tfs = np.fromfile(self._file(TFS_FILE), dtype='uint16', count=total, offset=term_count * 2)
+        for term in vocab.decode('utf-8').split('\n')[:-1]:
+            self.vocab[term] = len(self.terms)
+            self.terms.append(term)
+        ends = np.cumsum(docs['count'], dtype='int64').tolist()
+        analyzed = [([self.terms[t] for t in term_ids[end - count:end].tolist()], tfs[end - count:end].tolist(), length)
+                    for count, end, length in zip(docs['count'].tolist(), ends, docs['length'].tolist())]
+        self.add(docs['row'].tolist(), analyzed, persist=False)
+        self._offsets = (vocab_bytes + len(vocab), doc_count + len(docs), term_count + total)
+        return len(docs)
+
+    # ---------- โหลด ----------
+    def _read_files(self, max_row: int):
+        """อ่านผลการตัดคำที่บันทึกไว้ คืน docs (DOC_DTYPE) terms tfs ที่ครบสมบูรณ์ และตัดไฟล์ส่วนเกินทิ้ง"""
+        empty = (np.empty(0, dtype=DOC_DTYPE), np.empty(0, dtype='uint32'), np.empty(0, dtype='uint16'))
+        if not self.path:
+            return empty
+        if not os.path.exists(self._file(DOCS_FILE)):
+            self._discard_files()  # vocab/posting ที่ไม่มี docs.bin คู่กันใช้ต่อไม่ได้
+            return empty
+        with open(self._file(VOCAB_FILE), 'rb') as f:
+            data = f.read()
+        vocab_bytes = data.rfind(b'\n') + 1  # บรรทัดสุดท้ายที่เขียนไม่จบถือว่าไม่มี
+        self.terms = data[:vocab_bytes].decode('utf-8').split('\n')[:-1]
+        self.vocab = {term: i for i, term in enumerate(self.terms)}
+
+        docs = np.fromfile(self._file(DOCS_FILE), dtype=DOC_DTYPE,
+                           count=os.path.getsize(self._file(DOCS_FILE)) // DOC_DTYPE.itemsize)
+        terms = np.fromfile(self._file(TERMS_FILE), dtype='uint32')
+        tfs = np.fromfile(self._file(TFS_FILE), dtype='uint16')
+        ends = np.cumsum(docs['count'], dtype='int64')
+        complete = int(np.searchsorted(ends, min(len(terms), len(tfs)), side='right'))
+        invalid = np.flatnonzero(terms[:ends[complete - 1] if complete else 0] >= len(self.terms))
+        if len(invalid):
+            complete = int(np.searchsorted(ends, invalid[0], side='right'))
+        total = int(ends[complete - 1]) if complete else 0
+        docs, terms, tfs = docs[:complete], terms[:total], tfs[:total]
+
+        # ตัดส่วนที่เขียนไม่ครบออก เพื่อให้การเขียนต่อท้ายครั้งถัดไปต่อจากข้อมูลที่ถูกต้อง
+        for name, size in ((VOCAB_FILE, vocab_bytes), (DOCS_FILE, complete * DOC_DTYPE.itemsize),
+                           (TERMS_FILE, total * 4), (TFS_FILE, total * 2)):
+            with open(self._file(name), 'r+b') as f:
+                f.truncate(size)
+        self._offsets = (vocab_bytes, complete, total)
+
+        # แถวที่เกินจาก VectorStore (เช่น store ถูก restore เป็นรุ่นเก่า) ใช้ไม่ได้
+        # และถ้าแถวเดียวกันถูกบันทึกซ้ำ (แถวนั้นถูกใช้ใหม่หลัง restore) ให้ใช้ระเบียนล่าสุด
+        valid = docs['row'] < max_row
+        _, last = np.unique(docs['row'][::-1], return_index=True)
+        latest = np.zeros(len(docs), dtype=bool)
+        latest[len(docs) - 1 - last] = True
+        valid &= latest
+        keep = np.repeat(valid, docs['count'])
+        return docs[valid], terms[keep], tfs[keep]
+
+    def _discard_files(self):
+        for name in (VOCAB_FILE, DOCS_FILE, TERMS_FILE, TFS_FILE):
+            if self.path and os.path.exists(self._file(name)):
+                os.remove(self._file(name))
+
+    @_locked
+    def load(self, live_rows: List[int], text_of: Callable[[int], str], max_row: int):
+        """สร้าง index ของแถว live_rows: ใช้ผลการตัดคำที่บันทึกไว้ แล้วตัดคำเฉพาะแถวที่ยังไม่มี (text_of(row))"""
+        self._reset()
+        try:
+            docs, terms, tfs = self._read_files(max_row)
+        except (OSError, ValueError) as e:
+            print("⚠️ อ่านไฟล์ lexical index ไม่สำเร็จ จะตัดคำใหม่ทั้งหมด:", e)
+            self._reset()
+            self._discard_files()
+            docs, terms, tfs = (np.empty(0, dtype=DOC_DTYPE), np.empty(0, dtype='uint32'),
+                                np.empty(0, dtype='uint16'))
+
+        # ไม่โหลด posting ของแถวที่ถูกลบไปแล้ว (ระเบียนยังอยู่ในไฟล์) เพื่อไม่ให้ถูกนับใน df
+        live = np.array(live_rows, dtype='int64')
+        is_live = np.zeros(max_row, dtype=bool)
+        is_live[live] = True
+        keep = is_live[docs['row']]
+        postings = np.repeat(keep, docs['count'])
+        docs, terms, tfs = docs[keep], terms[postings], tfs[postings]
+        self._build_base(np.repeat(docs['row'], docs['count']), terms, tfs)
+
+        self.lengths = array('I', bytes(4 * max_row))
+        self.alive = bytearray(max_row)
+        if len(docs):
+            lengths = np.frombuffer(self.lengths, dtype='uint32')
+            lengths[docs['row']] = docs['length']
+            del lengths
+        covered = np.zeros(max_row, dtype=bool)
+        covered[docs['row']] = True
+        if len(live):
+            alive = np.frombuffer(self.alive, dtype='uint8')
+            alive[live[covered[live]]] = 1
+            del alive
+        self.live_count = int(np.count_nonzero(np.frombuffer(self.alive, dtype='uint8')))
+        self.total_length = int(np.frombuffer(self.lengths, dtype='uint32')[live[covered[live]]].sum()) \
+            if len(live) else 0
+
+        missing = live[~covered[live]].tolist() if len(live) else []
+        if missing:
+            print(f"🔤 ตัดคำ {len(missing)} เอกสารสำหรับ lexical index")
+            self.add(missing, (analyze(text_of(row)) for row in missing))
+            self._compact()
+
+    def _build_base(self, rows: np.ndarray, terms: np.ndarray, tfs: np.ndarray):
+        """สร้าง posting ชุดหลักแบบ CSR: เรียงตาม term id และภายในคำเรียงตามแถว"""
+        if len(rows) > 1 and np.any(rows[1:] < rows[:-1]):
+            order = np.lexsort((rows, terms))
+        else:
+            order = _stable_order(terms)
+        self.base_rows = rows[order]
+        self.base_tfs = tfs[order]
+        self.base_ptr = np.zeros(len(self.terms) + 1, dtype='int64')
+        np.cumsum(np.bincount(terms, minlength=len(self.terms)), out=self.base_ptr[1:])
+        self.delta = {}
+        self.last_row = int(rows.max()) if len(rows) else -1
+        self.postings_sorted = True
+
+    def _compact(self):
+        """รวม posting ที่เพิ่มภายหลังเข้ากับชุดหลัก และตัด posting ของแถวที่ถูกลบทิ้ง"""
+        counts = np.diff(self.base_ptr)
+        parts = [(np.repeat(np.arange(len(counts), dtype='uint32'), counts), self.base_rows, self.base_tfs)]
+        for term_id, (rows, tfs) in self.delta.items():
+            parts.append((np.full(len(rows), term_id, dtype='uint32'), np.frombuffer(rows, dtype='int64'),
+                          np.frombuffer(tfs, dtype='uint16')))
+        terms, rows, tfs = (np.concatenate(column) for column in zip(*parts))
+        if self.dead_count:
+            keep = np.frombuffer(self.alive, dtype='uint8')[rows] == 1
+            terms, rows, tfs = terms[keep], rows[keep], tfs[keep]
+            self.dead_count = 0
+        self._build_base(rows, terms, tfs)
+
+    # ---------- ค้นหา ----------
+    def _postings(self, term_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        start, stop = (self.base_ptr[term_id], self.base_ptr[term_id + 1]) \
+            if term_id + 1 < len(self.base_ptr) else (0, 0)
+        rows, tfs = self.base_rows[start:stop], self.base_tfs[start:stop]
+        delta = self.delta.get(term_id)
+        if delta:
+            rows = np.concatenate((rows, np.frombuffer(delta[0], dtype='int64')))
+            tfs = np.concatenate((tfs, np.frombuffer(delta[1], dtype='uint16')))
+        return rows, tfs
+
+    def _contribution(self, rows: np.ndarray, tfs: np.ndarray, idf: float, average: float) -> np.ndarray:
+        lengths = np.frombuffer(self.lengths, dtype='uint32')[rows].astype('float32')
+        tf = tfs.astype('float32')
+        norm = np.float32(self.k1 * (1 - self.b)) + np.float32(self.k1 * self.b / average) * lengths
+        return np.float32(idf * (self.k1 + 1)) * tf / (tf + norm)
+
+    @_locked
+    def search(self, query: str, k: int, allowed: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """k แถวที่ได้คะแนน BM25 สูงสุด คืน (rows, scores) เรียงจากมากไปน้อย (allowed = จำกัดเฉพาะแถวเหล่านี้)"""
+        term_ids = {self.vocab[term] for term in tokenize(query) if term in self.vocab}
+        if not term_ids or not self.live_count or k <= 0:
+            return np.empty(0, dtype='int64'), np.empty(0, dtype='float32')
+
+        terms = []
+        for term_id in term_ids:
+            rows, tfs = self._postings(term_id)
+            if len(rows):
+                idf = math.log(1 + max(self.live_count - len(rows) + 0.5, 0.5) / (len(rows) + 0.5))
+                terms.append((rows, tfs, idf))
+        if not terms:  # ทุกเอกสารที่มีคำเหล่านี้ถูกลบไปแล้ว
+            return np.empty(0, dtype='int64'), np.empty(0, dtype='float32')
+        terms.sort(key=lambda term: len(term[0]))
+        average = self.total_length / self.live_count
+
+        limit = max(COMMON_TERM_RATIO * self.live_count, 1000)
+        common_from = next((i for i, term in enumerate(terms) if len(term[0]) > limit), len(terms))
+        if common_from == len(terms) or (common_from and self.postings_sorted):
+            result = self._search_pruned(terms[:common_from], terms[common_from:], k, average, allowed)
+            if result is not None:
+                return result
+        return self._search_all(terms, k, average, allowed)
+
+    def _live(self, rows: np.ndarray, allowed: Optional[np.ndarray]) -> np.ndarray:
+        keep = np.frombuffer(self.alive, dtype='uint8')[rows] == 1
+        if allowed is not None:
+            keep &= np.isin(rows, allowed)
+        return keep
+
+    @staticmethod
+    def _top(rows: np.ndarray, scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        if len(rows) > k:
+            best = np.argpartition(-scores, k - 1)[:k]
+            rows, scores = rows[best], scores[best]
+        order = np.argsort(-scores, kind='stable')
+        return rows[order].astype('int64'), scores[order].astype('float32')
+
+    def _search_all(self, terms, k, average, allowed):
+        """สะสมคะแนนของทุก posting ในอาร์เรย์ขนาดเท่าจำนวนแถว"""
+        scores = np.zeros(len(self.lengths), dtype='float32')
+        for rows, tfs, idf in terms:
+            scores[rows] += self._contribution(rows, tfs, idf, average)
+        candidates = np.flatnonzero(scores)
+        candidates = candidates[self._live(candidates, allowed)]
+        return self._top(candidates, scores[candidates], k)
+
+    def _search_pruned(self, rare, common, k, average, allowed):
+        """ให้คะแนนเฉพาะเอกสารที่พบคำที่ไม่บ่อย แล้วเติมคะแนนจากคำที่พบบ่อย (posting ต้องเรียงตามแถว)
+
+        เอกสารที่ไม่มีคำที่ไม่บ่อยเลยได้คะแนนไม่เกินผลรวม idf * (k1 + 1) ของคำที่พบบ่อย
+        ถ้าอันดับที่ k มีคะแนนเกินค่านี้ผลจึงตรงกับการคิดคะแนนทุกเอกสาร ไม่เช่นนั้นคืน None
+        """
+        rows = np.concatenate([rows for rows, _, _ in rare])
+        scores = np.concatenate([self._contribution(rows, tfs, idf, average) for rows, tfs, idf in rare])
+        if len(rare) > 1:
+            rows, inverse = np.unique(rows, return_inverse=True)
+            scores = np.bincount(inverse, weights=scores)
+        keep = self._live(rows, allowed)
+        rows, scores = rows[keep], scores[keep]
+        if not common:
+            return self._top(rows, scores, k)  # ไม่มีคำที่พบบ่อย: ผลครบแล้ว
+        if len(rows) < k:
+            return None
+
+        bound = 0.0
+        for term_rows, tfs, idf in common:
+            positions = np.minimum(np.searchsorted(term_rows, rows), len(term_rows) - 1)
+            hit = term_rows[positions] == rows
+            positions = positions[hit]
+            scores[hit] += self._contribution(term_rows[positions], tfs[positions], idf, average)
+            bound += idf * (self.k1 + 1)
+        rows, scores = self._top(rows, scores, k)
+        if scores[-1] <= bound:
+            return None
+        return rows, scores
+
+
+def reciprocal_rank_fusion(rankings: List[List], k: int = 60) -> List[Tuple]:
+    """รวมหลายรายการอันดับด้วย RRF: คะแนน = ผลรวม 1 / (k + อันดับ) คืน [(key, score)] เรียงจากมากไปน้อย"""
+    scores: Dict = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, 1):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
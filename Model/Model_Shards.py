@@ -0,0 +1,340 @@
+# shards.py
+import base64
+import heapq
+import http.client
+import json
+import os
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor, wait
+from itertools import islice
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from Tools.Tools_document import Document
+from Tools.Tools_chunker import TextChunker
+from Model.Model_Query_Cache import TTLCache, normalize_query
+from Model.Model_Metadata_Index import MetadataIndex
+from Model.Model_Vector_DB import SEARCH_MODES
+
+
+class ShardError(RuntimeError):
+    """shard ไม่ตอบภายใน timeout หรือตอบกลับด้วยข้อผิดพลาด"""
+
+
+class ShardsUnavailableError(ShardError):
+    """ไม่มี shard ใดตอบเลย"""
+
+
+def encode_vector(vector: np.ndarray) -> str:
+    """เวกเตอร์ float32 เป็น base64 (เล็กและแปลงเร็วกว่า list ของตัวเลขใน JSON)"""
+    return base64.b64encode(np.ascontiguousarray(vector, dtype='float32').tobytes()).decode('ascii')
+
+
+def decode_vector(data: str) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(data), dtype='float32')
+
+
+def shard_of(doc: Document, shards: int, key: Optional[str]) -> int:
+    """shard ของเอกสาร: เอกสารที่ metadata[key] เท่ากันอยู่ shard เดียวกัน (เช่น key='source' = ทุก chunk ของไฟล์เดียวกัน)
+
+    ถ้าไม่กำหนด key หรือเอกสารไม่มีฟิลด์นี้ จะกระจายตาม hash ของเนื้อหา (เนื้อหาเดียวกันอยู่ shard เดียวกันเสมอ)
+    """
+    value = doc.metadata.get(key) if key else None
+    value = normalize_query(doc.page_content) if value is None else str(value)
+    return zlib.crc32(value.encode('utf-8')) % shards
+
+
+class ShardClient:
+    """เรียก shard worker หนึ่งตัว (shard_server.py) ผ่าน HTTP/JSON ใช้การเชื่อมต่อ keep-alive หนึ่งเส้นต่อเธรด"""
+
+    def __init__(self, url: str):
+        parts = urlsplit(url)
+        self.url = url
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.prefix = parts.path.rstrip('/')
+        self._local = threading.local()
+
+    def call(self, path: str, payload: Dict = None, timeout: float = None):
+        """POST payload ไปที่ path คืนผลที่ decode แล้ว (400 จาก shard = ValueError อย่างอื่น = ShardError)"""
+        body = json.dumps(payload or {}).encode('utf-8')
+        while True:
+            connection = getattr(self._local, 'connection', None)
+            reused = connection is not None
+            if not reused:
+                connection = self._local.connection = http.client.HTTPConnection(self.host, self.port)
+            connection.timeout = timeout
+            if connection.sock is not None:
+                connection.sock.settimeout(timeout)
+            try:
+                connection.request('POST', self.prefix + path, body, {'Content-Type': 'application/json'})
+                response = connection.getresponse()
+                data = response.read()
+            except (OSError, http.client.HTTPException) as e:
+                connection.close()
+                self._local.connection = None
+                if reused and not isinstance(e, TimeoutError):
+                    continue  # shard ปิดการเชื่อมต่อที่ว่างอยู่ไปแล้ว: ลองใหม่ด้วยการเชื่อมต่อใหม่
+                raise ShardError(f"{self.url}{path}: {e or type(e).__name__}") from e
+            if response.status == 200:
+                return json.loads(data)
+            try:
+                detail = json.loads(data).get('detail', data.decode('utf-8', 'replace'))
+            except ValueError:
+                detail = data.decode('utf-8', 'replace')
+            if response.status == 400:
+                raise ValueError(detail)
+            raise ShardError(f"{self.url}{path}: HTTP {response.status} {detail}")
+
+
+class ShardedVectorDB:
+    """coordinator ที่ใช้แทน VectorDB เมื่อแบ่งเอกสารเป็นหลาย shard (กำหนด VECTOR_SHARDS ดู Model.Model_provider)
+
+    แต่ละ shard คือ VectorDB ของตัวเองใน shard worker (shard_server.py) ซึ่งรันบนเครื่องนี้หรือเครื่องอื่นก็ได้
+    ค้นหา: encode คำค้นครั้งเดียว ส่งไปทุก shard พร้อมกัน แล้วรวม top-k ที่เรียงแล้วของแต่ละ shard ด้วย heap
+    shard ที่ไม่ตอบภายใน SHARD_TIMEOUT วินาทีจะถูกข้าม (ได้ผลจาก shard ที่เหลือ) ถ้าไม่มี shard ใดตอบจะ raise
+    ShardsUnavailableError ใช้ search_shards ถ้าต้องการรู้ว่า shard ใดไม่ได้ตอบ
+    เพิ่มเอกสาร: ส่งไป shard ตาม shard_of(SHARD_KEY) ส่วนคำขอที่อ้าง doc id หรือ source ส่งไปทุก shard
+    การแก้ไขต้องสำเร็จทุก shard ที่เกี่ยวข้อง ไม่เช่นนั้นจะ raise ShardError
+
+    คะแนน BM25 (โหมด lexical / hybrid) คำนวณจากเอกสารใน shard นั้นเอง การรวมอันดับข้าม shard ในโหมดนี้จึงเป็นค่าประมาณ
+    การตรวจเนื้อหาซ้ำตอนนำเข้าทำภายใน shard และ update_document ไม่ย้ายเอกสารข้าม shard แม้ค่า SHARD_KEY จะเปลี่ยน
+    """
+
+    def __init__(self, urls: List[str], encoder, shard_key: str = os.getenv('SHARD_KEY', 'source'),
+                 timeout: float = float(os.getenv('SHARD_TIMEOUT', 2.0)),
+                 write_timeout: float = float(os.getenv('SHARD_WRITE_TIMEOUT', 600)),
+                 batch_timeout: float = float(os.getenv('SHARD_BATCH_TIMEOUT', 30))):
+        if not urls:
+            raise ValueError("ShardedVectorDB needs at least one shard URL")
+        self.encoder = encoder
+        self.shards = [ShardClient(url) for url in urls]
+        self.shard_key = shard_key or None
+        self.timeout = timeout
+        self.write_timeout = write_timeout
+        self.batch_timeout = batch_timeout  # ต่อชุดคำค้นของ search_many
+        self.search_batch_size = int(os.getenv('SEARCH_BATCH_SIZE', 256))
+        self.chunker = TextChunker.from_env(getattr(encoder, 'tokenizer', None))
+        self.search_mode = os.getenv('SEARCH_MODE', 'dense')
+        self.embedding_cache = TTLCache(int(os.getenv('QUERY_EMBEDDING_CACHE_SIZE', 2048)),
+                                        float(os.getenv('QUERY_EMBEDDING_CACHE_TTL', 3600)))
+        self.change_listeners = []
+        # เธรดที่รอคำตอบจาก shard (คำค้นที่ทำพร้อมกันได้ต่อ shard = SHARD_CONNECTIONS)
+        self._pool = ThreadPoolExecutor(max_workers=len(self.shards) * int(os.getenv('SHARD_CONNECTIONS', 8)),
+                                        thread_name_prefix='shard-client')
+
+    def __len__(self):
+        return sum(self._call_all('/count', timeout=self.timeout))
+
+    # ---------- ส่งคำขอ ----------
+    def _scatter(self, path: str, payloads: Dict[int, Dict], timeout: float) -> Tuple[Dict, Dict]:
+        """ส่งคำขอไปหลาย shard พร้อมกัน (payloads: shard -> payload) คืน (shard -> ผล, shard -> error)"""
+        futures = {self._pool.submit(self.shards[shard].call, path, payload, timeout): shard
+                   for shard, payload in payloads.items()}
+        done, pending = wait(futures, timeout=timeout)
+        results, errors = {}, {}
+        for future in pending:
+            future.cancel()
+            shard = futures[future]
+            errors[shard] = ShardError(f"{self.shards[shard].url}{path}: no answer within {timeout}s")
+        for future in done:
+            try:
+                results[futures[future]] = future.result()
+            except ShardError as e:
+                errors[futures[future]] = e
+        return results, errors
+
+    def _call_all(self, path: str, payloads: Dict[int, Dict] = None, timeout: float = None) -> List:
+        """ส่งคำขอไปทุก shard (หรือเฉพาะ shard ใน payloads) และต้องสำเร็จทุกตัว คืนผลเรียงตาม shard"""
+        if payloads is None:
+            payloads = {shard: {} for shard in range(len(self.shards))}
+        results, errors = self._scatter(path, payloads, timeout or self.write_timeout)
+        if errors:
+            raise next(iter(errors.values()))
+        return [results[shard] for shard in sorted(results)]
+
+    # ---------- ค้นหา ----------
+    def encode_query(self, query: str) -> np.ndarray:
+        """เวกเตอร์ของคำค้น (ผ่านแคช)"""
+        key = normalize_query(query)
+        vector = self.embedding_cache.get(key)
+        if vector is None:
+            vector = np.asarray(self.encoder.encode([query])[0], dtype='float32')
+            self.embedding_cache.put(key, vector)
+        return vector
+
+    def search_shards(self, query: str, k=3, nprobe: int = None, ef_search: int = None, filter: Dict = None,
+                      mode: str = None) -> Tuple[List[Dict], List[int]]:
+        """ค้นหาทุก shard พร้อมกัน คืน (top-k รวมจากทุก shard ที่ตอบ, shard ที่ไม่ได้ตอบ)
+
+        ผลแต่ละรายการมีฟิลด์ shard บอกว่ามาจาก shard ใด
+        """
+        mode = self._search_mode(mode, filter)
+        payload = {'query': query, 'k': k, 'nprobe': nprobe, 'ef_search': ef_search, 'filter': filter, 'mode': mode}
+        if mode != 'lexical':
+            payload['vector'] = encode_vector(self.encode_query(query))
+        responses = self._gather('/search', payload, self.timeout)
+        return self._merge(responses, k, mode), sorted(set(range(len(self.shards))) - set(responses))
+
+    def search_many(self, queries: List[str], k=3, nprobe: int = None, ef_search: int = None, filter: Dict = None,
+                    mode: str = None) -> Iterator[List[Dict]]:
+        """ค้นหาหลายคำค้นจากทุก shard คืน iterator ของผลทีละคำค้น (เหมือน VectorDB.search_many)
+
+        ส่งไปทุก shard ทีละชุด SEARCH_BATCH_SIZE คำค้น shard ที่ไม่ตอบภายใน SHARD_BATCH_TIMEOUT จะถูกข้าม
+        """
+        mode = self._search_mode(mode, filter)
+        return self._search_batches(list(queries), k, nprobe, ef_search, filter, mode)
+
+    def _search_batches(self, queries: List[str], k: int, nprobe, ef_search, filter: Optional[Dict],
+                        mode: str) -> Iterator[List[Dict]]:
+        for start in range(0, len(queries), self.search_batch_size):
+            batch = queries[start:start + self.search_batch_size]
+            payload = {'queries': batch, 'k': k, 'nprobe': nprobe, 'ef_search': ef_search, 'filter': filter,
+                       'mode': mode}
+            if mode != 'lexical':
+                payload['vectors'] = encode_vector(self._encode_queries(batch))
+            responses = self._gather('/search_many', payload, self.batch_timeout)
+            for i in range(len(batch)):
+                yield self._merge({shard: answer[i] for shard, answer in responses.items()}, k, mode)
+
+    def _search_mode(self, mode: Optional[str], filter: Optional[Dict]) -> str:
+        mode = mode or self.search_mode
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode '{mode}', expected one of {SEARCH_MODES}")
+        if filter:
+            MetadataIndex.validate(filter)
+        return mode
+
+    def _encode_queries(self, queries: List[str]) -> np.ndarray:
+        """เวกเตอร์ของหลายคำค้น: ใช้เวกเตอร์ในแคชถ้ามี แล้ว encode ที่เหลือในครั้งเดียว"""
+        vectors = [self.embedding_cache.get(normalize_query(query)) for query in queries]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            encoded = np.asarray(self.encoder.encode([queries[i] for i in missing]), dtype='float32')
+            for i, vector in zip(missing, encoded):
+                vectors[i] = vector
+        return np.ascontiguousarray(np.stack(vectors), dtype='float32')
+
+    def _gather(self, path: str, payload: Dict, timeout: float) -> Dict:
+        """ส่งคำค้นไปทุก shard คืน shard -> ผล ของ shard ที่ตอบ (ไม่มี shard ใดตอบ = ShardsUnavailableError)"""
+        responses, errors = self._scatter(path, {shard: payload for shard in range(len(self.shards))}, timeout)
+        if not responses:
+            raise ShardsUnavailableError(f"No shard answered: {'; '.join(str(e) for e in errors.values())}")
+        for shard, error in sorted(errors.items()):
+            print(f"⚠️ shard {shard} ไม่ตอบ ใช้ผลจาก shard ที่เหลือ: {error}")
+        return responses
+
+    @staticmethod
+    def _merge(responses: Dict[int, List[Dict]], k: int, mode: str) -> List[Dict]:
+        """รวม top-k จากผลที่เรียงแล้วของแต่ละ shard: dense เรียงระยะจากน้อยไปมาก โหมดอื่นเรียงคะแนนจากมากไปน้อย"""
+        ranked = [[dict(result, shard=shard) for result in responses[shard]] for shard in sorted(responses)]
+        merged = heapq.merge(*ranked, key=lambda result: result['score'], reverse=mode != 'dense')
+        return list(islice(merged, k))
+
+    def search_for_rag(self, query: str, k=3, nprobe: int = None, ef_search: int = None,
+                       filter: Dict = None, mode: str = None) -> List[Dict]:
+        """ค้นหาข้อความสำหรับ RAG จากทุก shard (พารามิเตอร์เหมือน VectorDB.search_for_rag)"""
+        return self.search_shards(query, k, nprobe, ef_search, filter, mode)[0]
+
+    # ---------- แก้ไข ----------
+    def add_change_listener(self, callback):
+        """callback(doc_ids) ถูกเรียกหลังเอกสารถูกแก้ไขหรือลบผ่าน coordinator นี้"""
+        self.change_listeners.append(callback)
+
+    def _notify_changed(self, doc_ids: List[str]):
+        for callback in list(self.change_listeners):
+            try:
+                callback(doc_ids)
+            except Exception as e:
+                print("❌ change listener ทำงานไม่สำเร็จ:", e)
+
+    def _partition(self, documents: List[Document]) -> Dict[int, List[Dict]]:
+        parts = {shard: [] for shard in range(len(self.shards))}
+        for doc in documents:
+            parts[shard_of(doc, len(self.shards), self.shard_key)].append(
+                {'content': doc.page_content, 'metadata': doc.metadata})
+        return parts
+
+    def add_documents(self, documents: List[Document], batch_size: int = 32,
+                      skip_existing: bool = False) -> List[str]:
+        """เพิ่มเอกสารลง shard ของแต่ละเอกสาร (ทุก shard ทำพร้อมกัน) คืน id ที่เพิ่มจริง"""
+        payloads = {shard: {'documents': docs, 'batch_size': batch_size, 'skip_existing': skip_existing}
+                    for shard, docs in self._partition(documents).items() if docs}
+        if not payloads:
+            return []
+        return [doc_id for ids in self._call_all('/documents', payloads) for doc_id in ids]
+
+    def add_text(self, text: str):
+        self.add_documents([Document(page_content=text, metadata={})])
+
+    def add_document(self, document: Document):
+        self.add_documents([document])
+
+    def replace_source(self, source: str, file_hash: str, documents: List[Document]) -> int:
+        """ทำให้เอกสารของ source ตรงกับไฟล์เวอร์ชันใหม่ในทุก shard คืนจำนวน chunk ที่ถูกลบ"""
+        payloads = {shard: {'source': source, 'file_hash': file_hash, 'documents': docs}
+                    for shard, docs in self._partition(documents).items()}
+        answers = self._call_all('/replace_source', payloads)
+        changed = [doc_id for answer in answers for doc_id in answer['changed']]
+        if changed:
+            self._notify_changed(changed)
+        return sum(answer['removed'] for answer in answers)
+
+    def delete_document(self, doc_id: str) -> bool:
+        """ลบเอกสารด้วย ID (ส่งไปทุก shard)"""
+        if not any(self._call_all('/delete', {shard: {'id': doc_id} for shard in range(len(self.shards))})):
+            return False
+        self._notify_changed([doc_id])
+        return True
+
+    def update_document(self, doc_id: str, new_content: str, new_metadata: Dict = None) -> bool:
+        """อัพเดตเอกสารด้วย ID (shard ที่มีเอกสารนี้เป็นผู้แก้ไข)"""
+        payload = {'id': doc_id, 'content': new_content, 'metadata': new_metadata}
+        if not any(self._call_all('/update', {shard: payload for shard in range(len(self.shards))})):
+            return False
+        self._notify_changed([doc_id])
+        return True
+
+    def load_db(self):
+        """ให้ทุก shard โหลดฐานข้อมูลของตัวเองจากไฟล์ใหม่"""
+        self._call_all('/reload')
+
+    # ---------- อ่าน ----------
+    def find_file(self, file_hash: str):
+        """source ที่นำเข้าไฟล์ที่มี file_hash นี้ไว้แล้ว (None ถ้ายังไม่มี)"""
+        sources = self._call_all('/find_file', {shard: {'file_hash': file_hash} for shard in range(len(self.shards))},
+                                 self.timeout)
+        return next((source for source in sources if source is not None), None)
+
+    def count_source(self, source: str) -> int:
+        return sum(self._call_all('/count', {shard: {'source': source} for shard in range(len(self.shards))},
+                                  self.timeout))
+
+    def get_document(self, doc_id: str) -> Dict:
+        """ดึงข้อมูลเอกสารด้วย ID"""
+        documents = self._call_all('/get', {shard: {'id': doc_id} for shard in range(len(self.shards))}, self.timeout)
+        return next((doc for doc in documents if doc is not None), None)
+
+    def list_documents(self, skip: int = 0, limit: int = 10) -> List[Dict]:
+        """แสดงรายการเอกสารทั้งหมดแบบแบ่งหน้า (เรียงตาม shard แล้วตามแถวใน shard)"""
+        documents = []
+        for shard, count in enumerate(self._call_all('/count', timeout=self.timeout)):
+            if len(documents) >= limit:
+                break
+            if skip >= count:
+                skip -= count
+                continue
+            documents += self.shards[shard].call('/list', {'skip': skip, 'limit': limit - len(documents)},
+                                                 self.timeout)
+            skip = 0
+        return documents
+
+    def cache_stats(self) -> Dict:
+        results, errors = self._scatter('/stats', {shard: {} for shard in range(len(self.shards))}, self.timeout)
+        return {
+            'query_embeddings': self.embedding_cache.stats(),
+            'shards': [results.get(shard, {'error': str(errors.get(shard))}) for shard in range(len(self.shards))]
+        }
@@ -0,0 +1,213 @@
+# snapshot.py
+import json
+import os
+import threading
+import uuid
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Tuple
+
+import faiss
+import numpy as np
+
+CATALOG_FILE = 'segments.json'
+CATALOG_VERSION = 1
+
+
+class Segment:
+    """FAISS index ที่สร้างเสร็จแล้วและจะไม่ถูกแก้ไขอีก (rows = FAISS id ทั้งหมดใน index เรียงจากน้อยไปมาก)
+
+    name คือชื่อไฟล์ของ segment ที่บันทึกแล้ว (None = อยู่ในหน่วยความจำเท่านั้น)
+    """
+
+    __slots__ = ('index', 'kind', 'rows', 'name')
+
+    def __init__(self, index, kind: str, rows: np.ndarray, name: Optional[str] = None):
+        self.index = index
+        self.kind = kind
+        self.rows = rows
+        self.name = name
+
+    def __len__(self):
+        return len(self.rows)
+
+
+def _segment_files(path: str, name: str) -> Tuple[str, str]:
+    return os.path.join(path, name + '.faiss'), os.path.join(path, name + '.rows.npy')
+
+
+def write_segment(path: str, segment: Segment, mmap: bool = True) -> Segment:
+    """บันทึก segment ลงโฟลเดอร์ path แล้วเปิดใหม่จากไฟล์ (mmap = ใช้หน่วยความจำร่วมกับ process อื่นผ่าน page cache)"""
+    os.makedirs(path, exist_ok=True)
+    name = uuid.uuid4().hex
+    index_file, rows_file = _segment_files(path, name)
+    faiss.write_index(segment.index, index_file + '.tmp')
+    os.replace(index_file + '.tmp', index_file)
+    np.save(rows_file, np.ascontiguousarray(segment.rows, dtype='int64'))
+    return open_segment(path, {'name': name, 'kind': segment.kind}, mmap)
+
+
+def open_segment(path: str, entry: Dict, mmap: bool = True) -> Segment:
+    index_file, rows_file = _segment_files(path, entry['name'])
+    if mmap:
+        index = faiss.read_index(index_file, faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY)
+        rows = np.load(rows_file, mmap_mode='r')
+    else:
+        index, rows = faiss.read_index(index_file), np.load(rows_file)
+    return Segment(index, entry['kind'], rows, entry['name'])
+
+
+def read_catalog(path: str) -> Optional[Dict]:
+    """รายการ segment ที่ commit แล้ว (None ถ้ายังไม่มีหรืออ่านไม่ได้)
+
+        generation   เพิ่มขึ้นทุกครั้งที่รายการ segment เปลี่ยน
+        sealed_rows  ทุกแถวที่ยังไม่ถูกลบและน้อยกว่าค่านี้อยู่ใน segment แถวที่เหลือคือ delta
+        segments     [{"name", "kind", "rows"}]
+    """
+    try:
+        with open(os.path.join(path, CATALOG_FILE), 'r', encoding='utf-8') as f:
+            catalog = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return catalog if catalog.get('version') == CATALOG_VERSION else None
+
+
+def write_catalog(path: str, catalog: Dict):
+    """สลับ catalog ใหม่เข้าแทนด้วย os.replace แล้วลบไฟล์ segment ที่ไม่อยู่ในรายการแล้ว
+
+    process ที่ยังเปิด segment เก่าด้วย mmap อยู่ใช้ต่อได้ (ไฟล์หายจากโฟลเดอร์แต่ข้อมูลยังอยู่จนปิด)
+    """
+    os.makedirs(path, exist_ok=True)
+    catalog = dict(catalog, version=CATALOG_VERSION)
+    tmp = os.path.join(path, CATALOG_FILE + '.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(catalog, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, os.path.join(path, CATALOG_FILE))
+    listed = {entry['name'] for entry in catalog['segments']}
+    for file_name in os.listdir(path):
+        name = file_name.split('.', 1)[0]
+        if file_name != CATALOG_FILE and name not in listed:
+            try:
+                os.remove(os.path.join(path, file_name))
+            except OSError:  # Windows ลบไฟล์ที่ยังถูก map อยู่ไม่ได้ จะลองใหม่ครั้งถัดไป
+                pass
+
+
+class Snapshot:
+    """สถานะของ index ที่ผู้ค้นหาอ่านได้โดยไม่ต้องล็อก ไม่มีส่วนใดถูกแก้ไขหลังเผยแพร่แล้ว
+
+        segments       FAISS index ที่ปิดแล้ว (ค้นหาทุกตัวแล้วรวมผล)
+        delta_rows     แถวที่เพิ่มหลัง segment ล่าสุด ค้นแบบ brute-force จาก delta_vectors
+        dead           แถวที่ถูกลบแต่ยังอยู่ใน segment (กรองออกด้วย IDSelector)
+        vectors        memmap ของเวกเตอร์ใน VectorStore ถึงแถว rows
+
+    ผู้เขียนสร้าง Snapshot ใหม่ทุกครั้งที่ commit แล้วสลับ reference ครั้งเดียว
+    ผู้ค้นหาอ่าน reference หนึ่งครั้งต่อคำค้น จึงเห็นสถานะที่สอดคล้องกันเสมอ
+    """
+
+    def __init__(self, generation: int, rows: int, segments: Tuple[Segment, ...], delta_rows: np.ndarray,
+                 delta_vectors: np.ndarray, dead: frozenset, vectors: np.ndarray):
+        self.generation = generation
+        self.rows = rows
+        self.segments = segments
+        self.delta_rows = delta_rows
+        self.delta_vectors = delta_vectors
+        self.dead = dead
+        self.vectors = vectors
+        self._dead_selector = None
+        if dead:
+            batch = faiss.IDSelectorBatch(np.fromiter(dead, dtype='int64', count=len(dead)))
+            self._dead_selector = (batch, faiss.IDSelectorNot(batch))  # เก็บ batch ไว้ไม่ให้ถูกคืนหน่วยความจำ
+
+    def __len__(self):
+        return sum(len(segment) for segment in self.segments) + len(self.delta_rows) - len(self.dead)
+
+    def search(self, query: np.ndarray, k: int, factory, nprobe: int = None, ef_search: int = None,
+               allowed: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """k เวกเตอร์ที่ใกล้ที่สุดจากทุก segment และ delta คืน (ระยะ, FAISS id) ของคำค้นเดียว
+
+        allowed จำกัดการค้นหาเฉพาะแถวเหล่านี้ (ต้องไม่มีแถวที่ถูกลบ)
+        """
+        D, I = self.search_many(query, k, factory, nprobe, ef_search, allowed)
+        found = I[0] >= 0
+        return D[0][found], I[0][found]
+
+    def search_many(self, queries: np.ndarray, k: int, factory, nprobe: int = None, ef_search: int = None,
+                    allowed: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """ค้นหลายคำค้นในครั้งเดียว (queries ขนาด คำค้น x มิติ) คืน (ระยะ, FAISS id) ขนาด คำค้น x k
+
+        ช่องที่ไม่มีผล (มีเวกเตอร์น้อยกว่า k) มี id เป็น -1 และอยู่ท้ายแถว
+        """
+        if allowed is not None:
+            batch = faiss.IDSelectorBatch(allowed)
+            selector = batch
+        else:
+            selector = self._dead_selector[1] if self._dead_selector else None
+
+        distances, ids = [], []
+        for segment in self.segments:
+            params = factory.search_params(segment.kind, nprobe, ef_search, selector)
+            D, I = segment.index.search(queries, min(k, len(segment)), params=params)
+            distances.append(D)
+            ids.append(I)
+        rows, vectors = self.delta_rows, self.delta_vectors
+        if allowed is not None and len(rows):
+            keep = np.isin(rows, allowed)
+            rows, vectors = rows[keep], vectors[keep]
+        if len(rows):
+            D, I = faiss.knn(queries, vectors, min(k, len(rows)))
+            distances.append(D)
+            ids.append(rows[I])
+        if not ids:
+            return np.empty((len(queries), 0), dtype='float32'), np.empty((len(queries), 0), dtype='int64')
+
+        D, I = np.hstack(distances), np.hstack(ids)
+        D[I < 0] = np.inf
+        order = np.argsort(D, axis=1, kind='stable')[:, :k]
+        return np.take_along_axis(D, order, axis=1), np.take_along_axis(I, order, axis=1)
+
+
+class WriteQueue:
+    """ผู้เขียนคนเดียว: รวมคำขอแก้ไขที่รอคิวอยู่เป็นชุดแล้วส่งให้ apply(batch) ในเธรดเดียว
+
+    batch คือ list ของ (op, args, future) และ apply ต้องตั้งผลให้ทุก future
+    เธรดผู้เขียนเริ่มเมื่อมีงานและจบเองเมื่อว่างนาน idle_seconds
+    ห้ามเรียก submit(...).result() จากใน apply เพราะจะรอตัวเอง
+    """
+
+    def __init__(self, apply: Callable[[List[Tuple[str, tuple, Future]]], None], max_batch: int = 64,
+                 idle_seconds: float = 5.0):
+        self._apply = apply
+        self.max_batch = max_batch
+        self.idle_seconds = idle_seconds
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def submit(self, op: str, *args) -> Future:
+        future = Future()
+        with self._cond:
+            self._queue.append((op, args, future))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='vector-db-writer', daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return future
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._queue:
+                    self._cond.wait(self.idle_seconds)
+                if not self._queue:
+                    self._thread = None
+                    return
+                batch = [self._queue.popleft() for _ in range(min(len(self._queue), self.max_batch))]
+            try:
+                self._apply(batch)
+            except BaseException as e:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
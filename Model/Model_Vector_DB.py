@@ -1,158 +1,930 @@
 # vector_db.py
 import faiss
+import hashlib
 import numpy as np
 import os
-import pickle
+import threading
+import time
+from collections import deque
+from itertools import groupby
 from sentence_transformers import SentenceTransformer
 import uuid
-from pythainlp import word_tokenize
-from typing import List, Dict
-from Model.document import Document
+from typing import Dict, Iterator, List, Optional
+from Tools.Tools_document import Document
+from Tools.Tools_chunker import TextChunker
+from Model.Model_Vector_Store import VectorStore, add_entry, delete_entry, migrate_pickle
+from Model.Model_Index_Factory import IndexFactory
+from Model.Model_Query_Cache import TTLCache, normalize_query
+from Model.Model_Embedding_Cache import open_embedding_cache, text_key
+from Model.Model_Metadata_Index import MetadataIndex, canonical_filter
+from Model.Model_Document_Store import DocumentStore
+from Model.Model_Lexical_Index import BM25Index, analyze, reciprocal_rank_fusion
+from Model.Model_Snapshot import (Segment, Snapshot, WriteQueue, open_segment, read_catalog, write_catalog,
+                                  write_segment)
+from Tools.Tools_file_lock import FileLock
+
+# revision ของโมเดล embedding (เป็นส่วนหนึ่งของคีย์ในแคชเวกเตอร์ถาวร)
+MODEL_REVISION = os.getenv('EMBEDDING_MODEL_REVISION', 'main')
+# dense = เวกเตอร์อย่างเดียว, lexical = BM25 อย่างเดียว, hybrid = รวมทั้งสองด้วย reciprocal rank fusion
+SEARCH_MODES = ('dense', 'lexical', 'hybrid')
+# metadata ที่ระบบใช้ตรวจข้อมูลซ้ำ: เก็บไว้กับเอกสาร (ใช้สร้างตารางตรวจซ้ำใหม่ตอนโหลด) แต่ไม่คืนให้ผู้เรียก
+# และผู้เรียกแก้ไขผ่าน update_document ไม่ได้
+INTERNAL_FIELDS = ('content_hash', 'file_hash')
+
+
+def content_hash(text: str) -> str:
+    """ลายนิ้วมือของเนื้อหา chunk (หลัง normalize) ใช้ตรวจ chunk ซ้ำ"""
+    return hashlib.sha256(normalize_query(text).encode('utf-8')).hexdigest()
 
 class VectorDB:
-    def __init__(self, model_name='nomic-ai/nomic-embed-text-v1', db_file='vector_db.pkl'):
-        self.encoder = SentenceTransformer(model_name,trust_remote_code=True)
+    def __init__(self, model_name='nomic-ai/nomic-embed-text-v1', db_path='vector_store', encoder=None,
+                 legacy_db_file='vector_db.pkl', index_type=None,
+                 embedding_cache_path=os.getenv('EMBEDDING_CACHE_PATH', 'embedding_cache'),
+                 lexical_index=os.getenv('LEXICAL_INDEX', '1') != '0'):
+        # ส่ง encoder เข้ามาเพื่อใช้โมเดลร่วมกัน (ดู Model.Model_provider)
+        self.encoder = encoder or SentenceTransformer(model_name, trust_remote_code=True, revision=MODEL_REVISION)
         self.dimension = 768  # ขนาดเวกเตอร์ของโมเดล nomic-embed-text-v1
-        self.index = faiss.IndexFlatL2(self.dimension)
-        self.texts = []
-        self.db_file = db_file
-        self.ids = []
-        self.documents = []
+        # แคชเวกเตอร์ของ chunk บนดิสก์ (None = ไม่ใช้): ทุกการ encode เอกสารจะอ่านจากแคชก่อน
+        self.vector_cache = open_embedding_cache(
+            embedding_cache_path, model_name, MODEL_REVISION, self.dimension,
+            os.getenv('EMBEDDING_CACHE_DTYPE', 'float16')
+        ) if embedding_cache_path else None
+        # ตัดข้อความตามจำนวน token ของ tokenizer ของโมเดล (ตัดคำภาษาไทยด้วย pythainlp)
+        self.chunker = TextChunker.from_env(getattr(self.encoder, 'tokenizer', None))
+        # ชนิด index: auto / flat / hnsw / ivf / ivfpq (ดู Model.Model_Index_Factory)
+        self.index_factory = IndexFactory(self.dimension, index_type or os.getenv('VECTOR_INDEX_TYPE', 'auto'))
+        # index แบ่งเป็น segment ที่สร้างเสร็จแล้ว + delta ที่ยังไม่ได้สร้าง index (ดู Model.Model_Snapshot)
+        # ผู้ค้นหาอ่าน self.snapshot โดยไม่ล็อก ส่วนการแก้ไขทั้งหมดผ่านผู้เขียนคนเดียว (self._writes)
+        self.seal_rows = int(os.getenv('SNAPSHOT_DELTA_ROWS', 2048))  # delta ขนาดนี้จะถูกสร้างเป็น segment
+        self.merge_factor = int(os.getenv('SNAPSHOT_MERGE_FACTOR', 4))  # segment ขนาดใกล้กันกี่ตัวจึงรวมเป็นตัวเดียว
+        # เก็บข้อความของแถวที่ถูกลบไว้กี่วินาที ให้ผู้ค้นหาที่ยังถือ snapshot เก่าอ่านได้
+        self.release_grace = float(os.getenv('SNAPSHOT_RELEASE_SECONDS', 30))
+        self._segments: List[Segment] = []
+        self._delta_rows = np.empty(0, dtype='int64')
+        self._delta_vectors = np.empty((0, self.dimension), dtype='float32')
+        self._dead = set()  # แถวที่ถูกลบแต่ยังอยู่ใน segment
+        self._pending_rows, self._pending_vectors, self._pending_deleted = [], [], []
+        self._graveyard = deque()  # (เวลาที่ลบ, แถว) ที่รอคืนหน่วยความจำ
+        self.snapshot: Optional[Snapshot] = None
+        self._writes = WriteQueue(self._apply_batch)
+        # หลาย process (uvicorn workers) ใช้ db_path เดียวกันได้: segment ที่ปิดแล้วถูกบันทึกใน <db_path>/segments
+        # และเปิดด้วย mmap (page cache ใช้ร่วมกัน) ผู้เขียนของทุก process ผลัดกันเขียนภายใต้ lock ไฟล์ <db_path>.lock
+        self.segment_path = os.path.join(db_path, 'segments')
+        self.segment_mmap = os.getenv('SEGMENT_MMAP', '1') != '0'
+        self.write_lock = FileLock(db_path.rstrip('/\\') + '.lock')
+        self.refresh_interval = float(os.getenv('STORE_REFRESH_SECONDS', 1.0))  # ตรวจ generation บนดิสก์ทุกกี่วินาที
+        self.sealed_rows = 0  # แถวที่ยังไม่ถูกลบและน้อยกว่าค่านี้อยู่ใน segment แล้ว
+        self._persist_segments = True
+        self._catalog_generation = 0
+        self._refresh_checked = 0.0
+        self._refresh_requested = False
+        # แคชเวกเตอร์ของคำค้น และแคชผลการค้นหา (ผลการค้นหาผูกกับ generation ของ index)
+        self.generation = 0
+        self.embedding_cache = TTLCache(int(os.getenv('QUERY_EMBEDDING_CACHE_SIZE', 2048)),
+                                        float(os.getenv('QUERY_EMBEDDING_CACHE_TTL', 3600)))
+        self.result_cache = TTLCache(int(os.getenv('SEARCH_RESULT_CACHE_SIZE', 1024)),
+                                     float(os.getenv('SEARCH_RESULT_CACHE_TTL', 300)))
+        self.change_listeners = []  # callback(doc_ids) เมื่อเอกสารถูกแก้ไขหรือลบ
+        # ผู้เขียนถือ lock ระหว่างแก้ไข index/ไฟล์ (encode ทำนอก lock ผู้ค้นหาไม่ใช้ lock)
+        self._lock = threading.RLock()
+        self.db_path = db_path
+        self.legacy_db_file = legacy_db_file
+        self.store = VectorStore(db_path, self.dimension)
+        # เอกสารแยกตาม FAISS id (= แถวใน vectors.f32) และ doc id -> แถว
+        self.documents = DocumentStore()
+        # ตรวจข้อมูลซ้ำตอนนำเข้า: (source, content_hash) -> doc id, source -> doc ids และ source -> file_hash ล่าสุด
+        # content_docs (content_hash -> doc id ของ source ใดก็ได้) ใช้หาเวกเตอร์ที่มีอยู่แล้วของเนื้อหาเดียวกัน
+        self.content_hashes = {}
+        self.content_docs = {}
+        self.source_docs = {}
+        self.source_files = {}
+        # inverted index ของ metadata สำหรับค้นหาแบบมี filter
+        self.metadata_index = MetadataIndex()
+        # ถ้าแถวที่ตรงกับ filter ไม่เกินจำนวนนี้ จะคำนวณระยะเฉพาะแถวเหล่านั้นตรงๆ แทนการค้นใน index
+        self.filter_scan_limit = int(os.getenv('FILTER_SCAN_LIMIT', 4096))
+        # BM25 index (ตัดคำด้วย pythainlp) สำหรับโหมด lexical / hybrid
+        self.lexical_index = BM25Index(os.path.join(db_path, 'lexical')) if lexical_index else None
+        self.search_mode = os.getenv('SEARCH_MODE', 'dense')
+        self.hybrid_candidates = int(os.getenv('HYBRID_CANDIDATES', 50))  # จำนวนผลจากแต่ละฝั่งที่นำมารวมกัน
+        self.search_batch_size = int(os.getenv('SEARCH_BATCH_SIZE', 256))  # คำค้นต่อการ encode/ค้นหนึ่งครั้งใน search_many
         self.load_db()
 
+    def __len__(self):
+        return len(self.documents)
+
+    def _rebuild_index(self, persist: bool = True):
+        """สร้าง (และ train) index ใหม่เป็น segment เดียวจากเวกเตอร์ใน VectorStore โดยไม่ต้อง encode ใหม่
+
+        persist=False เก็บ segment ไว้ในหน่วยความจำเท่านั้น (เช่น เมื่อโหลดข้อมูลไม่สำเร็จ ไม่ทับ segment เดิมบนดิสก์)
+        """
+        self._persist_segments = persist
+        rows = self.documents.live_rows()
+        self._segments = [self._build_segment(rows)] if len(rows) else []
+        self.sealed_rows = self.store.rows
+        self._delta_rows = np.empty(0, dtype='int64')
+        self._delta_vectors = np.empty((0, self.dimension), dtype='float32')
+        self._dead = set()
+        self._pending_rows, self._pending_vectors, self._pending_deleted = [], [], []
+        self._graveyard.clear()
+        if persist:
+            self._write_catalog()
+
+    def _build_segment(self, rows: np.ndarray, vectors: np.ndarray = None) -> Segment:
+        if vectors is None:
+            vectors = self.store.vectors()[rows]
+        segment = Segment(*self.index_factory.build(vectors, rows), rows)
+        return write_segment(self.segment_path, segment, self.segment_mmap) if self._persist_segments else segment
+
+    def _write_catalog(self):
+        """บันทึกรายการ segment ปัจจุบัน (ผู้เขียนเรียกขณะถือ write_lock)"""
+        self._catalog_generation += 1
+        write_catalog(self.segment_path, {
+            'generation': self._catalog_generation,
+            'index_type': self.index_factory.index_type,
+            'sealed_rows': self.sealed_rows,
+            'segments': [{'name': segment.name, 'kind': segment.kind, 'rows': len(segment)}
+                         for segment in self._segments]
+        })
+        self.store.log([])  # เพิ่ม generation ของ store ให้ process อื่นรู้ว่ามี segment ใหม่
+
+    def _open_saved_segments(self) -> bool:
+        """ใช้ segment ที่บันทึกไว้แทนการสร้าง index ใหม่ตอนโหลด คืน False ถ้าไม่มีหรือใช้ไม่ได้"""
+        catalog = read_catalog(self.segment_path)
+        if catalog is None or catalog.get('index_type') != self.index_factory.index_type \
+                or catalog['sealed_rows'] > self.store.rows:  # เช่น store ถูก restore เป็นรุ่นเก่า
+            return False
+        try:
+            self._open_catalog(catalog)
+        except (RuntimeError, OSError, ValueError) as e:
+            print("⚠️ เปิด segment ที่บันทึกไว้ไม่สำเร็จ จะสร้าง index ใหม่:", e)
+            return False
+        return True
+
+    def _open_catalog(self, catalog: Dict):
+        """ใช้ segment ตาม catalog (process อื่นอาจสร้างไว้) แล้วคำนวณ delta และแถวที่ถูกลบจากเอกสารปัจจุบัน"""
+        opened = {segment.name: segment for segment in self._segments}
+        self._segments = [opened.get(entry['name']) or open_segment(self.segment_path, entry, self.segment_mmap)
+                          for entry in catalog['segments']]
+        self._catalog_generation = catalog['generation']
+        self.sealed_rows = catalog['sealed_rows']
+
+        alive = np.zeros(self.store.rows, dtype='uint8')
+        known = np.frombuffer(bytes(self.documents.alive), dtype='uint8')[:self.store.rows]
+        alive[:len(known)] = known
+        self._dead = set()
+        for segment in self._segments:
+            rows = np.asarray(segment.rows)
+            self._dead.update(rows[alive[rows] == 0].tolist())
+        rows = np.flatnonzero(alive[self.sealed_rows:]).astype('int64') + self.sealed_rows
+        self._delta_rows = rows
+        self._delta_vectors = np.ascontiguousarray(self.store.vectors()[rows]) if len(rows) \
+            else np.empty((0, self.dimension), dtype='float32')
+        if self._pending_deleted:
+            self._graveyard.append((time.monotonic(), list(self._pending_deleted)))
+        self._pending_rows, self._pending_vectors, self._pending_deleted = [], [], []
+
+    def _publish(self):
+        """รวมการแก้ไขที่ค้างอยู่เข้ากับ index แล้วเผยแพร่ Snapshot ใหม่ (ผู้เขียนเรียกภายใต้ lock)
+
+        แถวใหม่เข้า delta ก่อน เมื่อครบ seal_rows จึงสร้างเป็น segment แถวที่ถูกลบใน segment
+        ถูกกรองออกตอนค้นหาจนกว่า segment นั้นจะถูกรวมใหม่ (ดู _compact)
+        """
+        segments = [segment.name for segment in self._segments]
+        rows, vectors = self._delta_rows, self._delta_vectors
+        if self._pending_rows:
+            rows = np.concatenate([rows] + self._pending_rows)
+            vectors = np.concatenate([vectors] + self._pending_vectors)
+        if self._pending_deleted:
+            deleted = np.array(self._pending_deleted, dtype='int64')
+            self._dead.update(deleted[~np.isin(deleted, rows)].tolist())
+            keep = ~np.isin(rows, deleted)
+            rows, vectors = rows[keep], vectors[keep]
+            self._graveyard.append((time.monotonic(), deleted.tolist()))
+        self._pending_rows, self._pending_vectors, self._pending_deleted = [], [], []
+
+        if len(rows) >= self.seal_rows:
+            self._segments.append(self._build_segment(rows, vectors))
+            rows, vectors = rows[:0], vectors[:0]
+            self.sealed_rows = self.store.rows
+        self._delta_rows, self._delta_vectors = rows, vectors
+        self._compact()
+        if self._persist_segments and segments != [segment.name for segment in self._segments]:
+            self._write_catalog()
+
+        self._index_changed()
+        self.snapshot = Snapshot(self.generation, self.store.rows, tuple(self._segments), rows, vectors,
+                                 frozenset(self._dead), self.store.vectors())
+        self._release_deleted()
+
+    def _level(self, size: int) -> int:
+        level, size = 0, size // self.seal_rows
+        while size >= self.merge_factor:
+            size //= self.merge_factor
+            level += 1
+        return level
+
+    def _compact(self):
+        """รวม segment ขนาดใกล้กันครบ merge_factor ตัวเป็นตัวเดียว (จำนวน segment จึงโตแบบ log)
+        หรือรวมทั้งหมดเมื่อแถวที่ถูกลบเกิน max_tombstone_ratio ของเอกสารทั้งหมด"""
+        if self._segments and len(self._dead) > self.index_factory.max_tombstone_ratio * max(len(self.documents), 1):
+            print(f"🔄 สร้าง index ใหม่ (ลบไปแล้ว {len(self._dead)} เวกเตอร์)")
+            self._segments = [segment for segment in [self._merge(self._segments)] if segment is not None]
+            return
+        while True:
+            levels = {}
+            for segment in self._segments:
+                levels.setdefault(self._level(len(segment)), []).append(segment)
+            group = next((group for group in levels.values() if len(group) >= self.merge_factor), None)
+            if group is None:
+                return
+            merged = self._merge(group)
+            self._segments = [segment for segment in self._segments if all(segment is not g for g in group)]
+            if merged is not None:
+                self._segments.append(merged)
+
+    def _merge(self, segments: List[Segment]) -> Optional[Segment]:
+        """segment ใหม่จากแถวที่ยังไม่ถูกลบของ segments (อ่านเวกเตอร์จาก VectorStore และ train ใหม่ถ้าจำเป็น)"""
+        rows = np.concatenate([segment.rows for segment in segments])
+        if self._dead:
+            dead = np.isin(rows, np.fromiter(self._dead, dtype='int64', count=len(self._dead)))
+            self._dead.difference_update(rows[dead].tolist())
+            rows = rows[~dead]
+        rows.sort()
+        return self._build_segment(rows) if len(rows) else None
+
+    def _release_deleted(self):
+        """คืนหน่วยความจำของแถวที่ถูกลบนานกว่า release_grace วินาที"""
+        deadline = time.monotonic() - self.release_grace
+        while self._graveyard and self._graveyard[0][0] <= deadline:
+            self.documents.release(self._graveyard.popleft()[1])
+
+    def _index_changed(self):
+        """เรียกก่อนเผยแพร่ snapshot ใหม่: ผลการค้นหาในแคชของ generation เก่าจะใช้ไม่ได้อีก"""
+        self.generation += 1
+        self.result_cache.clear()
+
+    def add_change_listener(self, callback):
+        """ลงทะเบียน callback(doc_ids) ที่จะถูกเรียกเมื่อเอกสารถูกแก้ไขหรือลบ (เช่น ล้างแคชคำตอบ)"""
+        self.change_listeners.append(callback)
+
+    def _notify_changed(self, doc_ids: List[str]):
+        for callback in list(self.change_listeners):
+            try:
+                callback(doc_ids)
+            except Exception as e:
+                print("❌ change listener ทำงานไม่สำเร็จ:", e)
+
+    def encode_query(self, query: str) -> np.ndarray:
+        """เวกเตอร์ของคำค้น (ผ่านแคช)"""
+        key = normalize_query(query)
+        vector = self.embedding_cache.get(key)
+        if vector is None:
+            vector = np.asarray(self.encoder.encode([query])[0], dtype='float32')
+            self.embedding_cache.put(key, vector)
+        return vector
+
+    def cache_stats(self) -> Dict:
+        return {
+            'query_embeddings': self.embedding_cache.stats(),
+            'search_results': self.result_cache.stats(),
+            'document_embeddings': self.vector_cache.stats() if self.vector_cache else None
+        }
+
+    def encode_documents(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        """เวกเตอร์ของข้อความเอกสาร: อ่านจากแคชเวกเตอร์ถาวรก่อน แล้ว encode เฉพาะข้อความที่ไม่มีในแคช"""
+        if self.vector_cache is None:
+            return np.asarray(self.encoder.encode(texts, batch_size=batch_size), dtype='float32')
+        keys = [text_key(text) for text in texts]
+        vectors, found = self.vector_cache.get_many(keys)
+        missing = [i for i, ok in enumerate(found) if not ok]
+        if missing:
+            encoded = np.asarray(self.encoder.encode([texts[i] for i in missing], batch_size=batch_size),
+                                 dtype='float32')
+            vectors[missing] = encoded
+            self.vector_cache.put_many([keys[i] for i in missing], encoded)
+        return vectors
+
+    def warm_vector_cache(self) -> int:
+        """ใส่เวกเตอร์ที่อยู่ใน VectorStore ลงแคชเวกเตอร์ (เช่น หลังแปลงจาก pickle) คืนจำนวนที่เพิ่ม"""
+        if self.vector_cache is None or not len(self.documents):
+            return 0
+        added = 0
+        vectors = self.store.vectors()
+        live = self.documents.live_rows()
+        for start in range(0, len(live), 4096):
+            rows = live[start:start + 4096]
+            added += self.vector_cache.put_many(
+                [text_key(self.documents.text(row)) for row in rows.tolist()], vectors[rows]
+            )
+        return added
+
+    def _load_lexical_index(self):
+        if self.lexical_index is not None:
+            self.lexical_index.load(self.documents.live_rows().tolist(), self.documents.text, self.store.rows)
+
+    def _hash_of(self, doc: Document) -> str:
+        """content_hash ของเอกสาร (คำนวณและเก็บใน metadata ถ้ายังไม่มี)"""
+        digest = doc.metadata.get('content_hash')
+        if digest is None:
+            digest = doc.metadata['content_hash'] = content_hash(doc.page_content)
+        return digest
+
+    def _dedup_key(self, doc: Document) -> tuple:
+        """คีย์ตรวจ chunk ซ้ำ: เนื้อหาเดียวกันใน source เดียวกัน (source อื่นเก็บ chunk ของตัวเองแยกกัน)"""
+        return doc.metadata.get('source'), self._hash_of(doc)
+
+    def _track(self, doc_id: str, doc: Document, row_id: int):
+        self.metadata_index.add(row_id, doc.metadata)
+        self.content_hashes.setdefault(self._dedup_key(doc), doc_id)
+        self.content_docs.setdefault(self._hash_of(doc), doc_id)
+        source = doc.metadata.get('source')
+        if source is not None:
+            self.source_docs.setdefault(source, set()).add(doc_id)
+            if doc.metadata.get('file_hash'):
+                self.source_files[source] = doc.metadata['file_hash']
+
+    def _untrack(self, doc_id: str, doc: Document, row_id: int):
+        self.metadata_index.remove(row_id, doc.metadata)
+        key = self._dedup_key(doc)
+        if self.content_hashes.get(key) == doc_id:
+            del self.content_hashes[key]
+        if self.content_docs.get(key[1]) == doc_id:
+            del self.content_docs[key[1]]
+        source = doc.metadata.get('source')
+        doc_ids = self.source_docs.get(source)
+        if doc_ids is not None:
+            doc_ids.discard(doc_id)
+            if not doc_ids:
+                del self.source_docs[source]
+                self.source_files.pop(source, None)
+
+    def _rebuild_tracking(self):
+        self.content_hashes, self.content_docs, self.source_docs, self.source_files = {}, {}, {}, {}
+        self.metadata_index.clear()
+        for row_id, doc_id, doc in self.documents.items():
+            self._track(doc_id, doc, row_id)
+
+    def find_file(self, file_hash: str):
+        """source ที่นำเข้าไฟล์ที่มี file_hash นี้ไว้แล้ว (None ถ้ายังไม่มี)"""
+        for source, digest in list(self.source_files.items()):
+            if digest == file_hash:
+                return source
+        return None
+
+    def count_source(self, source: str) -> int:
+        """จำนวน chunk ของ source"""
+        return len(self.source_docs.get(source, ()))
+
+    def _new_documents(self, documents: List[Document]) -> List[Document]:
+        """เฉพาะเอกสารที่เนื้อหายังไม่มีใน source ของมัน (และไม่ซ้ำกันเองในชุดนี้)"""
+        seen, new = set(), []
+        for doc in documents:
+            key = self._dedup_key(doc)
+            if key not in self.content_hashes and key not in seen:
+                seen.add(key)
+                new.append(doc)
+        return new
+
+    def _document_vectors(self, documents: List[Document], batch_size: int = 32) -> np.ndarray:
+        """เวกเตอร์ของเอกสารที่จะเพิ่ม: เนื้อหาที่มีอยู่แล้ว (เช่น chunk เดียวกันใน source อื่น) ใช้เวกเตอร์ใน VectorStore
+        ส่วนที่เหลือผ่าน encode_documents"""
+        rows = []
+        for doc in documents:
+            doc_id = self.content_docs.get(doc.metadata['content_hash'])
+            rows.append(self.documents.row_of(doc_id) if doc_id is not None else None)
+        missing = [i for i, row in enumerate(rows) if row is None]
+        if len(missing) == len(documents):
+            return self.encode_documents([doc.page_content for doc in documents], batch_size)
+        vectors = np.empty((len(documents), self.dimension), dtype='float32')
+        stored = [i for i, row in enumerate(rows) if row is not None]
+        vectors[stored] = self.store.vectors()[[rows[i] for i in stored]]
+        if missing:
+            vectors[missing] = self.encode_documents([documents[i].page_content for i in missing], batch_size)
+        return vectors
+
     def add_text(self, text: str):
-        vector = self.encoder.encode([text])[0]
-        self.index.add(np.array([vector]).astype('float32'))
-        self.texts.append(text)
-        self.ids.append(str(uuid.uuid4()))  # สร้าง UUID ใหม่
-        self.save_db()
+        self.add_documents([Document(page_content=text, metadata={})])
 
     def add_document(self, document: Document):
-        vector = self.encoder.encode([document.page_content])[0]
-        self.index.add(np.array([vector]).astype('float32'))
-        self.documents.append(document)
-        self.ids.append(str(uuid.uuid4()))
-        self.save_db()
-
-    def search_for_rag(self, query: str, k=3) -> List[Dict]:
-        """ค้นหาข้อความสำหรับ RAG"""
-        query_vector = self.encoder.encode([query])[0]
-        D, I = self.index.search(np.array([query_vector]).astype('float32'), k)
-        
+        self.add_documents([document])
+
+    def add_documents(self, documents: List[Document], batch_size: int = 32,
+                      skip_existing: bool = False) -> List[str]:
+        """เพิ่มเอกสารหลายรายการ: encode เป็น batch, เพิ่มลง index ครั้งเดียว และบันทึกลงไฟล์ครั้งเดียว
+
+        skip_existing=True จะข้ามเอกสารที่เนื้อหามีอยู่แล้วใน source เดียวกันโดยไม่ encode คืนเฉพาะ id ที่เพิ่มจริง
+        """
+        if skip_existing:
+            documents = self._new_documents(documents)
+        else:
+            for doc in documents:
+                self._hash_of(doc)
+        if not documents:
+            return []
+        vectors = self._document_vectors(documents, batch_size)
+        new_ids = [str(uuid.uuid4()) for _ in documents]
+        # ตัดคำสำหรับ BM25 นอก lock เช่นเดียวกับการ encode
+        analyzed = [analyze(doc.page_content) for doc in documents] if self.lexical_index else None
+        return self._writes.submit('add', documents, vectors, new_ids, analyzed, skip_existing).result()
+
+    def _apply_batch(self, batch):
+        """ผู้เขียน (เธรดเดียว): ทำคำขอแก้ไขทั้งชุดภายใต้ lock แล้วเผยแพร่ Snapshot ใหม่ครั้งเดียว
+
+        คำขอเพิ่มเอกสารที่อยู่ติดกันถูกรวมเป็นการเขียนลงดิสก์ครั้งเดียว และผลของทุกคำขอถูกส่งกลับ
+        หลังเผยแพร่แล้ว ผู้เรียกจึงค้นเจอสิ่งที่ตัวเองเพิ่งเขียนเสมอ
+        """
+        outcomes = []
+        with self._lock, self.write_lock:
+            self._refresh_requested = False
+            changed = self._refresh()
+            for op, requests in groupby(batch, key=lambda request: request[0]):
+                requests = list(requests)
+                for run in ([requests] if op == 'add' else [[request] for request in requests]):
+                    try:
+                        if op == 'add':
+                            results = self._commit_adds([args for _, args, _ in run])
+                        else:
+                            results = [getattr(self, '_commit_' + op)(*run[0][1])]
+                        outcomes.extend((future, result, None) for (_, _, future), result in zip(run, results))
+                    except Exception as e:
+                        outcomes.extend((future, None, e) for _, _, future in run)
+            if changed is not None or any(op != 'refresh' for op, _, _ in batch):
+                self._publish()
+        for future, result, error in outcomes:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+        if changed:
+            self._notify_changed(changed)
+
+    def _commit_refresh(self):
+        return None  # _apply_batch อ่านการแก้ไขของ process อื่นก่อนทุกชุดอยู่แล้ว
+
+    def _refresh(self) -> Optional[List[str]]:
+        """อ่านการแก้ไขที่ process อื่น commit ไว้ (ผู้เขียนเรียกขณะถือ write_lock)
+
+        คืน doc id ที่ถูกเพิ่ม/แก้ไข/ลบ หรือ None ถ้าไม่มีอะไรเปลี่ยน
+        """
+        if self.store.committed_generation() == self.store.generation:
+            return None
+        if self.lexical_index is not None:
+            self.lexical_index.refresh()
+        changed, new_rows = [], []
+        for entry in self.store.refresh():
+            doc_id = entry['id']
+            row = self.documents.row_of(doc_id)
+            if row is not None and (entry['op'] == 'delete' or row != entry['row']):
+                self._drop_row(doc_id, row)
+            if entry['op'] == 'add':
+                doc = Document(entry['content'], entry['metadata'])
+                self._hash_of(doc)
+                if row == entry['row']:  # metadata ใหม่ของแถวเดิม (replace_source)
+                    self._untrack(doc_id, self.documents.document(row), row)
+                else:
+                    new_rows.append(entry['row'])
+                self.documents.put(entry['row'], doc_id, doc)
+                self._track(doc_id, doc, entry['row'])
+            changed.append(doc_id)
+        if new_rows:
+            rows = np.array(new_rows, dtype='int64')
+            self._pending_rows.append(rows)
+            self._pending_vectors.append(np.ascontiguousarray(self.store.vectors()[rows]))
+        catalog = read_catalog(self.segment_path)
+        if self._persist_segments and catalog is not None and catalog['generation'] != self._catalog_generation:
+            self._open_catalog(catalog)
+        return changed
+
+    def _maybe_refresh(self):
+        """ผู้ค้นหาตรวจ generation บนดิสก์เป็นระยะ ถ้า process อื่น commit แล้วให้ผู้เขียนอ่านตามไป (ไม่รอ)"""
+        now = time.monotonic()
+        if self._refresh_requested or now - self._refresh_checked < self.refresh_interval:
+            return
+        self._refresh_checked = now
+        try:
+            stale = self.store.committed_generation() != self.store.generation
+        except (OSError, ValueError):
+            return
+        if stale:
+            self._refresh_requested = True
+            self._writes.submit('refresh')
+
+    def _sync(self):
+        """อ่านการแก้ไขของ process อื่นทันทีและรอจนเสร็จ (เช่น ก่อนตอบว่าไม่พบเอกสาร)"""
+        self._writes.submit('refresh').result()
+
+    def _commit_adds(self, requests: List[tuple]) -> List[List[str]]:
+        """เพิ่มเอกสารของหลายคำขอ add_documents ด้วยการเขียนครั้งเดียว คืน id ที่เพิ่มจริงของแต่ละคำขอ"""
+        seen = set()
+        documents, vectors, new_ids, analyzed, added = [], [], [], [], []
+        for request_docs, request_vectors, request_ids, request_analyzed, skip_existing in requests:
+            keep = list(range(len(request_docs)))
+            if skip_existing:
+                # คำขออื่นอาจเพิ่มเนื้อหาเดียวกันไประหว่าง encode
+                keep = [i for i in keep if self._dedup_key(request_docs[i]) not in self.content_hashes
+                        and self._dedup_key(request_docs[i]) not in seen]
+            seen.update(self._dedup_key(request_docs[i]) for i in keep)
+            documents.extend(request_docs[i] for i in keep)
+            vectors.append(request_vectors[keep])
+            new_ids.extend(request_ids[i] for i in keep)
+            if request_analyzed:
+                analyzed.extend(request_analyzed[i] for i in keep)
+            added.append([request_ids[i] for i in keep])
+        if documents:
+            self._append_documents(documents, np.concatenate(vectors), new_ids, analyzed or None)
+        return added
+
+    def replace_source(self, source: str, file_hash: str, documents: List[Document]) -> int:
+        """ทำให้เอกสารของ source ตรงกับไฟล์เวอร์ชันใหม่ (documents = ทุก chunk ของไฟล์ใหม่)
+
+        chunk เดิมที่ไม่มีในไฟล์ใหม่จะถูกลบ chunk ที่ยังอยู่จะได้ metadata ใหม่โดยไม่ต้อง encode ใหม่
+        คืนจำนวน chunk ที่ถูกลบ
+        """
+        latest = {self._hash_of(doc): doc.metadata for doc in documents}
+        stale, changed = self._writes.submit('replace_source', source, file_hash, latest).result()
+        if changed:
+            self._notify_changed(changed)
+        return stale
+
+    def _commit_replace_source(self, source: str, file_hash: str, latest: Dict[str, Dict]):
+        current = self.source_docs.get(source, set())
+        stale, refreshed = [], []
+        for doc_id in current:
+            row_id = self.documents.row_of(doc_id)
+            doc = self.documents.document(row_id)
+            metadata = latest.get(doc.metadata.get('content_hash'))
+            if metadata is None:
+                stale.append(doc_id)
+            elif doc.metadata != metadata:
+                self._untrack(doc_id, doc, row_id)
+                doc.metadata = dict(metadata)
+                self.documents.put(row_id, doc_id, doc)
+                self._track(doc_id, doc, row_id)
+                refreshed.append(add_entry(row_id, doc_id, doc))
+        if refreshed:
+            self.store.log(refreshed)  # เล่น log ซ้ำแล้ว metadata ใหม่จะทับของเดิม
+        self._delete_ids(stale)
+        if current or latest:
+            self.source_files[source] = file_hash
+        return len(stale), stale + [entry['id'] for entry in refreshed]
+
+    def _append_documents(self, documents: List[Document], vectors: np.ndarray, new_ids: List[str],
+                          analyzed: List = None):
+        start_row = self.store.rows
+        row_ids = np.arange(start_row, start_row + len(documents), dtype='int64')
+
+        # เขียนลงดิสก์เฉพาะแถวใหม่ก่อน แล้วจึงเพิ่มเข้า index ในหน่วยความจำ
+        self.store.append(vectors, [
+            add_entry(row_id, doc_id, doc)
+            for row_id, doc_id, doc in zip(row_ids.tolist(), new_ids, documents)
+        ])
+        # เข้า index ตอน _publish
+        self._pending_rows.append(row_ids)
+        self._pending_vectors.append(np.asarray(vectors, dtype='float32'))
+        for doc_id, doc, row_id in zip(new_ids, documents, row_ids.tolist()):
+            self.documents.put(row_id, doc_id, doc)
+            self._track(doc_id, doc, row_id)
+        if self.lexical_index is not None:
+            self.lexical_index.add(row_ids.tolist(), analyzed or [analyze(doc.page_content) for doc in documents])
+
+    def search_for_rag(self, query: str, k=3, nprobe: int = None, ef_search: int = None,
+                       filter: Dict = None, mode: str = None, query_vector: np.ndarray = None) -> List[Dict]:
+        """ค้นหาข้อความสำหรับ RAG (nprobe ใช้กับ ivf/ivfpq, ef_search ใช้กับ hnsw)
+
+        filter คัดเอกสารตาม metadata ก่อนค้นหา เช่น {"source": "a.pdf"} หรือ {"type": {"$in": ["pdf", "docx"]}}
+        (ดู Model.Model_Metadata_Index) ผลลัพธ์จึงมีครบ k รายการถ้ามีเอกสารที่ตรงเงื่อนไขพอ
+
+        mode: 'dense' (เวกเตอร์), 'lexical' (BM25) หรือ 'hybrid' (รวมสองอันดับด้วย reciprocal rank fusion)
+        ค่าเริ่มต้นมาจาก SEARCH_MODE โหมด hybrid ช่วยเรื่องชื่อเฉพาะ รหัส และตัวเลขที่เวกเตอร์จับได้ไม่ดี
+
+        query_vector คือเวกเตอร์ของ query ที่ encode ไว้แล้ว (เช่น coordinator ของ shard ส่งมา) จะไม่ encode ซ้ำ
+        """
+        mode = self._search_mode(mode, filter)
+        self._maybe_refresh()
+        snapshot = self.snapshot  # ทั้งคำค้นอ่านจาก snapshot เดียวกัน
+        cache_key = self._cache_key(snapshot, query, k, nprobe, ef_search, filter, mode)
+        cached = self.result_cache.get(cache_key)
+        if cached is not None:
+            return [dict(result) for result in cached]
+
+        if mode != 'lexical' and query_vector is None:
+            query_vector = self.encode_query(query)
+        if mode == 'dense':
+            results = self._vector_results(snapshot, query_vector, k, nprobe, ef_search, filter)
+        elif mode == 'lexical':
+            results = self._lexical_search(query, k, filter)
+        else:
+            results = self._hybrid_search(snapshot, query, query_vector, k, nprobe, ef_search, filter)
+        self.result_cache.put(cache_key, results)
+        return [dict(result) for result in results]
+
+    def search_many(self, queries: List[str], k=3, nprobe: int = None, ef_search: int = None, filter: Dict = None,
+                    mode: str = None, query_vectors: np.ndarray = None) -> Iterator[List[Dict]]:
+        """ค้นหาหลายคำค้น (พารามิเตอร์เหมือน search_for_rag) คืน iterator ของผลทีละคำค้นตามลำดับ
+
+        คำค้นถูกแบ่งเป็นชุดละ SEARCH_BATCH_SIZE คำ (ค่าเริ่มต้น 256) แต่ละชุด encode ครั้งเดียวและค้น FAISS
+        ครั้งเดียวด้วยเมทริกซ์ของคำค้นทั้งชุด ผลของชุดแรกจึงส่งต่อได้ก่อนค้นชุดถัดไป
+        อ่านแคชผลการค้นหาและแคชเวกเตอร์คำค้นแต่ไม่เพิ่มลงแคช (ชุดใหญ่จะได้ไม่ดันคำค้นของผู้ใช้ออกจากแคช)
+        ตรวจ mode และ filter ทันทีที่เรียก ส่วนการค้นหาเริ่มเมื่ออ่าน iterator
+        """
+        mode = self._search_mode(mode, filter)
+        return self._search_batches(list(queries), k, nprobe, ef_search, filter, mode, query_vectors)
+
+    def _search_batches(self, queries: List[str], k: int, nprobe, ef_search, filter: Optional[Dict], mode: str,
+                        query_vectors: Optional[np.ndarray]) -> Iterator[List[Dict]]:
+        for start in range(0, len(queries), self.search_batch_size):
+            self._maybe_refresh()
+            snapshot = self.snapshot
+            batch = queries[start:start + self.search_batch_size]
+            keys = [self._cache_key(snapshot, query, k, nprobe, ef_search, filter, mode) for query in batch]
+            found = [self.result_cache.get(key) for key in keys]
+            missing = [i for i, results in enumerate(found) if results is None]
+            if missing and mode != 'lexical':
+                if query_vectors is not None:
+                    vectors = query_vectors[[start + i for i in missing]]
+                else:
+                    vectors = self._encode_queries([batch[i] for i in missing])
+                depth = k if mode == 'dense' else max(k, self.hybrid_candidates)
+                D, I = self._dense_search_many(snapshot, vectors, depth, nprobe, ef_search, filter)
+            for n, i in enumerate(missing):
+                if mode == 'dense':
+                    found[i] = self._dense_results(D[n], I[n])
+                elif mode == 'lexical':
+                    found[i] = self._lexical_search(batch[i], k, filter)
+                else:
+                    found[i] = self._fuse(batch[i], I[n][I[n] >= 0].tolist(), k, filter)
+            for results in found:
+                yield [dict(result) for result in results]
+
+    def _search_mode(self, mode: Optional[str], filter: Optional[Dict]) -> str:
+        """ตรวจ mode และ filter ของคำค้น คืน mode ที่ใช้จริง"""
+        mode = mode or self.search_mode
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode '{mode}', expected one of {SEARCH_MODES}")
+        if mode != 'dense' and self.lexical_index is None:
+            raise ValueError(f"Search mode '{mode}' needs the lexical index (LEXICAL_INDEX=1)")
+        if filter:
+            MetadataIndex.validate(filter)
+        return mode
+
+    @staticmethod
+    def _cache_key(snapshot: Snapshot, query: str, k: int, nprobe, ef_search, filter: Optional[Dict], mode: str):
+        return (normalize_query(query), k, nprobe, ef_search, canonical_filter(filter), mode, snapshot.generation)
+
+    def _encode_queries(self, queries: List[str]) -> np.ndarray:
+        """เวกเตอร์ของหลายคำค้น: ใช้เวกเตอร์ในแคชถ้ามี แล้ว encode ที่เหลือในครั้งเดียว"""
+        vectors = [self.embedding_cache.get(normalize_query(query)) for query in queries]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            encoded = np.asarray(self.encoder.encode([queries[i] for i in missing]), dtype='float32')
+            for i, vector in zip(missing, encoded):
+                vectors[i] = vector
+        return np.ascontiguousarray(np.stack(vectors), dtype='float32')
+
+    def _lexical_search(self, query: str, k: int, filter: Dict = None) -> List[Dict]:
+        allowed = self.metadata_index.match(filter) if filter else None
+        rows, scores = self.lexical_index.search(query, k, allowed)
+        return [result for result in (self._result(row, score, score) for row, score in zip(rows, scores))
+                if result is not None]
+
+    def _hybrid_search(self, snapshot: Snapshot, query: str, query_vector: np.ndarray, k: int, nprobe=None,
+                       ef_search=None, filter: Dict = None) -> List[Dict]:
+        """ค้นทั้งเวกเตอร์และ BM25 ฝั่งละ hybrid_candidates อันดับ แล้วรวมด้วย reciprocal rank fusion"""
+        D, I = self._dense_search(snapshot, query_vector, max(k, self.hybrid_candidates), nprobe, ef_search, filter)
+        return self._fuse(query, I.tolist(), k, filter)
+
+    def _fuse(self, query: str, dense: List[int], k: int, filter: Dict = None) -> List[Dict]:
+        """รวมอันดับจากเวกเตอร์ (dense = แถวเรียงตามระยะ) กับอันดับ BM25 ของ query"""
+        depth = max(k, self.hybrid_candidates)
+        allowed = self.metadata_index.match(filter) if filter else None
+        lexical, _ = self.lexical_index.search(query, depth, allowed)
+        lexical = lexical.tolist()
+        ranks = {'dense': {row: rank for rank, row in enumerate(dense, 1)},
+                 'lexical': {row: rank for rank, row in enumerate(lexical, 1)}}
         results = []
-        for i, idx in enumerate(I[0]):
-            if idx != -1 and idx < len(self.documents):
-                doc = self.documents[idx]
-                results.append({
-                    'id': self.ids[idx],
-                    'text': doc.page_content,
-                    'metadata': doc.metadata,
-                    'score': float(D[0][i]),
-                    'relevance': float(1/(1+D[0][i]))
-                })
+        for row, score in reciprocal_rank_fusion([dense, lexical]):
+            result = self._result(row, score, score, ranks={
+                name: ranked.get(row) for name, ranked in ranks.items()
+            })
+            if result is not None:
+                results.append(result)
+                if len(results) == k:
+                    break
         return results
-    
-    def chunk_and_add_text(self, text: str, chunk_size=200):
-        """แบ่งข้อความและเพิ่มลง vector store"""
+
+    def _filtered_search(self, snapshot: Snapshot, queries: np.ndarray, k: int, filter: Dict, nprobe=None,
+                         ef_search=None):
+        """ค้นหาเฉพาะแถวที่ตรงกับ filter: ชุดเล็กคำนวณระยะตรงๆ จาก VectorStore ชุดใหญ่ค้นใน index ด้วย IDSelector"""
+        rows = self.metadata_index.match(filter)
+        rows = rows[rows < snapshot.rows]  # แถวที่เพิ่มหลัง snapshot นี้ยังไม่อยู่ใน index
+        if len(rows) == 0:
+            return np.empty((len(queries), 0), dtype='float32'), np.empty((len(queries), 0), dtype='int64')
+        if len(rows) <= self.filter_scan_limit:
+            rows.sort()  # อ่าน memmap ตามลำดับแถว
+            D, I = faiss.knn(queries, np.ascontiguousarray(snapshot.vectors[rows]), min(k, len(rows)))
+            return D, rows[I]
+        return snapshot.search_many(queries, k, self.index_factory, nprobe, ef_search, allowed=rows)
+
+    def _dense_search(self, snapshot: Snapshot, query_vector: np.ndarray, k: int, nprobe=None, ef_search=None,
+                      filter: Dict = None):
+        """ค้นเวกเตอร์ใน snapshot คืน (ระยะ, FAISS id) ของคำค้นเดียว"""
+        D, I = self._dense_search_many(snapshot, np.array([query_vector]).astype('float32'), k, nprobe, ef_search,
+                                       filter)
+        found = I[0] >= 0
+        return D[0][found], I[0][found]
+
+    def _dense_search_many(self, snapshot: Snapshot, queries: np.ndarray, k: int, nprobe=None, ef_search=None,
+                           filter: Dict = None):
+        """ค้นเวกเตอร์ของหลายคำค้นในครั้งเดียว คืน (ระยะ, FAISS id) ขนาด คำค้น x k (ช่องที่ไม่มีผลมี id เป็น -1)"""
+        if filter:
+            return self._filtered_search(snapshot, queries, k, filter, nprobe, ef_search)
+        return snapshot.search_many(queries, k, self.index_factory, nprobe, ef_search)
+
+    def _result(self, row_id: int, score: float, relevance: float, **extra) -> Optional[Dict]:
+        row_id = int(row_id)
+        doc_id = self.documents.doc_id(row_id)
+        text = self.documents.text(row_id) if doc_id is not None else None
+        if text is None:  # ถูกลบและคืนหน่วยความจำไปแล้ว
+            return None
+        return {
+            'id': doc_id,
+            'text': text,
+            'metadata': self._public_metadata(row_id),
+            'score': float(score),
+            'relevance': float(relevance),
+            **extra
+        }
+
+    def _public_metadata(self, row_id: int) -> Dict:
+        """metadata ของเอกสารสำหรับผู้เรียก (ไม่รวม INTERNAL_FIELDS)"""
+        metadata = self.documents.metadata_of(row_id)
+        for key in INTERNAL_FIELDS:
+            metadata.pop(key, None)
+        return metadata
+
+    def search_vector(self, query_vector: np.ndarray, k=3, nprobe: int = None, ef_search: int = None,
+                      filter: Dict = None) -> List[Dict]:
+        """ค้นหาด้วยเวกเตอร์ของคำค้นโดยตรง (ไม่ผ่านแคชผลการค้นหา)"""
+        self._maybe_refresh()
+        return self._vector_results(self.snapshot, query_vector, k, nprobe, ef_search, filter)
+
+    def _vector_results(self, snapshot: Snapshot, query_vector: np.ndarray, k: int, nprobe=None, ef_search=None,
+                        filter: Dict = None) -> List[Dict]:
+        D, I = self._dense_search(snapshot, query_vector, k, nprobe, ef_search, filter)
+        return self._dense_results(D, I)
+
+    def _dense_results(self, D: np.ndarray, I: np.ndarray) -> List[Dict]:
+        results = [self._result(row_id, distance, 1 / (1 + distance))
+                   for distance, row_id in zip(D.tolist(), I.tolist()) if row_id >= 0]
+        return [result for result in results if result is not None]
+
+    def chunk_and_add_text(self, text: str, chunk_size: int = None):
+        """แบ่งข้อความและเพิ่มลง vector store (chunk_size เป็นจำนวน token, None = ค่าของ chunker)"""
         chunks = self._create_chunks(text, chunk_size)
-        for chunk in chunks:
-            self.add_text(chunk)
-
-    def _create_chunks(self, text: str, chunk_size: int) -> List[str]:
-        """สร้าง chunks จากข้อความ"""
-        words = text.split()
-        chunks = []
-        
-        for i in range(0, len(words), chunk_size):
-            chunk = words[i:i + chunk_size]
-            chunks.append(' '.join(chunk))
-        return chunks
-
-    def save_db(self):
-        with open(self.db_file, 'wb') as f:
-            pickle.dump({
-                'texts': [doc.page_content for doc in self.documents],
-                'documents': self.documents,
-                'index': faiss.serialize_index(self.index),
-                'ids': self.ids
-            }, f)
+        self.add_documents([Document(page_content=chunk, metadata={}) for chunk in chunks])
+
+    def _create_chunks(self, text: str, chunk_size: int = None) -> List[str]:
+        """สร้าง chunks จากข้อความ โดยตัดที่ขอบประโยค/คำ และซ้อนกันตามค่า overlap ของ chunker"""
+        return self.chunker.split(text, chunk_size)
 
     def load_db(self):
-        if os.path.exists(self.db_file):
+        """โหลดฐานข้อมูล: map ไฟล์เวกเตอร์ด้วย memmap, เล่น log ซ้ำเพื่อสร้างรายการเอกสาร
+        แล้วเปิด segment ที่บันทึกไว้ (สร้าง index ใหม่ถ้ายังไม่มีหรือใช้ไม่ได้)"""
+        self.documents.clear()
+        with self._lock, self.write_lock:
             try:
-                with open(self.db_file, 'rb') as f:
-                    data = pickle.load(f)
-                    self.documents = data.get('documents', [])
-                    self.texts = [doc.page_content for doc in self.documents]
-                    self.index = faiss.deserialize_index(data['index'])
-                    self.ids = data.get('ids', [str(uuid.uuid4()) for _ in self.texts])
-                    print(f"✅ โหลดฐานข้อมูลแล้ว ({len(self.texts)} เอกสาร)")
+                if not self.store.exists():
+                    if self.legacy_db_file and os.path.exists(self.legacy_db_file):
+                        count = migrate_pickle(self.legacy_db_file, self.store)
+                        print(f"✅ แปลง {self.legacy_db_file} เป็น {self.db_path} แล้ว ({count} เอกสาร)")
+                    else:
+                        self.store.create()
+
+                for entry in self.store.load():
+                    row = self.documents.row_of(entry['id'])
+                    if entry['op'] == 'add':
+                        if row is not None and row != entry['row']:
+                            self.documents.remove(row)  # แก้ไขเนื้อหาแล้ว: ย้ายไปแถวใหม่
+                        doc = Document(entry['content'], entry['metadata'])
+                        self._hash_of(doc)
+                        self.documents.put(entry['row'], entry['id'], doc)
+                    elif entry['op'] == 'delete' and row is not None:
+                        self.documents.remove(row)
+
+                if not self._open_saved_segments():
+                    self._rebuild_index()
+                self._rebuild_tracking()
+                self._load_lexical_index()
+                self._publish()
+                if self.vector_cache is not None and len(self.vector_cache) == 0 and len(self.documents):
+                    # แคชยังว่าง (เช่น เพิ่งแปลงจาก pickle หรือเพิ่งเปิดใช้แคช): เก็บเวกเตอร์ที่มีอยู่ไว้ก่อน
+                    print(f"💾 เก็บเวกเตอร์ {self.warm_vector_cache()} รายการลงแคชเวกเตอร์")
+                print(f"✅ โหลดฐานข้อมูลแล้ว ({len(self.documents)} เอกสาร)")
             except Exception as e:
                 print("❌ โหลดฐานข้อมูลไม่สำเร็จ:", e)
+                self.documents.clear()
+                self._rebuild_index(persist=False)
+                self._rebuild_tracking()
+                self._load_lexical_index()
+                self._publish()
 
     def delete_document(self, doc_id: str) -> bool:
         """ลบเอกสารด้วย ID"""
-        try:
-            idx = self.ids.index(doc_id)
-            # ลบข้อมูลจากทุกรายการ
-            self.ids.pop(idx)
-            self.documents.pop(idx)
-            
-            # สร้าง index ใหม่
-            new_index = faiss.IndexFlatL2(self.dimension)
-            vectors = [self.encoder.encode([doc.page_content])[0] for doc in self.documents]
-            if vectors:  # ถ้ามีเวกเตอร์เหลืออยู่
-                new_index.add(np.array(vectors).astype('float32'))
-            self.index = new_index
-            
-            self.save_db()
-            return True
-        except ValueError:
+        if doc_id not in self.documents:
+            self._sync()  # อาจเพิ่งถูกเพิ่มโดย process อื่น
+        if doc_id not in self.documents or not self._writes.submit('delete', doc_id).result():
             return False
+        self._notify_changed([doc_id])
+        return True
+
+    def _commit_delete(self, doc_id: str) -> bool:
+        if doc_id not in self.documents:
+            return False
+        self._delete_ids([doc_id])
+        return True
+
+    def _delete_ids(self, doc_ids: List[str]):
+        """ลบหลายเอกสารในครั้งเดียว (ผู้เขียนเรียกภายใต้ lock)"""
+        if not doc_ids:
+            return
+        removed = []
+        for doc_id in set(doc_ids):
+            row_id = self.documents.row_of(doc_id)
+            if row_id is not None:
+                removed.append((doc_id, row_id))
+
+        # ลบเฉพาะเวกเตอร์ของเอกสารเหล่านี้ออกจาก index ตอน _publish (ไม่ต้อง encode ใหม่)
+        self.store.log([delete_entry(row_id, doc_id) for doc_id, row_id in removed])
+        for doc_id, row_id in removed:
+            self._drop_row(doc_id, row_id)
+
+    def _drop_row(self, doc_id: str, row_id: int):
+        """เอาเอกสารที่แถว row_id ออกจากการค้นหา (snapshot เก่ายังอ่านข้อความได้จนพ้น release_grace)"""
+        self._untrack(doc_id, self.documents.document(row_id), row_id)
+        self.documents.remove(row_id, release=False)
+        self._pending_deleted.append(row_id)
+        if self.lexical_index is not None:
+            self.lexical_index.remove([row_id])
 
     def update_document(self, doc_id: str, new_content: str, new_metadata: Dict = None) -> bool:
         """อัพเดตเอกสารด้วย ID"""
-        try:
-            idx = self.ids.index(doc_id)
-            # อัพเดตเนื้อหาและ metadata
-            current_doc = self.documents[idx]
-            if new_metadata:
-                current_doc.metadata.update(new_metadata)
-            current_doc.page_content = new_content
-            
-            # อัพเดต vector
-            vector = self.encoder.encode([new_content])[0]
-            new_index = faiss.IndexFlatL2(self.dimension)
-            vectors = [self.encoder.encode([doc.page_content])[0] for doc in self.documents]
-            new_index.add(np.array(vectors).astype('float32'))
-            self.index = new_index
-            
-            self.save_db()
-            return True
-        except ValueError:
+        if doc_id not in self.documents:
+            self._sync()  # อาจเพิ่งถูกเพิ่มโดย process อื่น
+        if doc_id not in self.documents:
             return False
+        # encode เฉพาะเนื้อหาใหม่ (นอก lock)
+        vector = self.encode_documents([new_content])
+        analyzed = analyze(new_content) if self.lexical_index else None
+        if not self._writes.submit('update', doc_id, new_content, new_metadata, vector, analyzed).result():
+            return False
+        self._notify_changed([doc_id])
+        return True
+
+    def _commit_update(self, doc_id: str, new_content: str, new_metadata: Optional[Dict], vector: np.ndarray,
+                       analyzed) -> bool:
+        old_row = self.documents.row_of(doc_id)
+        if old_row is None:
+            return False
+        # อัพเดตเนื้อหาและ metadata
+        current_doc = self.documents.document(old_row)
+        self._untrack(doc_id, current_doc, old_row)
+        if new_metadata:
+            current_doc.metadata.update({key: value for key, value in new_metadata.items()
+                                         if key not in INTERNAL_FIELDS})
+        current_doc.page_content = new_content
+        current_doc.metadata['content_hash'] = content_hash(new_content)
+
+        # เขียนเวกเตอร์ใหม่ต่อท้ายไฟล์ แล้วสลับ row id ใน index ตอน _publish
+        new_row = self.store.append(vector, [add_entry(self.store.rows, doc_id, current_doc)])
+        self.documents.remove(old_row, release=False)
+        self.documents.put(new_row, doc_id, current_doc)
+        self._track(doc_id, current_doc, new_row)
+        if self.lexical_index is not None:
+            self.lexical_index.remove([old_row])
+            self.lexical_index.add([new_row], [analyzed])
+        self._pending_deleted.append(old_row)
+        self._pending_rows.append(np.array([new_row], dtype='int64'))
+        self._pending_vectors.append(np.asarray(vector, dtype='float32'))
+        return True
 
     def get_document(self, doc_id: str) -> Dict:
         """ดึงข้อมูลเอกสารด้วย ID"""
-        try:
-            idx = self.ids.index(doc_id)
-            doc = self.documents[idx]
-            return {
-                'id': doc_id,
-                'content': doc.page_content,
-                'metadata': doc.metadata
-            }
-        except ValueError:
+        self._maybe_refresh()
+        row = self.documents.row_of(doc_id)
+        if row is None:
             return None
+        return {
+            'id': doc_id,
+            'content': self.documents.text(row),
+            'metadata': self._public_metadata(row)
+        }
 
     def list_documents(self, skip: int = 0, limit: int = 10) -> List[Dict]:
-        """แสดงรายการเอกสารทั้งหมดแบบแบ่งหน้า"""
-        docs = []
-        end_idx = min(skip + limit, len(self.documents))
-        for i in range(skip, end_idx):
-            docs.append({
-                'id': self.ids[i],
-                'content': self.documents[i].page_content,
-                'metadata': self.documents[i].metadata
-            })
-        return docs
+        """แสดงรายการเอกสารทั้งหมดแบบแบ่งหน้า (เรียงตามแถว เอกสารที่แก้ไขล่าสุดอยู่ท้าย)"""
+        self._maybe_refresh()
+        rows = self.documents.live_rows()[skip:skip + limit]
+        return [{
+            'id': self.documents.doc_id(row),
+            'content': self.documents.text(row),
+            'metadata': self._public_metadata(row)
+        } for row in rows.tolist()]
@@ -0,0 +1,212 @@
+# vector_store.py
+import json
+import os
+import shutil
+import uuid
+import numpy as np
+from typing import Dict, Iterator, List, Tuple
+
+MANIFEST_FILE = 'manifest.json'
+VECTORS_FILE = 'vectors.f32'
+LOG_FILE = 'meta.log'
+FORMAT_VERSION = 1
+
+
+class VectorStore:
+    """ที่เก็บเวกเตอร์บนดิสก์แบบต่อท้าย (append-only)
+
+    โครงสร้างโฟลเดอร์:
+        vectors.f32    เวกเตอร์ float32 แบบ raw เรียงต่อกัน แถวที่ i คือ FAISS id i
+        meta.log       JSON หนึ่งบรรทัดต่อหนึ่งการเปลี่ยนแปลง (add / delete)
+        manifest.json  จำนวนแถวและขนาด log ที่ commit แล้ว
+
+    ข้อมูลที่เขียนต่อท้ายจะมีผลเมื่อ manifest ถูกสลับด้วย os.replace เท่านั้น
+    ถ้าโปรแกรมล่มระหว่างเขียน ส่วนที่เกินจาก manifest จะถูกตัดทิ้งในการเขียนครั้งถัดไป
+
+    หลาย process ใช้โฟลเดอร์เดียวกันได้ถ้าผู้เขียนถือ lock ร่วมกัน (ดู Tools.Tools_file_lock)
+    และเรียก refresh() ก่อนเขียน เพื่อต่อท้ายจากข้อมูลที่ process อื่น commit ไว้
+    """
+
+    def __init__(self, path: str, dimension: int):
+        self.path = path
+        self.dimension = dimension
+        self.rows = 0
+        self.log_bytes = 0
+        self.generation = 0
+        self._vectors = None
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def exists(self) -> bool:
+        return os.path.exists(self._file(MANIFEST_FILE))
+
+    def create(self):
+        os.makedirs(self.path, exist_ok=True)
+        for name in (VECTORS_FILE, LOG_FILE):
+            open(self._file(name), 'ab').close()
+        self.rows = self.log_bytes = self.generation = 0
+        self._write_manifest()
+
+    def _read_manifest(self) -> Dict:
+        with open(self._file(MANIFEST_FILE), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('dimension') != self.dimension:
+            raise ValueError(f"Store dimension {manifest.get('dimension')} != {self.dimension}")
+        return manifest
+
+    def load(self) -> Iterator[Dict]:
+        """อ่าน manifest แล้วคืนรายการ log ที่ commit แล้วทั้งหมด (เวกเตอร์ใช้ memmap ไม่โหลดเข้า RAM)
+
+        รายการถูกอ่านทีละบรรทัดขณะวนลูป จึงไม่ต้องถือ log ทั้งไฟล์ไว้ในหน่วยความจำ
+        """
+        self.rows = self.log_bytes = 0
+        self._vectors = None
+        return self.refresh()
+
+    def refresh(self) -> Iterator[Dict]:
+        """อ่าน manifest ใหม่ แล้วคืนเฉพาะรายการ log ที่ commit หลังจากที่อ่านครั้งก่อน (เช่น จาก process อื่น)"""
+        manifest = self._read_manifest()
+        start = self.log_bytes
+        self.rows = manifest['rows']
+        self.log_bytes = manifest['log_bytes']
+        self.generation = manifest.get('generation', 0)
+        return self._entries(start, self.log_bytes)
+
+    def committed_generation(self) -> int:
+        """generation ใน manifest บนดิสก์ (ต่างจาก self.generation เมื่อ process อื่น commit แล้ว)"""
+        return self._read_manifest().get('generation', 0)
+
+    def _entries(self, start: int, end: int) -> Iterator[Dict]:
+        with open(self._file(LOG_FILE), 'rb') as f:
+            f.seek(start)
+            log_bytes = end - start
+            while log_bytes > 0:
+                line = f.readline(log_bytes)
+                if not line:
+                    break
+                log_bytes -= len(line)
+                if line.strip():
+                    yield json.loads(line)
+
+    def vectors(self) -> np.ndarray:
+        """เวกเตอร์ที่ commit แล้วทั้งหมดในรูป memmap แบบอ่านอย่างเดียว (rows x dimension)"""
+        if self.rows == 0:
+            return np.empty((0, self.dimension), dtype='float32')
+        if self._vectors is None or self._vectors.shape[0] != self.rows:
+            self._vectors = np.memmap(
+                self._file(VECTORS_FILE), dtype='float32', mode='r',
+                shape=(self.rows, self.dimension)
+            )
+        return self._vectors
+
+    def append(self, vectors: np.ndarray, entries: List[Dict]) -> int:
+        """เขียนเวกเตอร์ใหม่ต่อท้ายไฟล์และบันทึก log แล้ว commit คืนเลขแถวแรกของเวกเตอร์ชุดนี้"""
+        start_row = self.rows
+        vectors = np.ascontiguousarray(vectors, dtype='float32')
+        if len(vectors):
+            with open(self._file(VECTORS_FILE), 'r+b') as f:
+                f.truncate(start_row * self.dimension * 4)
+                f.seek(0, os.SEEK_END)
+                f.write(vectors.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+        self.rows += len(vectors)
+        self._append_log(entries)
+        self._write_manifest()
+        return start_row
+
+    def log(self, entries: List[Dict]):
+        """บันทึกการเปลี่ยนแปลงที่ไม่มีเวกเตอร์ใหม่ (เช่น ลบ) แล้ว commit"""
+        self._append_log(entries)
+        self._write_manifest()
+
+    def _append_log(self, entries: List[Dict]):
+        if not entries:
+            return
+        data = ''.join(json.dumps(e, ensure_ascii=False) + '\n' for e in entries).encode('utf-8')
+        with open(self._file(LOG_FILE), 'r+b') as f:
+            f.truncate(self.log_bytes)
+            f.seek(0, os.SEEK_END)
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        self.log_bytes += len(data)
+
+    def _write_manifest(self):
+        self.generation += 1
+        tmp = self._file(MANIFEST_FILE + '.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({
+                'version': FORMAT_VERSION,
+                'dimension': self.dimension,
+                'rows': self.rows,
+                'log_bytes': self.log_bytes,
+                'generation': self.generation
+            }, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self._file(MANIFEST_FILE))
+
+
+def add_entry(row: int, doc_id: str, document) -> Dict:
+    """รายการ log สำหรับเอกสารที่แถว row (ถ้า id ซ้ำกับที่มีอยู่ ถือเป็นการแทนที่)"""
+    return {
+        'op': 'add',
+        'row': row,
+        'id': doc_id,
+        'content': document.page_content,
+        'metadata': document.metadata
+    }
+
+
+def delete_entry(row: int, doc_id: str) -> Dict:
+    return {'op': 'delete', 'row': row, 'id': doc_id}
+
+
+def read_legacy_pickle(pkl_path: str) -> Tuple[list, List[str], np.ndarray]:
+    """อ่านไฟล์ vector_db.pkl รุ่นเก่า คืน (documents, ids, vectors) เรียงตามลำดับเอกสาร"""
+    import faiss
+    import pickle
+
+    with open(pkl_path, 'rb') as f:
+        data = pickle.load(f)
+    documents = data.get('documents', [])
+    ids = data.get('ids') or [None] * len(documents)
+    index = faiss.deserialize_index(data['index'])
+
+    if isinstance(index, faiss.IndexIDMap):
+        # IndexIDMap2 (row id ต่อเอกสาร): จับคู่เวกเตอร์ด้วย id
+        base = faiss.downcast_index(index.index)
+        stored = base.reconstruct_n(0, base.ntotal)
+        position = {int(row_id): i for i, row_id in enumerate(faiss.vector_to_array(index.id_map))}
+        row_ids = data.get('row_ids', [])
+        vectors = np.stack([stored[position[row_id]] for row_id in row_ids]) if row_ids else stored[:0]
+    else:
+        # IndexFlatL2 ดั้งเดิม: เวกเตอร์เรียงตามลำดับเอกสาร
+        vectors = index.reconstruct_n(0, index.ntotal)[:len(documents)]
+
+    if len(vectors) != len(documents):
+        print(f"⚠️ จำนวนเวกเตอร์ ({len(vectors)}) ไม่ตรงกับจำนวนเอกสาร ({len(documents)})")
+        documents = documents[:len(vectors)]
+        ids = ids[:len(vectors)]
+    return documents, ids, vectors
+
+
+def migrate_pickle(pkl_path: str, store: VectorStore) -> int:
+    """แปลง vector_db.pkl เป็น VectorStore โดยใช้เวกเตอร์เดิม (ไม่ต้อง encode ใหม่) คืนจำนวนเอกสาร"""
+    documents, ids, vectors = read_legacy_pickle(pkl_path)
+    entries = [
+        add_entry(row, doc_id or str(uuid.uuid4()), doc)
+        for row, (doc, doc_id) in enumerate(zip(documents, ids))
+    ]
+
+    # เขียนลงโฟลเดอร์ชั่วคราวก่อนแล้วค่อยเปลี่ยนชื่อ เพื่อไม่ให้เหลือ store ที่แปลงไม่เสร็จ
+    staging = VectorStore(store.path.rstrip(os.sep) + '.migrating', store.dimension)
+    if os.path.exists(staging.path):
+        shutil.rmtree(staging.path)
+    staging.create()
+    staging.append(vectors, entries)
+    os.replace(staging.path, store.path)
+    store.load()
+    return len(entries)
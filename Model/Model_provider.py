@@ -0,0 +1,63 @@
+# provider.py
+import os
+import threading
+from sentence_transformers import SentenceTransformer
+from Model.Model_Vector_DB import MODEL_REVISION, VectorDB
+from Model.Model_Embedding_Batcher import EmbeddingBatcher
+from Model.Model_Shards import ShardedVectorDB
+
+DEFAULT_MODEL = 'nomic-ai/nomic-embed-text-v1'
+
+_lock = threading.RLock()
+_encoders = {}
+_vector_db = None
+
+
+def get_encoder(model_name: str = DEFAULT_MODEL) -> EmbeddingBatcher:
+    """คืน encoder ที่ใช้ร่วมกันทั้ง process (โหลดโมเดลครั้งเดียวต่อโมเดล)
+
+    คำค้นที่ encode พร้อมกันหลายเธรดจะถูกรวมเป็น batch เดียว (EMBED_MAX_BATCH, EMBED_MAX_WAIT_MS ดู
+    Model.Model_Embedding_Batcher) ตั้ง EMBED_MAX_BATCH=1 เพื่อปิด
+    """
+    encoder = _encoders.get(model_name)
+    if encoder is None:
+        with _lock:
+            encoder = _encoders.get(model_name)
+            if encoder is None:
+                encoder = EmbeddingBatcher(
+                    SentenceTransformer(model_name, trust_remote_code=True, revision=MODEL_REVISION)
+                )
+                _encoders[model_name] = encoder
+    return encoder
+
+
+def _create_vector_db():
+    """VectorDB ใน process นี้ หรือ coordinator ของ shard workers ถ้ากำหนด VECTOR_SHARDS (URL คั่นด้วย ,)"""
+    shards = [url.strip() for url in os.getenv('VECTOR_SHARDS', '').split(',') if url.strip()]
+    if shards:
+        return ShardedVectorDB(shards, encoder=get_encoder())
+    return VectorDB(encoder=get_encoder())
+
+
+def get_vector_db() -> VectorDB:
+    """คืน VectorDB ตัวเดียวที่ใช้ร่วมกันทั้ง process (ใช้กับ FastAPI Depends ได้)"""
+    global _vector_db
+    if _vector_db is None:
+        with _lock:
+            if _vector_db is None:
+                _vector_db = _create_vector_db()
+    return _vector_db
+
+
+def reload_vector_db() -> VectorDB:
+    """โหลดฐานข้อมูลจากไฟล์ใหม่แล้วสลับเข้าแทนตัวเดิม (ใช้ encoder เดิม)
+
+    ผู้ที่กำลังค้นหาอยู่กับตัวเดิมจะทำงานต่อได้จนจบ ส่วนคำขอถัดไปจะได้ตัวใหม่
+    """
+    global _vector_db
+    new_db = _create_vector_db()
+    if isinstance(new_db, ShardedVectorDB):
+        new_db.load_db()  # shard workers โหลดไฟล์ของตัวเองใหม่
+    with _lock:
+        _vector_db = new_db
+    return new_db
@@ -0,0 +1,115 @@
+import os
+import re
+from typing import Callable, List, Optional, Tuple
+
+from pythainlp import word_tokenize
+
+_THAI = re.compile(r'[\u0E00-\u0E7F]')
+
+# Sentence boundaries: line breaks, whitespace after sentence punctuation, and the
+# spaces Thai writing uses between sentences/clauses (a space between two Thai characters)
+_SENTENCE_BREAK = re.compile(r'(\n+|(?<=[.!?;:])\s+|(?<=[\u0E00-\u0E7F])[ \t]+(?=[\u0E00-\u0E7F]))')
+_WORD = re.compile(r'\S+\s*')
+
+TokenCounter = Callable[[List[str]], List[int]]
+
+
+def estimate_token_counts(texts: List[str]) -> List[int]:
+    """Rough token counts (~4 characters per token) when no tokenizer is available"""
+    return [max(1, (len(text.strip()) + 3) // 4) for text in texts]
+
+
+def tokenizer_counter(tokenizer) -> TokenCounter:
+    """Token counter backed by a Hugging Face tokenizer (e.g. SentenceTransformer.tokenizer)"""
+    def count(texts: List[str]) -> List[int]:
+        if not texts:
+            return []
+        return [len(ids) for ids in tokenizer(texts, add_special_tokens=False)['input_ids']]
+    return count
+
+
+class TextChunker:
+    """Split text into overlapping chunks that fit the embedder's token window
+
+    Text is first split into sentences. Sentences are packed whole while they
+    fit in ``max_tokens``; a sentence longer than that is broken into words
+    (pythainlp ``newmm`` for Thai, whitespace otherwise) so Thai text without
+    spaces still yields bounded chunks. Each chunk starts with up to
+    ``overlap`` tokens of whole sentences/words from the end of the previous one.
+
+    Token counts come from the embedder's tokenizer and are summed per
+    sentence/word, so a chunk may differ from the exact count by a few tokens.
+    """
+
+    def __init__(self, tokenizer=None, max_tokens: int = 256, overlap: int = 32,
+                 token_counter: Optional[TokenCounter] = None):
+        if overlap >= max_tokens:
+            raise ValueError("overlap must be smaller than max_tokens")
+        self.max_tokens = max_tokens
+        self.overlap = overlap
+        if token_counter is None:
+            token_counter = tokenizer_counter(tokenizer) if tokenizer is not None else estimate_token_counts
+        self.count_tokens = token_counter
+
+    @classmethod
+    def from_env(cls, tokenizer=None) -> 'TextChunker':
+        """Chunker configured with CHUNK_MAX_TOKENS / CHUNK_OVERLAP_TOKENS"""
+        return cls(tokenizer,
+                   max_tokens=int(os.getenv('CHUNK_MAX_TOKENS', 256)),
+                   overlap=int(os.getenv('CHUNK_OVERLAP_TOKENS', 32)))
+
+    @staticmethod
+    def split_sentences(text: str) -> List[str]:
+        """Sentences with their trailing separators (joining them gives back the text)"""
+        parts = _SENTENCE_BREAK.split(text)
+        sentences = [parts[i] + (parts[i + 1] if i + 1 < len(parts) else '') for i in range(0, len(parts), 2)]
+        return [sentence for sentence in sentences if sentence.strip()]
+
+    @staticmethod
+    def split_words(sentence: str) -> List[str]:
+        """Words with their trailing whitespace (pythainlp for Thai text)"""
+        if _THAI.search(sentence):
+            return word_tokenize(sentence, engine='newmm', keep_whitespace=True)
+        return _WORD.findall(sentence)
+
+    def _units(self, text: str, max_tokens: int) -> List[Tuple[str, int]]:
+        """(text, token count) pieces no larger than max_tokens, in document order"""
+        sentences = self.split_sentences(text)
+        units = []
+        for sentence, count in zip(sentences, self.count_tokens(sentences)):
+            if count <= max_tokens:
+                units.append((sentence, count))
+                continue
+            words = self.split_words(sentence)
+            for word, word_count in zip(words, self.count_tokens(words)):
+                if word_count <= max_tokens:
+                    units.append((word, word_count))
+                else:
+                    # A single "word" over budget (e.g. a long URL): cut it by characters
+                    step = max(1, len(word) * max_tokens // word_count)
+                    pieces = [word[i:i + step] for i in range(0, len(word), step)]
+                    units.extend(zip(pieces, self.count_tokens(pieces)))
+        return units
+
+    def split(self, text: str, max_tokens: Optional[int] = None) -> List[str]:
+        """Chunks of at most max_tokens (default self.max_tokens) tokens each"""
+        max_tokens = max_tokens or self.max_tokens
+        overlap = min(self.overlap, max_tokens // 2)
+        chunks = []
+        current, tokens = [], 0
+        for unit, count in self._units(text, max_tokens):
+            if current and tokens + count > max_tokens:
+                chunks.append(''.join(piece for piece, _ in current).strip())
+                # Carry the tail of the previous chunk over as overlap
+                tail, tail_tokens = [], 0
+                for piece, piece_count in reversed(current):
+                    if tail_tokens + piece_count > overlap or tail_tokens + piece_count + count > max_tokens:
+                        break
+                    tail.append((piece, piece_count))
+                    tail_tokens += piece_count
+                current, tokens = tail[::-1], tail_tokens
+            current.append((unit, count))
+            tokens += count
+        if current:
+            chunks.append(''.join(piece for piece, _ in current).strip())
+        return [chunk for chunk in chunks if chunk]
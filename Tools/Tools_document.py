@@ -3,8 +3,16 @@ from typing import Dict, Any
 
 @dataclass
 class Document:
+    __slots__ = ('page_content', 'metadata')
     page_content: str
     metadata: Dict[str, Any]
+
+    def __setstate__(self, state):
+        # pickle รุ่นเก่า (เช่น vector_db.pkl) เก็บ state เป็น __dict__
+        if isinstance(state, tuple):
+            state = {**(state[0] or {}), **(state[1] or {})}
+        for name in self.__slots__:
+            setattr(self, name, state[name])
     
     def to_dict(self):
         return {
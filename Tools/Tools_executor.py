@@ -0,0 +1,139 @@
+import asyncio
+import concurrent.futures
+import functools
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Workload classes and their default concurrency limits.
+# Override with <NAME>_WORKERS / <NAME>_MAX_PENDING environment variables,
+# e.g. LLM_WORKERS=32 or INGEST_MAX_PENDING=4.
+WORKLOADS = {
+    'search': {'workers': 4, 'max_pending': 256},   # query encode + FAISS search (CPU)
+    'llm': {'workers': 16, 'max_pending': 256},     # Gemini calls (blocking network I/O)
+    'ingest': {'workers': 2, 'max_pending': 16},    # parsing, speech-to-text, embedding
+}
+
+# Items a streaming generator may produce ahead of its consumer before its worker blocks
+STREAM_BUFFER = int(os.environ.get('STREAM_BUFFER', 32))
+
+
+class ExecutorBusyError(RuntimeError):
+    """Raised when a workload class already has max_pending tasks queued or running"""
+
+
+class WorkloadExecutor:
+    """Bounded thread pool for one workload class"""
+
+    def __init__(self, name: str, workers: int, max_pending: int):
+        self.name = name
+        self.workers = workers
+        self.max_pending = max_pending
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"{name}-worker")
+        self._slots = threading.BoundedSemaphore(max_pending)
+
+    async def run(self, fn, *args, **kwargs):
+        """Run a blocking callable on the pool without blocking the event loop"""
+        if not self._slots.acquire(blocking=False):
+            raise ExecutorBusyError(f"Too many pending '{self.name}' tasks (limit {self.max_pending})")
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._pool, functools.partial(fn, *args, **kwargs))
+        finally:
+            self._slots.release()
+
+    async def stream(self, fn, *args, **kwargs):
+        """Iterate a blocking generator on the pool, yielding items as they are produced
+
+        The generator holds one worker until it finishes or the consumer stops
+        iterating (e.g. the client disconnected). At most STREAM_BUFFER items
+        wait for a slow consumer; after that the worker blocks until there is room.
+        """
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=STREAM_BUFFER)
+        stop = threading.Event()
+        pending = [None]  # put the worker is waiting on, cancelled when the consumer stops
+        finished = object()
+
+        def put(item) -> bool:
+            pending[0] = future = asyncio.run_coroutine_threadsafe(queue.put(item), loop)
+            if stop.is_set():
+                future.cancel()
+            try:
+                future.result()
+                return True
+            except concurrent.futures.CancelledError:
+                return False
+
+        def produce():
+            try:
+                for item in fn(*args, **kwargs):
+                    if stop.is_set() or not put(item):
+                        break
+            finally:
+                if not stop.is_set():
+                    put(finished)
+
+        if not self._slots.acquire(blocking=False):
+            raise ExecutorBusyError(f"Too many pending '{self.name}' tasks (limit {self.max_pending})")
+        try:
+            future = loop.run_in_executor(self._pool, produce)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            while True:
+                item = await queue.get()
+                if item is finished:
+                    break
+                yield item
+            await future
+        finally:
+            stop.set()
+            if pending[0] is not None:
+                pending[0].cancel()
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+_lock = threading.Lock()
+_executors = {}
+
+
+def get_executor(workload: str) -> WorkloadExecutor:
+    executor = _executors.get(workload)
+    if executor is None:
+        with _lock:
+            executor = _executors.get(workload)
+            if executor is None:
+                defaults = WORKLOADS[workload]
+                prefix = workload.upper()
+                executor = WorkloadExecutor(
+                    workload,
+                    int(os.environ.get(f"{prefix}_WORKERS", defaults['workers'])),
+                    int(os.environ.get(f"{prefix}_MAX_PENDING", defaults['max_pending'])),
+                )
+                logging.info(f"Started '{workload}' executor with {executor.workers} workers")
+                _executors[workload] = executor
+    return executor
+
+
+async def run_in_pool(workload: str, fn, *args, **kwargs):
+    """Run fn(*args, **kwargs) on the bounded pool for the given workload class"""
+    return await get_executor(workload).run(fn, *args, **kwargs)
+
+
+async def stream_in_pool(workload: str, fn, *args, **kwargs):
+    """Async iterator over a blocking generator fn(*args, **kwargs) run on the workload pool"""
+    async for item in get_executor(workload).stream(fn, *args, **kwargs):
+        yield item
+
+
+def shutdown_executors():
+    with _lock:
+        for executor in _executors.values():
+            executor.shutdown()
+        _executors.clear()
@@ -0,0 +1,174 @@
+# Text extraction for CPU-heavy formats, run in a process pool.
+# Extractors are module-level functions taking a file path so they can be pickled
+# to worker processes; the worker reads the file itself instead of receiving a copy.
+import contextlib
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+import docx
+import markdown
+import pandas as pd
+from bs4 import BeautifulSoup
+from pypdf import PdfReader
+
+# Worker processes for parsing (default: one per core)
+PARSE_WORKERS = int(os.getenv('PARSE_WORKERS', os.cpu_count() or 1))
+# PDF pages extracted per task; smaller ranges spread one large PDF over more cores
+PDF_PAGES_PER_TASK = int(os.getenv('PDF_PAGES_PER_TASK', 8))
+
+
+def _read_text(path: str) -> str:
+    with open(path, 'rb') as f:
+        data = f.read()
+    try:
+        return data.decode('utf-8')
+    except UnicodeDecodeError:
+        return data.decode('latin-1')
+
+
+def pdf_page_count(path: str) -> int:
+    return len(PdfReader(path).pages)
+
+
+def extract_pdf_pages(path: str, start: int, stop: int) -> str:
+    reader = PdfReader(path)
+    texts = []
+    for page in reader.pages[start:stop]:
+        text = page.extract_text()
+        if text and text.strip():
+            texts.append(text)
+    return "\n".join(texts)
+
+
+def extract_docx(path: str) -> str:
+    return "\n".join(paragraph.text for paragraph in docx.Document(path).paragraphs)
+
+
+def extract_excel(path: str) -> str:
+    return pd.read_excel(path).to_string(index=False)
+
+
+def extract_csv(path: str) -> str:
+    return pd.read_csv(path).to_string(index=False)
+
+
+def extract_html(path: str) -> str:
+    return BeautifulSoup(_read_text(path), 'html.parser').get_text(separator='\n', strip=True)
+
+
+def extract_markdown(path: str) -> str:
+    html = markdown.markdown(_read_text(path))
+    return BeautifulSoup(html, 'html.parser').get_text(separator='\n', strip=True)
+
+
+# File extension -> extractor run in the pool (PDF is handled page by page)
+EXTRACTORS = {
+    'docx': extract_docx,
+    'doc': extract_docx,
+    'xlsx': extract_excel,
+    'xls': extract_excel,
+    'csv': extract_csv,
+    'html': extract_html,
+    'md': extract_markdown,
+}
+
+
+def supports(file_type: str) -> bool:
+    return file_type == 'pdf' or file_type in EXTRACTORS
+
+
+_lock = threading.Lock()
+_pool = None
+
+
+def get_parse_pool() -> ProcessPoolExecutor:
+    """Process-wide parsing pool (spawned workers, so no threads or model state are forked)"""
+    global _pool
+    if _pool is None:
+        with _lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(max_workers=PARSE_WORKERS,
+                                            mp_context=multiprocessing.get_context('spawn'))
+    return _pool
+
+
+def shutdown_parse_pool():
+    global _pool
+    with _lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+@contextlib.contextmanager
+def source_path(stream):
+    """Path of a file the workers can open: the stream's own file, or a temp copy"""
+    name = getattr(stream, 'name', None)
+    if isinstance(name, str) and os.path.isfile(name):
+        yield name
+        return
+    os.makedirs('temp', exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir='temp', delete=False) as tmp:
+        stream.seek(0)
+        shutil.copyfileobj(stream, tmp, 1024 * 1024)
+    try:
+        yield tmp.name
+    finally:
+        os.remove(tmp.name)
+
+
+def submit_extraction(path: str, file_type: str, pool: Optional[ProcessPoolExecutor] = None) -> Future:
+    """Start extracting the text of a file; the future resolves to the text"""
+    pool = pool or get_parse_pool()
+    if file_type != 'pdf':
+        return pool.submit(EXTRACTORS[file_type], path)
+
+    result = Future()
+    result.set_running_or_notify_cancel()
+
+    def on_page_count(count_future):
+        try:
+            pages = count_future.result()
+            parts = [pool.submit(extract_pdf_pages, path, start, min(start + PDF_PAGES_PER_TASK, pages))
+                     for start in range(0, pages, PDF_PAGES_PER_TASK)]
+        except BaseException as e:
+            result.set_exception(e)
+            return
+        if not parts:
+            result.set_result("")
+            return
+        remaining = [len(parts)]
+        lock = threading.Lock()
+
+        def on_part(_):
+            with lock:
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
+            try:
+                result.set_result("\n".join(text for text in (part.result() for part in parts) if text))
+            except BaseException as e:
+                result.set_exception(e)
+
+        for part in parts:
+            part.add_done_callback(on_part)
+
+    pool.submit(pdf_page_count, path).add_done_callback(on_page_count)
+    return result
+
+
+def extract_in_pool(stream, file_type: str) -> str:
+    """Extract the text of a binary stream in the parsing pool (blocks until done)"""
+    with source_path(stream) as path:
+        try:
+            return submit_extraction(path, file_type).result()
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory); start a fresh pool for the next file
+            shutdown_parse_pool()
+            raise
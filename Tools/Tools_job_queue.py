@@ -0,0 +1,290 @@
+import json
+import logging
+import os
+import queue
+import re
+import shutil
+import threading
+import time
+import uuid
+from typing import Dict, Optional
+
+from Tools.Tools_executor import ExecutorBusyError
+from Tools.Tools_file_lock import FileLock
+from Tools.Tools_readfile import Tools_readfile
+
+# Upload jobs are persisted here: <id>.json (status) and <id>.upload (the file until it is processed),
+# plus <owner>.owner, a lock each running queue holds so other processes know its jobs are taken
+JOBS_PATH = os.getenv('INGEST_JOBS_PATH', 'ingest_jobs')
+# Uploads processed at the same time; keep this low so ingest cannot starve query traffic
+JOB_WORKERS = int(os.getenv('INGEST_JOB_WORKERS', 1))
+# Jobs that may wait in the queue before new uploads are rejected with 503
+JOB_MAX_PENDING = int(os.getenv('INGEST_JOB_MAX_PENDING', 100))
+# Finished job records older than this are removed at startup
+JOB_RETENTION = float(os.getenv('INGEST_JOB_RETENTION', 7 * 24 * 3600))
+
+FINISHED_STAGES = ('done', 'failed')
+RECOVER_LOCK = 'recover.lock'
+JOB_ID = re.compile(r'[0-9a-f]{32}')
+COPY_BUFFER_SIZE = 1024 * 1024
+
+
+class JobQueue:
+    """Background ingestion of uploaded files with persisted progress
+
+    ``submit`` stores the upload on disk and returns a job record at once;
+    ``workers`` threads run ``tools.process_file`` on queued jobs. Records are
+    rewritten atomically on every stage change, and unfinished jobs are queued
+    again when the process restarts.
+
+    Several processes (uvicorn workers) may share one ``path``. Each job is
+    run by the queue that owns it: the one it was submitted to, or the one that
+    claimed it at startup after its owner stopped (its owner lock is free).
+    ``get`` reads records of other processes' jobs from disk.
+    """
+
+    def __init__(self, tools, path: str = JOBS_PATH, workers: int = JOB_WORKERS,
+                 max_pending: int = JOB_MAX_PENDING, retention: float = JOB_RETENTION):
+        self.tools = tools
+        self.path = path
+        self.workers = workers
+        self.max_pending = max_pending
+        self.retention = retention
+        self._jobs: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._threads = []
+        self._stop = threading.Event()
+        self.owner = uuid.uuid4().hex
+        self._owner_lock = None
+
+    # ---------- persistence ----------
+    def _record_path(self, job_id: str) -> str:
+        return os.path.join(self.path, f"{job_id}.json")
+
+    def _upload_path(self, job_id: str) -> str:
+        return os.path.join(self.path, f"{job_id}.upload")
+
+    def _owner_path(self, owner: str) -> str:
+        return os.path.join(self.path, f"{owner}.owner")
+
+    def _owner_alive(self, owner: Optional[str]) -> bool:
+        """Whether the queue that owns a job is still running (it holds its owner lock)"""
+        if owner == self.owner:
+            return True
+        if not owner or not os.path.exists(self._owner_path(owner)):
+            return False
+        lock = FileLock(self._owner_path(owner))
+        if not lock.acquire(blocking=False):
+            return True
+        lock.release()
+        return False
+
+    def _read(self, job_id: str) -> Dict:
+        with open(self._record_path(job_id), encoding='utf-8') as f:
+            return json.load(f)
+
+    def _save(self, job: Dict):
+        tmp = self._record_path(job['id']) + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(job, f, ensure_ascii=False)
+        os.replace(tmp, self._record_path(job['id']))
+
+    def _recover(self):
+        """Load job records from disk and claim the unfinished ones whose owner has stopped"""
+        now = time.time()
+        pending = []
+        # One process claims at a time, so an orphaned job gets exactly one new owner
+        with FileLock(os.path.join(self.path, RECOVER_LOCK)):
+            for name in sorted(os.listdir(self.path)):
+                if not name.endswith('.json'):
+                    continue
+                try:
+                    job = self._read(name[:-len('.json')])
+                except (OSError, ValueError) as e:
+                    logging.warning(f"Skipping unreadable job record {name}: {e}")
+                    continue
+                if job['stage'] in FINISHED_STAGES:
+                    if now - (job.get('finished_at') or now) > self.retention:
+                        os.remove(os.path.join(self.path, name))
+                        continue
+                elif self._owner_alive(job.get('owner')):
+                    continue  # queued or running in another process
+                elif os.path.exists(self._upload_path(job['id'])):
+                    job.update(owner=self.owner, stage='queued', chunks_done=0,
+                               restarts=job.get('restarts', 0) + 1)
+                    self._save(job)
+                    pending.append(job)
+                else:
+                    job.update(owner=self.owner, stage='failed', error='Upload lost before processing',
+                               finished_at=now)
+                    self._save(job)
+                self._jobs[job['id']] = job
+            for name in os.listdir(self.path):
+                owner = name[:-len('.owner')]
+                if name.endswith('.owner') and not self._owner_alive(owner):
+                    os.remove(self._owner_path(owner))
+        for job in sorted(pending, key=lambda job: job['created_at']):
+            self._queue.put(job['id'])
+        if pending:
+            logging.info(f"Re-queued {len(pending)} unfinished ingest jobs")
+
+    # ---------- lifecycle ----------
+    def start(self):
+        if self._threads:
+            return
+        os.makedirs(self.path, exist_ok=True)
+        self._stop.clear()
+        self._owner_lock = FileLock(self._owner_path(self.owner))
+        self._owner_lock.acquire()
+        self._recover()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"ingest-job-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logging.info(f"Started ingest job queue with {self.workers} workers")
+
+    def shutdown(self):
+        """Stop the workers; a job in progress is queued again on the next start"""
+        self._stop.set()
+        for _ in self._threads:
+            self._queue.put(None)
+        self._threads = []
+        if self._owner_lock is not None:
+            self._owner_lock.release()
+            self._owner_lock = None
+
+    # ---------- jobs ----------
+    def submit(self, stream, filename: str, file_type: str, chunk_size: Optional[int] = None) -> Dict:
+        """Store an upload (binary file object) and queue it; raises ExecutorBusyError when the queue is full
+
+        ``chunk_size`` is the token budget per chunk (None = CHUNK_MAX_TOKENS).
+        """
+        if self._queue.qsize() >= self.max_pending:
+            raise ExecutorBusyError(f"Too many pending ingest jobs (limit {self.max_pending})")
+        job_id = uuid.uuid4().hex
+        stream.seek(0)
+        with open(self._upload_path(job_id), 'wb') as f:
+            shutil.copyfileobj(stream, f, COPY_BUFFER_SIZE)
+        job = {
+            'id': job_id,
+            'filename': filename,
+            'file_type': file_type,
+            'chunk_size': chunk_size,
+            'owner': self.owner,
+            'bytes': os.path.getsize(self._upload_path(job_id)),
+            'stage': 'queued',
+            'chunks_total': None,
+            'chunks_done': 0,
+            'error': None,
+            'dedup': None,
+            'created_at': time.time(),
+            'started_at': None,
+            'embedding_started_at': None,
+            'finished_at': None,
+            'restarts': 0
+        }
+        with self._lock:
+            self._jobs[job_id] = job
+            self._save(job)
+        self._queue.put(job_id)
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Job record plus elapsed time and throughput, or None for an unknown id"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            job = dict(job) if job is not None else None
+        if job is None:
+            # Submitted to (or claimed by) another worker process sharing this folder
+            if not JOB_ID.fullmatch(job_id):
+                return None
+            try:
+                job = self._read(job_id)
+            except (OSError, ValueError):
+                return None
+        end = job['finished_at'] or time.time()
+        job['elapsed_seconds'] = round(end - job['started_at'], 3) if job['started_at'] else 0.0
+        embedding_time = end - job['embedding_started_at'] if job['embedding_started_at'] else 0.0
+        job['chunks_per_second'] = round(job['chunks_done'] / embedding_time, 2) if embedding_time > 0 else 0.0
+        job['queue_position'] = self._queue_position(job_id) if job['stage'] == 'queued' else None
+        return job
+
+    def _queue_position(self, job_id: str) -> Optional[int]:
+        with self._queue.mutex:
+            waiting = list(self._queue.queue)
+        return waiting.index(job_id) + 1 if job_id in waiting else None
+
+    def _update(self, job_id: str, **changes):
+        with self._lock:
+            job = self._jobs[job_id]
+            job.update(changes)
+            self._save(job)
+
+    def _progress(self, job_id: str):
+        def report(stage, **counts):
+            changes = dict(counts)
+            if stage == 'failed':
+                # Keep the stage until process_file returns; remember the reason
+                self._update(job_id, **changes)
+                return
+            if stage == 'dedup':
+                self._update(job_id, dedup=changes)
+                return
+            changes['stage'] = stage
+            if stage == 'embedding' and not self._jobs[job_id]['embedding_started_at']:
+                changes['embedding_started_at'] = time.time()
+            self._update(job_id, **changes)
+        return report
+
+    def _work(self):
+        while not self._stop.is_set():
+            job_id = self._queue.get()
+            if job_id is None:
+                break
+            job = self._jobs[job_id]
+            self._update(job_id, stage='parsing', started_at=time.time(), embedding_started_at=None, error=None)
+            try:
+                with open(self._upload_path(job_id), 'rb') as f:
+                    success = self.tools.process_file(f, job['filename'], job['file_type'],
+                                                      progress=self._progress(job_id),
+                                                      chunk_size=job.get('chunk_size'))
+            except Exception as e:
+                logging.error(f"Ingest job {job_id} crashed: {e}")
+                success = False
+                self._update(job_id, error=str(e))
+            if self._stop.is_set() and not success:
+                break  # interrupted by shutdown: leave it queued for the next start
+            if success:
+                self._update(job_id, stage='done', finished_at=time.time())
+            else:
+                self._update(job_id, stage='failed', finished_at=time.time(),
+                             error=self._jobs[job_id]['error'] or 'Failed to process file')
+            try:
+                os.remove(self._upload_path(job_id))
+            except OSError:
+                pass
+
+
+_lock = threading.Lock()
+_job_queue = None
+
+
+def get_job_queue() -> JobQueue:
+    """Process-wide ingest job queue (started on first use)"""
+    global _job_queue
+    if _job_queue is None:
+        with _lock:
+            if _job_queue is None:
+                job_queue = JobQueue(Tools_readfile())
+                job_queue.start()
+                _job_queue = job_queue
+    return _job_queue
+
+
+def shutdown_job_queue():
+    global _job_queue
+    with _lock:
+        if _job_queue is not None:
+            _job_queue.shutdown()
+            _job_queue = None
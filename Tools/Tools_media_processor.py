@@ -1,48 +1,207 @@
 import os
-import speech_recognition as sr
 import subprocess
 import logging
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+import numpy as np
+
 from Tools.Tools_setup_ffmpeg import FFmpegSetup
 
+try:
+    import speech_recognition as sr
+except ImportError:
+    sr = None
+
+SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2  # 16-bit PCM
+# Segment length bounds in seconds; segments are cut at the quietest point past the minimum
+SEGMENT_MIN_SECONDS = float(os.getenv('SPEECH_SEGMENT_MIN_SECONDS', 10))
+SEGMENT_MAX_SECONDS = float(os.getenv('SPEECH_SEGMENT_MAX_SECONDS', 30))
+# Frames quieter than this RMS (of int16 samples) count as silence
+SILENCE_RMS = float(os.getenv('SPEECH_SILENCE_RMS', 300))
+# Segments transcribed at the same time per media file
+SPEECH_WORKERS = int(os.getenv('SPEECH_WORKERS', 4))
+# Recognizer backend: 'google' (speech_recognition web API) or 'offline' (local stand-in)
+SPEECH_BACKEND = os.getenv('SPEECH_BACKEND', 'google')
+
+FRAME_SECONDS = 0.02
+# Bytes read from ffmpeg's stdout per block (about 2 s of audio)
+PCM_BLOCK_SIZE = 64 * 1024
+
+
+class GoogleRecognizer:
+    """Google Web Speech API through speech_recognition"""
+
+    def __init__(self):
+        if sr is None:
+            raise ValueError("speech_recognition is not installed")
+        self.recognizer = sr.Recognizer()
+
+    def transcribe(self, pcm: bytes, sample_rate: int, language: str) -> str:
+        try:
+            return self.recognizer.recognize_google(sr.AudioData(pcm, sample_rate, SAMPLE_WIDTH), language=language)
+        except sr.UnknownValueError:
+            return ""  # no speech in this segment
+
+
+class OfflineRecognizer:
+    """Local stand-in for tests and benchmarks: describes each segment instead of calling a service
+
+    ``delay`` seconds per call simulates recognition latency.
+    """
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+
+    def transcribe(self, pcm: bytes, sample_rate: int, language: str) -> str:
+        if self.delay:
+            time.sleep(self.delay)
+        samples = np.frombuffer(pcm, dtype='<i2')
+        seconds = len(samples) / sample_rate
+        level = float(np.sqrt(np.mean(samples.astype('float32') ** 2))) if len(samples) else 0.0
+        return f"[เสียง {seconds:.2f} วินาที ระดับ {level:.0f}]"
+
+
+RECOGNIZERS = {
+    'google': GoogleRecognizer,
+    'offline': OfflineRecognizer,
+}
+
+
+def get_recognizer(name: str = None):
+    name = name or SPEECH_BACKEND
+    if name not in RECOGNIZERS:
+        raise ValueError(f"Unknown speech backend '{name}', expected one of {tuple(RECOGNIZERS)}")
+    return RECOGNIZERS[name]()
+
+
+def _cut_point(pcm: np.ndarray, frame: int, min_len: int, max_len: int, silence_rms: float) -> int:
+    """Length of the next segment of pcm (longer than max_len): the quietest frame past min_len, else max_len"""
+    window = pcm[min_len:max_len]
+    frames = len(window) // frame
+    if frames:
+        levels = np.sqrt(np.mean(window[:frames * frame].astype('float32').reshape(frames, frame) ** 2, axis=1))
+        quietest = int(np.argmin(levels))
+        if levels[quietest] < silence_rms:
+            return min_len + quietest * frame + frame // 2
+    return max_len
+
+
+def segment_blocks(blocks: Iterable[np.ndarray], sample_rate: int = SAMPLE_RATE,
+                   min_seconds: float = SEGMENT_MIN_SECONDS, max_seconds: float = SEGMENT_MAX_SECONDS,
+                   silence_rms: float = SILENCE_RMS) -> Iterator[Tuple[int, np.ndarray]]:
+    """Yield (start sample, pcm) segments of int16 mono PCM arriving in blocks
+
+    Each segment is at most max_seconds long. Past min_seconds it ends at the
+    quietest frame, provided that frame is below silence_rms. Otherwise it is
+    cut at max_seconds. Only about one segment of audio is buffered at a time.
+    """
+    frame = int(sample_rate * FRAME_SECONDS)
+    min_len, max_len = int(min_seconds * sample_rate), int(max_seconds * sample_rate)
+    buffer, offset = np.empty(0, dtype='<i2'), 0
+    for block in blocks:
+        buffer = np.concatenate((buffer, block)) if len(buffer) else block
+        while len(buffer) > max_len:
+            end = _cut_point(buffer, frame, min_len, max_len, silence_rms)
+            yield offset, buffer[:end]
+            offset += end
+            buffer = buffer[end:]
+    if len(buffer):
+        yield offset, buffer
+
+
 class MediaProcessor:
     @staticmethod
-    def process_media_file(file_path: str, language='th-TH') -> str:
-        """Process any media file (audio/video) to text"""
+    def decode_pcm_blocks(file_path: str, block_size: int = PCM_BLOCK_SIZE) -> Iterator[np.ndarray]:
+        """Decode the audio track to 16 kHz mono int16 PCM, read from ffmpeg's stdout in fixed-size blocks"""
         if not FFmpegSetup.check_ffmpeg():
             raise ValueError("ไม่พบ FFmpeg กรุณารอสักครู่ระบบกำลังติดตั้งให้อัตโนมัติ")
-
-        temp_dir = "temp"
-        os.makedirs(temp_dir, exist_ok=True)
-        temp_audio = os.path.join(temp_dir, "temp_audio.wav")
-
-        try:
-            # Extract/convert audio
-            subprocess.run([
+        block_size -= block_size % SAMPLE_WIDTH
+        with tempfile.TemporaryFile() as stderr:
+            process = subprocess.Popen([
                 'ffmpeg',
+                '-nostdin',
+                '-loglevel', 'error',
                 '-i', file_path,
                 '-vn',  # No video
+                '-f', 's16le',
                 '-acodec', 'pcm_s16le',
-                '-ar', '16000',
+                '-ar', str(SAMPLE_RATE),
                 '-ac', '1',
-                '-y',
-                temp_audio
-            ], capture_output=True)
-
-            # Convert to text
-            recognizer = sr.Recognizer()
-            with sr.AudioFile(temp_audio) as source:
-                audio = recognizer.record(source)
-                text = recognizer.recognize_google(audio, language=language)
-                return text
-
-        except subprocess.CalledProcessError as e:
-            logging.error(f"FFmpeg error: {e.stderr.decode()}")
-            raise ValueError("ไม่สามารถแปลงไฟล์เสียงได้")
-        except sr.UnknownValueError:
-            raise ValueError("ไม่สามารถแปลงเสียงเป็นข้อความได้")
-        except Exception as e:
-            logging.error(f"Error processing media: {str(e)}")
-            raise
+                'pipe:1'
+            ], stdout=subprocess.PIPE, stderr=stderr)
+            try:
+                while True:
+                    data = process.stdout.read(block_size)
+                    if not data:
+                        break
+                    yield np.frombuffer(data[:len(data) - len(data) % SAMPLE_WIDTH], dtype='<i2')
+                process.stdout.close()
+                if process.wait() != 0:
+                    stderr.seek(0)
+                    logging.error(f"FFmpeg error: {stderr.read().decode(errors='replace')}")
+                    raise ValueError("ไม่สามารถแปลงไฟล์เสียงได้")
+            finally:
+                if process.poll() is None:  # consumer stopped early or failed
+                    process.kill()
+                    process.wait()
+
+    @staticmethod
+    def transcribe_segments(segments: Iterable[Tuple[int, np.ndarray]], sample_rate: int = SAMPLE_RATE,
+                            language: str = 'th-TH', recognizer=None, workers: int = SPEECH_WORKERS) -> List[Dict]:
+        """Transcribe (start sample, pcm) segments in parallel as they arrive
+
+        At most 2 * workers segments are held in memory at once. Returns one dict
+        per segment with text, in order: {'start', 'end', 'text'} (seconds).
+        """
+        recognizer = recognizer or get_recognizer()
+        workers = max(1, workers)
+        results, pending = [], deque()
+
+        def collect():
+            start, length, future = pending.popleft()
+            text = future.result().strip()
+            if text:
+                results.append({'start': round(start / sample_rate, 2),
+                                'end': round((start + length) / sample_rate, 2),
+                                'text': text})
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for start, pcm in segments:
+                if len(pending) >= 2 * workers:
+                    collect()
+                pending.append((start, len(pcm), pool.submit(recognizer.transcribe, pcm.tobytes(), sample_rate, language)))
+            while pending:
+                collect()
+        return results
+
+    @staticmethod
+    def transcribe_pcm(pcm: np.ndarray, sample_rate: int = SAMPLE_RATE, language: str = 'th-TH',
+                       recognizer=None, workers: int = SPEECH_WORKERS) -> List[Dict]:
+        """Transcribe int16 mono PCM already in memory"""
+        return MediaProcessor.transcribe_segments(segment_blocks([pcm], sample_rate), sample_rate, language,
+                                                  recognizer, workers)
+
+    @staticmethod
+    def transcribe_media_file(file_path: str, language='th-TH', recognizer=None) -> List[Dict]:
+        """Transcribe any media file (audio/video) into timestamped segments
+
+        Decoding, segmentation and recognition overlap; no intermediate audio file is written.
+        """
+        blocks = MediaProcessor.decode_pcm_blocks(file_path)
+        try:
+            segments = MediaProcessor.transcribe_segments(segment_blocks(blocks), SAMPLE_RATE, language, recognizer)
         finally:
-            if os.path.exists(temp_audio):
-                os.remove(temp_audio)
+            blocks.close()  # stops ffmpeg if recognition failed part way
+        if not segments:
+            raise ValueError("ไม่สามารถแปลงเสียงเป็นข้อความได้")
+        return segments
+
+    @staticmethod
+    def process_media_file(file_path: str, language='th-TH') -> str:
+        """Process any media file (audio/video) to text"""
+        return " ".join(segment['text'] for segment in MediaProcessor.transcribe_media_file(file_path, language))
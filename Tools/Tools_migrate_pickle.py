@@ -0,0 +1,33 @@
+"""Convert a legacy vector_db.pkl into the append-only vector store format
+
+The vectors are copied out of the pickled FAISS index, so no document is
+re-embedded.
+
+Usage:
+    python Tools/Tools_migrate_pickle.py --pkl vector_db.pkl --out vector_store
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Model.Model_Vector_Store import VectorStore, migrate_pickle
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pkl', default='vector_db.pkl', help='legacy pickle file')
+    parser.add_argument('--out', default='vector_store', help='target store directory')
+    parser.add_argument('--dimension', type=int, default=768)
+    args = parser.parse_args()
+
+    store = VectorStore(args.out, args.dimension)
+    if store.exists():
+        sys.exit(f"{args.out} already contains a vector store")
+    count = migrate_pickle(args.pkl, store)
+    print(f"Migrated {count} documents from {args.pkl} to {args.out} ({store.rows} vectors)")
+
+
+if __name__ == "__main__":
+    main()
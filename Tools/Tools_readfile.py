@@ -1,17 +1,14 @@
 from io import BytesIO
-from pypdf import PdfReader
-import docx
-import pandas as pd
 import json
-import markdown
 import email
-from bs4 import BeautifulSoup
 import numpy as np
 from PIL import Image
 import os
 import logging
 import traceback
 from Tools.Tools_media_processor import MediaProcessor
+from Tools.Tools_extract import extract_in_pool, source_path, submit_extraction, supports as pool_supports
+from concurrent.futures import as_completed
 
 # Set up logging
 logging.basicConfig(
@@ -32,12 +29,23 @@ except ImportError:
     print("Warning: speech_recognition not available. Audio processing will be disabled.")
 
 from Model.Model_Vector_DB import VectorDB
-from concurrent.futures import ThreadPoolExecutor
+from Model.Model_provider import get_vector_db
 import threading
 from Tools.Tools_document import Document
+import hashlib
 
-progress_lock = threading.Lock()
-upload_progress = {}
+# Block size for hashing uploads
+HASH_BUFFER_SIZE = 1024 * 1024
+
+
+def file_fingerprint(stream) -> str:
+    """sha256 of a binary stream's full content; the stream is rewound afterwards"""
+    digest = hashlib.sha256()
+    stream.seek(0)
+    for block in iter(lambda: stream.read(HASH_BUFFER_SIZE), b''):
+        digest.update(block)
+    stream.seek(0)
+    return digest.hexdigest()
 
 class Tools_readfile:
     # Maximum file sizes
@@ -59,104 +67,81 @@ class Tools_readfile:
         'mp4': 50 * 1024 * 1024,    # 50MB
     }
 
-    def __init__(self):
-        self.db = VectorDB()
+    # Number of chunks encoded per forward pass
+    EMBED_BATCH_SIZE = 32
+    # Number of chunks added to the vector DB per call (progress is reported per block)
+    INDEX_BLOCK_SIZE = 256
+
+    def __init__(self, db: VectorDB = None):
+        self._db = db
+        # Progress callback, chunk size and file fingerprint of the upload running on the current thread
+        # (see process_file)
+        self._context = threading.local()
+
+    @property
+    def db(self) -> VectorDB:
+        """Vector DB shared across the process unless one was injected"""
+        return self._db if self._db is not None else get_vector_db()
     
-    @staticmethod
-    def update_progress(self, file_id, status, message):
-        with progress_lock:
-            upload_progress[file_id] = {'status': status, 'message': message}
+    def _report(self, stage, **counts):
+        callback = getattr(self._context, 'callback', None)
+        if callback:
+            callback(stage, **counts)
 
-    @staticmethod
-    def chunk_text(text, chunk_size=250):
-        words = text.split()
-        chunks = []
-        total_words = len(words)
-        
-        for i in range(0, total_words, chunk_size):
-            chunk = words[i:i + chunk_size]
-            chunks.append(' '.join(chunk))
-        return chunks
+    def chunk_text(self, text, chunk_size=None):
+        """Split text into token-budgeted, overlapping chunks
 
-    def process_txt(self, file_content, filename):
-        """Process text files"""
+        chunk_size is in tokens; None uses the chunk size of the current upload, then CHUNK_MAX_TOKENS.
+        """
+        return self.db.chunker.split(text, chunk_size or getattr(self._context, 'chunk_size', None))
+
+    @staticmethod
+    def _read_text(stream):
+        """Decode a binary stream as UTF-8, falling back to latin-1"""
+        data = stream.read()
         try:
-            text = file_content.decode('utf-8')
+            return data.decode('utf-8')
         except UnicodeDecodeError:
-            text = file_content.decode('latin-1')
-        return self._process_text_content(text, filename, 'txt')
-
-    def process_pdf(self, file_content, filename):
-        """Process PDF files"""
-        pdf_stream = BytesIO(file_content)
-        reader = PdfReader(pdf_stream)
-        all_text = ""
-        for page in reader.pages:
-            text = page.extract_text()
-            if text.strip():
-                all_text += text + "\n"
-        
-        return self._process_text_content(all_text, filename, 'pdf')
-
-    def process_docx(self, file_content, filename):
+            return data.decode('latin-1')
+
+    def process_txt(self, stream, filename):
+        """Process text files"""
+        return self._process_text_content(self._read_text(stream), filename, 'txt')
+
+    def process_pdf(self, stream, filename):
+        """Process PDF files (pages are extracted in parallel in the parsing pool)"""
+        return self._process_text_content(extract_in_pool(stream, 'pdf'), filename, 'pdf')
+
+    def process_docx(self, stream, filename):
         """Process Word documents"""
-        doc_stream = BytesIO(file_content)
-        doc = docx.Document(doc_stream)
-        all_text = "\n".join([paragraph.text for paragraph in doc.paragraphs])
-        return self._process_text_content(all_text, filename, 'docx')
+        return self._process_text_content(extract_in_pool(stream, 'docx'), filename, 'docx')
 
-    def process_excel(self, file_content, filename):
+    def process_excel(self, stream, filename):
         """Process Excel files"""
-        excel_stream = BytesIO(file_content)
-        df = pd.read_excel(excel_stream)
-        text_content = df.to_string(index=False)
-        return self._process_text_content(text_content, filename, 'excel')
+        return self._process_text_content(extract_in_pool(stream, 'xlsx'), filename, 'excel')
 
-    def process_csv(self, file_content, filename):
+    def process_csv(self, stream, filename):
         """Process CSV files"""
-        csv_stream = BytesIO(file_content)
-        df = pd.read_csv(csv_stream)
-        text_content = df.to_string(index=False)
-        return self._process_text_content(text_content, filename, 'csv')
+        return self._process_text_content(extract_in_pool(stream, 'csv'), filename, 'csv')
 
-    def process_json(self, file_content, filename):
+    def process_json(self, stream, filename):
         """Process JSON files"""
-        try:
-            json_data = json.loads(file_content.decode('utf-8'))
-            text_content = json.dumps(json_data, indent=2, ensure_ascii=False)
-            return self._process_text_content(text_content, filename, 'json')
-        except UnicodeDecodeError:
-            json_stream = BytesIO(file_content)
-            text_content = json_stream.read().decode('utf-8')
-            return self._process_text_content(text_content, filename, 'json')
+        json_data = json.load(stream)
+        text_content = json.dumps(json_data, indent=2, ensure_ascii=False)
+        return self._process_text_content(text_content, filename, 'json')
 
-    def process_html(self, file_content, filename):
+    def process_html(self, stream, filename):
         """Process HTML files"""
-        try:
-            html_text = file_content.decode('utf-8')
-        except UnicodeDecodeError:
-            html_text = file_content.decode('latin-1')
-        
-        soup = BeautifulSoup(html_text, 'html.parser')
-        text_content = soup.get_text(separator='\n', strip=True)
-        return self._process_text_content(text_content, filename, 'html')
+        return self._process_text_content(extract_in_pool(stream, 'html'), filename, 'html')
 
-    def process_markdown(self, file_content, filename):
+    def process_markdown(self, stream, filename):
         """Process Markdown files"""
-        try:
-            md_text = file_content.decode('utf-8')
-        except UnicodeDecodeError:
-            md_text = file_content.decode('latin-1')
-            
-        html = markdown.markdown(md_text)
-        soup = BeautifulSoup(html, 'html.parser')
-        text_content = soup.get_text(separator='\n', strip=True)
-        return self._process_text_content(text_content, filename, 'markdown')
+        return self._process_text_content(extract_in_pool(stream, 'md'), filename, 'markdown')
 
-    def process_email(self, file_content, filename):
+    def process_email(self, stream, filename):
         """Process email files"""
         try:
-            msg = email.message_from_bytes(file_content)
+            msg = email.message_from_binary_file(stream)
             text_parts = []
             
             # Add headers
@@ -185,65 +170,108 @@ class Tools_readfile:
             text_content = "\n\n".join(text_parts)
             return self._process_text_content(text_content, filename, 'email')
         except Exception as e:
+            self._report('failed', error=str(e))
             logging.error(f"Error processing email: {str(e)}")
             return False
 
-    def process_audio(self, file_content, filename):
-        """Process audio files (MP3, WAV)"""
-        temp_file = None
+    def _process_media(self, stream, filename, file_type):
+        """Transcribe audio/video segment by segment; each chunk keeps the time range it covers"""
         try:
-            os.makedirs('temp', exist_ok=True)
-            temp_file = os.path.join('temp', f"temp_{filename}")
-            
-            with open(temp_file, 'wb') as f:
-                f.write(file_content)
-
-            text_content = MediaProcessor.process_media_file(temp_file)
-            return self._process_text_content(text_content, filename, 'audio')
+            # ffmpeg needs a file on disk: the job's upload file, or a per-call temp copy
+            with source_path(stream) as path:
+                segments = MediaProcessor.transcribe_media_file(path)
+
+            self._report('chunking', characters=sum(len(segment['text']) for segment in segments))
+            chunks = self._transcript_chunks(segments)
+            docs = [
+                Document(
+                    page_content=text,
+                    metadata={
+                        'source': filename,
+                        'chunk_id': chunk_id,
+                        'type': file_type,
+                        'total_chunks': len(chunks),
+                        'start_time': start,
+                        'end_time': end
+                    }
+                )
+                for chunk_id, (text, start, end) in enumerate(chunks, 1)
+            ]
+            self._index_documents(docs, filename)
+            logging.info(f"Successfully processed {len(docs)} chunks from {filename}")
+            return True
 
         except Exception as e:
-            logging.error(f"Error processing audio file {filename}: {str(e)}")
+            self._report('failed', error=str(e))
+            logging.error(f"Error processing {file_type} file {filename}: {str(e)}")
             return False
-        finally:
-            if temp_file and os.path.exists(temp_file):
-                os.remove(temp_file)
 
-    def process_video(self, file_content, filename):
-        """Process video files (MP4)"""
-        temp_file = None
-        try:
-            os.makedirs('temp', exist_ok=True)
-            temp_file = os.path.join('temp', f"temp_{filename}")
-            
-            with open(temp_file, 'wb') as f:
-                f.write(file_content)
+    def _transcript_chunks(self, segments):
+        """Pack consecutive transcript segments into chunks within the token budget
+
+        Returns (text, start, end) tuples in order; a segment longer than the budget
+        is split on its own and its pieces share the segment's time range.
+        """
+        chunker = self.db.chunker
+        max_tokens = getattr(self._context, 'chunk_size', None) or chunker.max_tokens
+        counts = chunker.count_tokens([segment['text'] for segment in segments])
+        chunks, texts, start, end, tokens = [], [], None, None, 0
+
+        def flush():
+            if texts:
+                chunks.append((" ".join(texts), start, end))
+
+        for segment, count in zip(segments, counts):
+            if count > max_tokens:
+                flush()
+                texts, tokens = [], 0
+                chunks.extend((piece, segment['start'], segment['end']) for piece in chunker.split(segment['text'], max_tokens))
+                continue
+            if texts and tokens + count > max_tokens:
+                flush()
+                texts, tokens = [], 0
+            if not texts:
+                start = segment['start']
+            texts.append(segment['text'])
+            end = segment['end']
+            tokens += count
+        flush()
+        return chunks
 
-            text_content = MediaProcessor.process_media_file(temp_file)
-            return self._process_text_content(text_content, filename, 'video')
+    def process_audio(self, stream, filename):
+        """Process audio files (MP3, WAV)"""
+        return self._process_media(stream, filename, 'audio')
 
-        except Exception as e:
-            logging.error(f"Error processing video file {filename}: {str(e)}")
-            return False
+    def process_video(self, stream, filename):
+        """Process video files (MP4)"""
+        return self._process_media(stream, filename, 'video')
+
+    def process_text(self, text, source, chunk_size=None, progress=None):
+        """Chunk and store raw text (e.g. direct input from the API); ``progress`` as in process_file"""
+        self._context.callback = progress
+        try:
+            return self._process_text_content(text, source, 'text', chunk_size)
         finally:
-            if temp_file and os.path.exists(temp_file):
-                os.remove(temp_file)
+            self._context.callback = None
 
-    def _process_text_content(self, text_content, filename, file_type):
+    def _process_text_content(self, text_content, filename, file_type, chunk_size=None):
         """Enhanced text processing with validation"""
         try:
             if not text_content or not text_content.strip():
                 raise ValueError("Empty text content after processing")
 
-            chunks = self.chunk_text(text_content)
+            self._report('chunking', characters=len(text_content))
+            chunks = self.chunk_text(text_content, chunk_size)
             if not chunks:
                 raise ValueError("No chunks created from content")
 
+            docs = []
             for chunk_id, chunk in enumerate(chunks, 1):
                 if not chunk.strip():
                     logging.warning(f"Empty chunk found in {filename} at position {chunk_id}")
                     continue
                     
-                doc = Document(
+                docs.append(Document(
                     page_content=chunk,
                     metadata={
                         'source': filename,
@@ -251,17 +279,61 @@ class Tools_readfile:
                         'type': file_type,
                         'total_chunks': len(chunks)
                     }
-                )
-                self.db.add_document(doc)
-                
+                ))
+
+            self._index_documents(docs, filename)
             logging.info(f"Successfully processed {len(chunks)} chunks from {filename}")
             return True
 
         except Exception as e:
+            self._report('failed', error=str(e))
             logging.error(f"Error in _process_text_content for {filename}: {str(e)}")
             logging.error(f"Traceback: {traceback.format_exc()}")
             return False
 
+    def _index_documents(self, docs, source):
+        """Embed documents in batches, adding one block at a time so progress can be reported
+
+        Chunks whose content is already stored are skipped without being encoded.
+        For a file upload, chunks of the file's previous version that are not in
+        the new one are removed afterwards. Dedup counts are reported as 'dedup'.
+        """
+        file_hash = getattr(self._context, 'file_hash', None)
+        if file_hash:
+            for doc in docs:
+                doc.metadata['file_hash'] = file_hash
+        added = 0
+        self._report('embedding', chunks_total=len(docs), chunks_done=0)
+        for start in range(0, len(docs), self.INDEX_BLOCK_SIZE):
+            block = docs[start:start + self.INDEX_BLOCK_SIZE]
+            added += len(self.db.add_documents(block, batch_size=self.EMBED_BATCH_SIZE, skip_existing=True))
+            self._report('embedding', chunks_total=len(docs), chunks_done=start + len(block))
+        removed = self.db.replace_source(source, file_hash, docs) if file_hash else 0
+        self._report('dedup', file_duplicate=False, duplicate_of=None, chunks_total=len(docs),
+                     chunks_added=added, chunks_skipped=len(docs) - added, chunks_removed=removed)
+        logging.info(f"{source}: {added} chunks added, {len(docs) - added} already stored, {removed} removed")
+
+    def find_duplicate_file(self, stream):
+        """Source under which a file with identical content is already stored, or None"""
+        return self.db.find_file(file_fingerprint(stream))
+
+    def duplicate_stats(self, duplicate_of):
+        """Dedup counts for an upload skipped as a copy of ``duplicate_of``"""
+        stored = self.db.count_source(duplicate_of)
+        return {'file_duplicate': True, 'duplicate_of': duplicate_of, 'chunks_total': stored,
+                'chunks_added': 0, 'chunks_skipped': stored, 'chunks_removed': 0}
+
+    def _skip_duplicate_file(self, stream, filename) -> bool:
+        """Fingerprint an upload; True (and 'dedup' reported) when identical content is already stored"""
+        file_hash = file_fingerprint(stream)
+        duplicate_of = self.db.find_file(file_hash)
+        if duplicate_of is None:
+            self._context.file_hash = file_hash
+            return False
+        logging.info(f"Skipping {filename}: same content as {duplicate_of} is already stored")
+        self._report('dedup', **self.duplicate_stats(duplicate_of))
+        return True
+
     def get_file_processor(self, file_extension: str):
         """Get appropriate file processor based on extension"""
         processors = {
@@ -282,26 +354,50 @@ class Tools_readfile:
         }
         return processors.get(file_extension.lower())
 
-    def process_file(self, file_content, filename, file_type):
-        """Process file with detailed error handling"""
+    def max_file_size(self, file_type):
+        """Size limit in bytes for a file type, or None when the type is not supported"""
+        if not self.get_file_processor(file_type):
+            return None
+        return self.MAX_FILE_SIZES.get(file_type.lower())
+
+    def process_file(self, file_content, filename, file_type, progress=None, chunk_size=None):
+        """Process file with detailed error handling
+
+        ``file_content`` is a binary file object (e.g. a spooled upload) or bytes.
+        Processors read from the stream directly instead of copying it.
+        ``progress(stage, **counts)`` is called as the file moves through the
+        parsing, chunking and embedding stages. ``chunk_size`` is the token
+        budget per chunk (None = CHUNK_MAX_TOKENS).
+        """
         processor = self.get_file_processor(file_type)
         if not processor:
             logging.error(f"No processor found for file type: {file_type}")
             return False
 
+        self._context.callback = progress
+        self._context.chunk_size = chunk_size
         try:
             logging.info(f"Starting to process {filename} of type {file_type}")
-            
+            stream = BytesIO(file_content) if isinstance(file_content, (bytes, bytearray)) else file_content
+            stream.seek(0, os.SEEK_END)
+            size = stream.tell()
+            stream.seek(0)
+
             # Validate file content
-            if not file_content:
+            if not size:
                 raise ValueError("Empty file content")
                 
             # Check file size
-            if len(file_content) > self.MAX_FILE_SIZES.get(file_type, 5 * 1024 * 1024):
+            if size > self.MAX_FILE_SIZES.get(file_type, 5 * 1024 * 1024):
                 raise ValueError(f"File too large for type {file_type}")
                 
+            # Identical content already stored: nothing to parse or embed
+            if self._skip_duplicate_file(stream, filename):
+                return True
+
             # Process the file
-            result = processor(file_content, filename)
+            self._report('parsing', bytes=size)
+            result = processor(stream, filename)
             
             if result:
                 logging.info(f"Successfully processed {filename}")
@@ -311,9 +407,62 @@ class Tools_readfile:
                 return False
 
         except Exception as e:
+            self._report('failed', error=str(e))
             logging.error(f"Error processing {filename}: {str(e)}")
             logging.error(f"Traceback: {traceback.format_exc()}")
             return False
+        finally:
+            self._context.callback = None
+            self._context.chunk_size = None
+            self._context.file_hash = None
+
+    # Metadata 'type' recorded for each extension (as the process_* methods do)
+    TYPE_LABELS = {'xlsx': 'excel', 'xls': 'excel', 'md': 'markdown', 'doc': 'docx'}
+
+    def import_files(self, paths):
+        """Import many files from disk, returning {path: success}
+
+        Parsing of every file is started in the process pool up front; each file
+        is chunked and embedded as soon as its text is ready, so embedding runs
+        while the remaining files are still being parsed. Formats not handled by
+        the pool (txt, json, email, media) go through process_file.
+        """
+        results = {}
+        futures = {}
+        inline = []
+        for path in paths:
+            file_type = os.path.splitext(path)[1].lstrip('.').lower()
+            if not pool_supports(file_type):
+                inline.append((path, file_type))
+            elif os.path.getsize(path) > self.MAX_FILE_SIZES.get(file_type, 5 * 1024 * 1024):
+                logging.error(f"File too large for type {file_type}: {path}")
+                results[path] = False
+            else:
+                futures[submit_extraction(path, file_type)] = (path, file_type)
+
+        for path, file_type in inline:
+            with open(path, 'rb') as f:
+                results[path] = self.process_file(f, os.path.basename(path), file_type)
+
+        for future in as_completed(futures):
+            path, file_type = futures[future]
+            try:
+                text = future.result()
+            except Exception as e:
+                logging.error(f"Error extracting {path}: {str(e)}")
+                results[path] = False
+                continue
+            try:
+                with open(path, 'rb') as f:
+                    if self._skip_duplicate_file(f, os.path.basename(path)):
+                        results[path] = True
+                        continue
+                results[path] = self._process_text_content(
+                    text, os.path.basename(path), self.TYPE_LABELS.get(file_type, file_type)
+                )
+            finally:
+                self._context.file_hash = None
+        return results
 
     def upload_to_vector(self, content, filename, content_type='text'):
         """Enhanced upload method with validation"""
@@ -6,6 +6,9 @@ import requests
 from pathlib import Path
 
 class FFmpegSetup:
+    # Set once ffmpeg has been found; a failed check is repeated on the next call
+    _available = False
+
     @staticmethod
     def download_ffmpeg():
         """Download and setup ffmpeg for Windows"""
@@ -43,14 +46,18 @@ class FFmpegSetup:
 
     @staticmethod
     def check_ffmpeg():
-        """Check if ffmpeg is installed and accessible"""
+        """Check if ffmpeg is installed and accessible (cached after the first success)"""
+        if FFmpegSetup._available:
+            return True
         try:
             subprocess.run(['ffmpeg', '-version'], capture_output=True)
+            FFmpegSetup._available = True
             return True
         except FileNotFoundError:
             try:
                 if sys.platform == 'win32':
-                    return FFmpegSetup.download_ffmpeg()
+                    FFmpegSetup._available = FFmpegSetup.download_ffmpeg()
+                    return FFmpegSetup._available
                 else:
                     logging.error("กรุณาติดตั้ง FFmpeg ด้วยคำสั่ง:")
                     if sys.platform == 'darwin':  # Mac
@@ -0,0 +1,125 @@
+import asyncio
+import os
+import tempfile
+from typing import Callable, Dict, Optional
+
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+# Uploads stay in memory up to this size, then roll over to a temp file on disk
+SPOOL_THRESHOLD = int(os.getenv('UPLOAD_SPOOL_THRESHOLD', 1024 * 1024))
+# Largest non-file form field (e.g. chunk_size) kept from the request
+MAX_FIELD_SIZE = 64 * 1024
+
+
+class UploadError(ValueError):
+    """Malformed multipart request or unsupported file type (HTTP 400)"""
+
+
+class UploadTooLargeError(UploadError):
+    """Upload exceeds the size limit for its file type (HTTP 413)"""
+
+
+class SpooledUpload:
+    """A file received from a multipart request, held in a SpooledTemporaryFile"""
+
+    def __init__(self, spool_threshold: int = SPOOL_THRESHOLD):
+        self.filename: Optional[str] = None
+        self.extension: Optional[str] = None
+        self.file = tempfile.SpooledTemporaryFile(max_size=spool_threshold)
+        self.size = 0
+        self.fields: Dict[str, str] = {}
+
+    def close(self):
+        self.file.close()
+
+
+async def receive_upload(request, max_size_for: Callable[[str], Optional[int]],
+                         field_name: str = 'file', spool_threshold: int = SPOOL_THRESHOLD) -> SpooledUpload:
+    """Stream a multipart/form-data body into a SpooledUpload
+
+    ``max_size_for(extension)`` returns the size limit for a file type, or None
+    when the type is not supported. The limit is checked as bytes arrive, so an
+    oversized upload is rejected without reading the rest of the body.
+    Parsing and writes to the spooled file run in a worker thread, so an
+    upload that has rolled over to disk does not block the event loop.
+    """
+    _, params = parse_options_header(request.headers.get('content-type', ''))
+    boundary = params.get(b'boundary')
+    if not boundary:
+        raise UploadError("Expected a multipart/form-data request")
+
+    upload = SpooledUpload(spool_threshold)
+    state = {'headers': {}, 'header_field': b'', 'header_value': b'', 'name': None, 'is_file': False, 'value': []}
+    limit = {'max_size': None}
+
+    def on_part_begin():
+        state.update(headers={}, header_field=b'', header_value=b'', name=None, is_file=False, value=[])
+
+    def on_header_field(data, start, end):
+        state['header_field'] += data[start:end]
+
+    def on_header_value(data, start, end):
+        state['header_value'] += data[start:end]
+
+    def on_header_end():
+        state['headers'][state['header_field'].lower()] = state['header_value']
+        state['header_field'] = b''
+        state['header_value'] = b''
+
+    def on_headers_finished():
+        _, options = parse_options_header(state['headers'].get(b'content-disposition', b''))
+        name = options.get(b'name', b'').decode('utf-8', 'replace')
+        state['name'] = name
+        if name != field_name or b'filename' not in options:
+            return
+        if upload.filename is not None:
+            raise UploadError("Only one file per upload is supported")
+        filename = os.path.basename(options[b'filename'].decode('utf-8', 'replace'))
+        extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+        max_size = max_size_for(extension)
+        if max_size is None:
+            raise UploadError("Unsupported file type")
+        upload.filename, upload.extension = filename, extension
+        limit['max_size'] = max_size
+        state['is_file'] = True
+
+    def on_part_data(data, start, end):
+        if state['is_file']:
+            upload.size += end - start
+            if upload.size > limit['max_size']:
+                raise UploadTooLargeError(f"File too large for type {upload.extension}")
+            upload.file.write(data[start:end])
+        else:
+            state['value'].append(data[start:end])
+            if sum(len(part) for part in state['value']) > MAX_FIELD_SIZE:
+                raise UploadError(f"Form field '{state['name']}' is too large")
+
+    def on_part_end():
+        if not state['is_file'] and state['name']:
+            upload.fields[state['name']] = b''.join(state['value']).decode('utf-8', 'replace')
+
+    parser = MultipartParser(boundary, {
+        'on_part_begin': on_part_begin,
+        'on_part_data': on_part_data,
+        'on_part_end': on_part_end,
+        'on_header_field': on_header_field,
+        'on_header_value': on_header_value,
+        'on_header_end': on_header_end,
+        'on_headers_finished': on_headers_finished,
+    })
+    try:
+        async for chunk in request.stream():
+            await asyncio.to_thread(parser.write, chunk)
+        await asyncio.to_thread(parser.finalize)
+        if upload.filename is None:
+            raise UploadError(f"Missing '{field_name}' file field")
+        if upload.size == 0:
+            raise UploadError("Empty file content")
+    except UploadError:
+        upload.close()
+        raise
+    except Exception as e:
+        upload.close()
+        raise UploadError(f"Invalid multipart data: {e}") from e
+    upload.file.seek(0)
+    return upload
@@ -1,8 +1,22 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from routes import chat_routes, vector_routes
+from Tools.Tools_executor import ExecutorBusyError, shutdown_executors
+from Tools.Tools_job_queue import get_job_queue, shutdown_job_queue
+from Tools.Tools_extract import shutdown_parse_pool
+from contextlib import asynccontextmanager
 import os
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Resume ingest jobs left unfinished by the previous run
+    get_job_queue()
+    yield
+    shutdown_job_queue()
+    shutdown_parse_pool()
+    shutdown_executors()
+
 def create_app() -> FastAPI:
     """Create and configure the FastAPI application"""
     app = FastAPI(
@@ -10,7 +24,8 @@ def create_app() -> FastAPI:
         description="AI Chat API with Vector DB support",
         version="1.0.0",
         docs_url="/docs",
-        redoc_url="/redoc"
+        redoc_url="/redoc",
+        lifespan=lifespan
     )
 
     # CORS configuration
@@ -25,6 +40,12 @@ def create_app() -> FastAPI:
     # Register routes
     app.include_router(chat_routes.router, prefix="/api/chat", tags=["Chat"])
     app.include_router(vector_routes.router, prefix="/api/vector", tags=["Vector DB"])
+    app.include_router(vector_routes.jobs_router, prefix="/api/vector")
+
+    # Blocking work runs on bounded thread pools (see Tools/Tools_executor.py)
+    @app.exception_handler(ExecutorBusyError)
+    async def executor_busy_handler(request: Request, exc: ExecutorBusyError):
+        return JSONResponse(status_code=503, content={"detail": str(exc)})
 
     return app
 
@@ -48,7 +69,8 @@ if __name__ == "__main__":
         "host": "0.0.0.0",
         "port": port,
         "reload": debug,
-        "workers": 1 if debug else None,  # Auto workers in production
+        # Workers share one vector store on disk (see Model/Model_Vector_DB.py); reload needs a single process
+        "workers": 1 if debug else int(os.environ.get("WORKERS", 1)),
         "access_log": True,
         "log_level": "debug" if debug else "info"
     }
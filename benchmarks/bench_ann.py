@@ -0,0 +1,78 @@
+"""Benchmark: recall@k vs. QPS of the ANN index modes against the flat baseline
+
+Uses synthetic clustered vectors, so no embedding model is needed.
+
+Usage:
+    python benchmarks/bench_ann.py --n 200000 --queries 1000 --k 10
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Model.Model_Index_Factory import IndexFactory
+
+
+def make_vectors(n, dimension, clusters, rng):
+    centers = rng.standard_normal((clusters, dimension)).astype('float32') * 4
+    labels = rng.integers(0, clusters, n)
+    return centers[labels] + rng.standard_normal((n, dimension)).astype('float32')
+
+
+def timed_search(factory, index, kind, queries, k, **params):
+    search_params = factory.search_params(kind, **params)
+    start = time.perf_counter()
+    _, I = index.search(queries, k, params=search_params)
+    return I, time.perf_counter() - start
+
+
+def recall(found, truth):
+    k = truth.shape[1]
+    return np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--n', type=int, default=200_000)
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--dimension', type=int, default=768)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    data = make_vectors(args.n, args.dimension, max(10, args.n // 1000), rng)
+    queries = data[rng.choice(args.n, args.queries, replace=False)] + \
+        rng.standard_normal((args.queries, args.dimension)).astype('float32') * 0.5
+    row_ids = np.arange(args.n, dtype='int64')
+
+    configs = [
+        ('flat', {}),
+        ('hnsw', {'ef_search': 16}), ('hnsw', {'ef_search': 64}), ('hnsw', {'ef_search': 256}),
+        ('ivf', {'nprobe': 1}), ('ivf', {'nprobe': 8}), ('ivf', {'nprobe': 32}),
+        ('ivfpq', {'nprobe': 8}), ('ivfpq', {'nprobe': 32}),
+    ]
+
+    truth = None
+    built = {}
+    print(f"{'index':<8} {'params':<16} {'build s':>8} {'QPS':>10} {'recall@' + str(args.k):>10}")
+    for kind, params in configs:
+        factory = IndexFactory(args.dimension, kind)
+        if kind not in built:
+            start = time.perf_counter()
+            index, actual = factory.build(data, row_ids)
+            built[kind] = (index, actual, time.perf_counter() - start)
+        index, actual, build_time = built[kind]
+        found, elapsed = timed_search(factory, index, actual, queries, args.k, **params)
+        if truth is None:
+            truth = found
+        label = ','.join(f"{key}={value}" for key, value in params.items()) or '-'
+        print(f"{actual:<8} {label:<16} {build_time:>8.1f} {args.queries / elapsed:>10.0f} "
+              f"{recall(found, truth):>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
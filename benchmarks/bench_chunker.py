@@ -0,0 +1,68 @@
+"""Benchmark: chunking throughput and chunk sizes on multi-MB Thai/English text
+
+Compares the old whitespace split (fixed number of "words" per chunk) with
+TextChunker. Reports MB/s, number of chunks and the largest chunk in tokens,
+which shows how far whitespace chunks overrun the embedder's window on Thai.
+
+Usage:
+    python benchmarks/bench_chunker.py --mb 4 --max-tokens 256 --overlap 32
+    python benchmarks/bench_chunker.py --mb 4 --tokenizer nomic-ai/nomic-embed-text-v1
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Tools.Tools_chunker import TextChunker, estimate_token_counts
+
+THAI = ("โรคใบจุดในพืชเกิดจากเชื้อราที่แพร่กระจายได้ดีในสภาพอากาศชื้น "
+        "การป้องกันทำได้โดยการตัดแต่งกิ่งให้โปร่งและเก็บใบที่เป็นโรคไปทำลาย\n"
+        "ต้นกล้วยต้องการน้ำสม่ำเสมอและแสงแดดเต็มวันเพื่อให้ผลผลิตดี\n")
+PDF_THAI = "ปุ๋ยอินทรีย์ช่วยปรับปรุงโครงสร้างดินและเพิ่มจุลินทรีย์ที่เป็นประโยชน์ต่อรากพืช" * 8 + "\n"
+ENGLISH = ("Leaf spot disease is caused by fungi that spread in humid weather. "
+           "Prune branches to improve airflow and remove infected leaves.\n")
+
+
+def make_text(mb):
+    block = THAI + PDF_THAI + ENGLISH
+    return block * max(1, int(mb * 1024 * 1024 / len(block.encode('utf-8'))))
+
+
+def whitespace_chunks(text, chunk_size=250):
+    words = text.split()
+    return [' '.join(words[i:i + chunk_size]) for i in range(0, len(words), chunk_size)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--mb', type=float, default=4)
+    parser.add_argument('--max-tokens', type=int, default=256)
+    parser.add_argument('--overlap', type=int, default=32)
+    parser.add_argument('--tokenizer', help='Hugging Face tokenizer name (needs transformers); '
+                                            'default is the ~4 chars/token estimate')
+    args = parser.parse_args()
+
+    tokenizer = None
+    if args.tokenizer:
+        from transformers import AutoTokenizer
+        tokenizer = AutoTokenizer.from_pretrained(args.tokenizer)
+    chunker = TextChunker(tokenizer, max_tokens=args.max_tokens, overlap=args.overlap)
+
+    text = make_text(args.mb)
+    size_mb = len(text.encode('utf-8')) / (1024 * 1024)
+    print(f"input: {size_mb:.1f} MB, {len(text):,} characters")
+
+    for label, split in (("whitespace (before)", whitespace_chunks),
+                         ("TextChunker (after)", chunker.split)):
+        start = time.perf_counter()
+        chunks = split(text)
+        elapsed = time.perf_counter() - start
+        tokens = chunker.count_tokens(chunks) if tokenizer else estimate_token_counts(chunks)
+        print(f"{label:<20} {elapsed:7.2f}s {size_mb / elapsed:7.2f} MB/s  chunks={len(chunks):<7} "
+              f"max_tokens={max(tokens):<7} mean_tokens={sum(tokens) / len(tokens):.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""Benchmark: memory per chunk and id lookup time of the in-memory document store
+
+Writes --n chunks to a VectorStore log, with the metadata that file ingest
+produces, then rebuilds the documents from the log the way load_db does.
+It compares two layouts:
+  - list: the previous layout. Parallel lists of ids, Document dataclasses
+    (one metadata dict each) and row ids, plus a duplicated texts list and a
+    row -> position dict. Lookups by id use list.index.
+  - store: Model.Model_Document_Store.DocumentStore. Columns are indexed by
+    FAISS row, metadata is packed with shared keys and values, and a dict
+    maps doc id -> row.
+Python heap is measured with tracemalloc, both with and without the chunk
+text itself. Finally the process RSS growth of loading a full VectorDB
+(flat index, lexical index off) is reported per chunk.
+
+Usage:
+    python benchmarks/bench_doc_memory.py --n 200000 --text-chars 600
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+from dataclasses import dataclass
+from typing import Any, Dict
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Model.Model_Document_Store import DocumentStore
+from Model.Model_Vector_DB import VectorDB, content_hash
+from Model.Model_Vector_Store import VectorStore, add_entry
+from Tools.Tools_document import Document
+
+WORDS = ["โรค", "ใบไหม้", "ข้าว", "ปุ๋ย", "ทุเรียน", "มะม่วง", "แมลง", "ดิน", "น้ำ", "เชื้อรา", "ฉีดพ่น", "ราก"]
+
+
+@dataclass
+class ListDocument:
+    """Document as it was stored before: a dataclass with an instance dict"""
+    page_content: str
+    metadata: Dict[str, Any]
+
+
+class SyntheticEncoder:
+    """Stands in for the embedding model; the benchmark never encodes"""
+
+    def encode(self, texts, batch_size=32):
+        raise RuntimeError("the benchmark loads precomputed vectors")
+
+
+def write_store(path, n, text_chars, rng):
+    store = VectorStore(path, 768)
+    store.create()
+    chunk = 0
+    for start in range(0, n, 20_000):
+        count = min(20_000, n - start)
+        entries = []
+        for row in range(start, start + count):
+            # Files of 20-200 chunks, like ingest produces
+            if chunk == 0:
+                total, source, file_hash = rng.randint(20, 200), f"file-{row}.pdf", uuid.uuid4().hex * 2
+            chunk += 1
+            text = " ".join(rng.choice(WORDS) for _ in range(text_chars // 5))[:text_chars] + f" {row}"
+            entries.append(add_entry(row, str(uuid.uuid4()), Document(text, {
+                'source': source, 'chunk_id': chunk, 'type': 'pdf', 'total_chunks': total,
+                'file_hash': file_hash, 'content_hash': content_hash(text)
+            })))
+            if chunk == total:
+                chunk = 0
+        store.append(np.zeros((count, 768), dtype='float32'), entries)
+    return store
+
+
+def build_list(store):
+    live = {}
+    for entry in store.load():
+        live[entry['id']] = (entry['row'], ListDocument(entry['content'], entry['metadata']))
+    ids, documents, row_ids = [], [], []
+    for doc_id, (row, doc) in live.items():
+        ids.append(doc_id)
+        row_ids.append(row)
+        documents.append(doc)
+    texts = [doc.page_content for doc in documents]
+    row_positions = {row: pos for pos, row in enumerate(row_ids)}
+    return ids, documents, row_ids, texts, row_positions
+
+
+def build_store(store):
+    documents = DocumentStore()
+    for entry in store.load():
+        documents.put(entry['row'], entry['id'], Document(entry['content'], entry['metadata']))
+    return documents
+
+
+def heap(build, store):
+    gc.collect()
+    tracemalloc.start()
+    result = build(store)
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+
+def rss_mb():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--n', type=int, default=200_000)
+    parser.add_argument('--text-chars', type=int, default=600)
+    parser.add_argument('--lookups', type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = write_store(os.path.join(tmp, 'store'), args.n, args.text_chars, rng)
+        text_bytes = sum(sys.getsizeof(entry['content']) for entry in store.load())
+
+        listed, list_size = heap(build_list, store)
+        ids = listed[0]
+        probes = [ids[rng.randrange(len(ids))] for _ in range(args.lookups)]
+        start = time.perf_counter()
+        for doc_id in probes:
+            ids.index(doc_id)
+        list_lookup = (time.perf_counter() - start) / len(probes) * 1e6
+        del listed, ids
+
+        documents, store_size = heap(build_store, store)
+        start = time.perf_counter()
+        for doc_id in probes:
+            documents.row_of(doc_id)
+        store_lookup = (time.perf_counter() - start) / len(probes) * 1e6
+        del documents
+
+        print(f"{args.n} chunks, ~{args.text_chars} chars each ({text_bytes / args.n:.0f} B of text per chunk)")
+        print(f"{'layout':>6} | {'B/chunk':>8} | {'B/chunk w/o text':>16} | {'id lookup us':>12}")
+        for name, size, lookup in (('list', list_size, list_lookup), ('store', store_size, store_lookup)):
+            print(f"{name:>6} | {size / args.n:>8.0f} | {(size - text_bytes) / args.n:>16.0f} | {lookup:>12.2f}")
+
+        gc.collect()
+        before = rss_mb()
+        db = VectorDB(db_path=store.path, legacy_db_file=None, encoder=SyntheticEncoder(), index_type='flat',
+                      embedding_cache_path=None, lexical_index=False)
+        gc.collect()
+        grown = rss_mb() - before
+        vectors_mb = args.n * 768 * 4 / 2**20
+        print(f"VectorDB load: RSS +{grown:.0f} MB ({grown * 2**20 / args.n:.0f} B/chunk; "
+              f"{vectors_mb:.0f} MB of that is the flat index's vectors)")
+        del db
+
+
+if __name__ == "__main__":
+    main()
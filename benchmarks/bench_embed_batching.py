@@ -0,0 +1,132 @@
+"""Benchmark: query embedding throughput and latency with and without micro-batching
+
+Client threads call encoder.encode([query]) in a loop, the way concurrent
+searches and chats do. Each client count (--clients, default 1, 8, 32 and
+128) is run once against the model directly and once per --max-wait value
+through Model.Model_Embedding_Batcher.EmbeddingBatcher (max batch
+--max-batch). Reported per run: queries per second, p50 and p99 latency of
+one encode call, and the mean batch size the model saw.
+
+By default the real SentenceTransformer (--model) is loaded. --synthetic
+uses a small numpy transformer instead (token embeddings, then attention
+and feed-forward layers over the padded batch). It does real matrix work
+whose cost grows with batch size, for machines without the model or torch.
+
+Usage:
+    python benchmarks/bench_embed_batching.py --clients 1,8,32,128 --seconds 10
+    python benchmarks/bench_embed_batching.py --synthetic --max-wait 0,2,5
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+import zlib
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Model.Model_Embedding_Batcher import EmbeddingBatcher
+
+WORDS = ["โรค", "ใบไหม้", "ข้าว", "ปุ๋ย", "ทุเรียน", "มะม่วง", "แมลง", "ดิน", "น้ำ", "เชื้อรา", "ฉีดพ่น", "ราก",
+         "how", "to", "treat", "leaf", "blight", "in", "rice", "fields"]
+
+
+class SyntheticTransformer:
+    """Two-layer transformer encoder in numpy with mean pooling (hidden 768, feed-forward 3072)"""
+
+    def __init__(self, dimension=768, layers=2, vocab=8192, seed=0):
+        rng = np.random.default_rng(seed)
+        scale = dimension ** -0.5
+        self.dimension = dimension
+        self.vocab = vocab
+        self.embeddings = rng.standard_normal((vocab, dimension), dtype='float32') * scale
+        self.layers = [{
+            'qkv': rng.standard_normal((dimension, 3 * dimension), dtype='float32') * scale,
+            'out': rng.standard_normal((dimension, dimension), dtype='float32') * scale,
+            'up': rng.standard_normal((dimension, 4 * dimension), dtype='float32') * scale,
+            'down': rng.standard_normal((4 * dimension, dimension), dtype='float32') * (scale / 2),
+        } for _ in range(layers)]
+
+    def _tokens(self, text):
+        return [zlib.crc32(word.encode('utf-8')) % self.vocab for word in text.split()][:64] or [0]
+
+    def encode(self, texts, batch_size=32):
+        tokens = [self._tokens(text) for text in texts]
+        length = max(len(ids) for ids in tokens)
+        ids = np.zeros((len(texts), length), dtype='int64')
+        mask = np.zeros((len(texts), length), dtype='float32')
+        for i, row in enumerate(tokens):
+            ids[i, :len(row)] = row
+            mask[i, :len(row)] = 1
+        x = self.embeddings[ids]
+        for layer in self.layers:
+            q, k, v = np.split(x @ layer['qkv'], 3, axis=-1)
+            scores = q @ k.transpose(0, 2, 1) / np.sqrt(self.dimension) + (mask[:, None, :] - 1) * 1e4
+            scores = np.exp(scores - scores.max(-1, keepdims=True))
+            x = x + (scores / scores.sum(-1, keepdims=True)) @ v @ layer['out']
+            x = x + np.maximum(x @ layer['up'], 0) @ layer['down']
+        pooled = (x * mask[..., None]).sum(1) / mask.sum(1, keepdims=True)
+        return pooled / np.linalg.norm(pooled, axis=1, keepdims=True)
+
+
+def run(encoder, clients, seconds):
+    stop = threading.Event()
+    calls = [[] for _ in range(clients)]
+
+    def client(number):
+        rng = random.Random(number)
+        while not stop.is_set():
+            query = " ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 16)))
+            start = time.perf_counter()
+            encoder.encode([query])
+            calls[number].append((start, time.perf_counter()))
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    begin = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    end = time.perf_counter()  # the sleep can overrun while many threads hold the GIL
+    stop.set()
+    for thread in threads:
+        thread.join()
+    latencies = np.array([finish - start for values in calls for start, finish in values if finish <= end]) * 1000
+    return len(latencies) / (end - begin), np.percentile(latencies, 50), np.percentile(latencies, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', default='1,8,32,128', help='comma separated concurrent client counts')
+    parser.add_argument('--max-wait', default='0,2', help='comma separated EMBED_MAX_WAIT_MS values')
+    parser.add_argument('--max-batch', type=int, default=32)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--model', default='nomic-ai/nomic-embed-text-v1')
+    parser.add_argument('--synthetic', action='store_true', help='numpy transformer instead of the real model')
+    args = parser.parse_args()
+
+    if args.synthetic:
+        model = SyntheticTransformer()
+    else:
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer(args.model, trust_remote_code=True)
+    model.encode(["warm up"])
+
+    print(f"{'synthetic transformer' if args.synthetic else args.model}, {os.cpu_count()} CPUs, "
+          f"max batch {args.max_batch}, {args.seconds:.0f}s per run")
+    print(f"{'clients':>7} | {'encoder':>14} | {'QPS':>7} | {'p50 ms':>7} | {'p99 ms':>8} | mean batch")
+    for clients in (int(count) for count in args.clients.split(',')):
+        qps, p50, p99 = run(model, clients, args.seconds)
+        print(f"{clients:>7} | {'direct':>14} | {qps:>7.1f} | {p50:>7.1f} | {p99:>8.1f} | 1.0")
+        for max_wait in (float(value) for value in args.max_wait.split(',')):
+            batcher = EmbeddingBatcher(model, max_batch=args.max_batch, max_wait_ms=max_wait)
+            qps, p50, p99 = run(batcher, clients, args.seconds)
+            label = f"batch {max_wait:g} ms"
+            print(f"{clients:>7} | {label:>14} | {qps:>7.1f} | {p50:>7.1f} | {p99:>8.1f} | "
+                  f"{batcher.stats()['mean_batch']:.1f}")
+
+
+if __name__ == "__main__":
+    main()
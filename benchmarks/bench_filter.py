@@ -0,0 +1,98 @@
+"""Benchmark: metadata-filtered search, post-filtering vs pre-filtering
+
+Fills a VectorDB with synthetic clustered vectors whose 'source' metadata
+splits the corpus into groups of several selectivities, then runs the same
+queries with a source filter two ways: (1) over-fetch k * --overfetch hits
+and filter in Python, as callers had to before, and (2) the filter inside
+search_vector (subset scan or IDSelector). Reports latency and how often a
+query came back with fewer than k results. No embedding model is needed.
+
+Usage:
+    python benchmarks/bench_filter.py --n 200000 --queries 200 --k 10 --index auto
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Model.Model_Vector_DB import VectorDB
+from Tools.Tools_document import Document
+
+SELECTIVITIES = (0.5, 0.1, 0.01, 0.001)
+
+
+class SyntheticEncoder:
+    """Stands in for the embedding model; vectors are added directly"""
+
+    def encode(self, texts, batch_size=32):
+        raise RuntimeError("the benchmark adds precomputed vectors")
+
+
+def source_for(i, n):
+    # Rows [0, s * n) of a shuffled order belong to group 's'; the rest to 'other'
+    for selectivity in sorted(SELECTIVITIES):
+        if i < selectivity * n:
+            return f"group-{selectivity}"
+    return "other"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--n', type=int, default=200_000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--overfetch', type=int, default=10, help='post-filter fetches k * overfetch hits')
+    parser.add_argument('--index', default='auto', help='flat / hnsw / ivf / ivfpq / auto')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    dimension = 768
+    centers = rng.standard_normal((max(10, args.n // 1000), dimension)).astype('float32') * 4
+    vectors = centers[rng.integers(0, len(centers), args.n)] + rng.standard_normal((args.n, dimension)).astype('float32')
+    order = rng.permutation(args.n)
+    documents = [Document(page_content=f"chunk {i}", metadata={'source': source_for(int(order[i]), args.n)})
+                 for i in range(args.n)]
+    queries = vectors[rng.choice(args.n, args.queries, replace=False)] + 0.5 * rng.standard_normal(
+        (args.queries, dimension)).astype('float32')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = VectorDB(db_path=os.path.join(tmp, 'store'), legacy_db_file=None, encoder=SyntheticEncoder(),
+                      index_type=args.index, embedding_cache_path=None)
+        for start in range(0, args.n, 50_000):
+            with db._lock:
+                db._append_documents(documents[start:start + 50_000], vectors[start:start + 50_000],
+                                     [f"doc-{i}" for i in range(start, min(start + 50_000, args.n))])
+                db._publish()
+        segments = ", ".join(f"{segment.kind} x {len(segment)}" for segment in db.snapshot.segments)
+        print(f"{args.n} vectors, index segments [{segments}], k={args.k}, filter scan limit {db.filter_scan_limit}")
+        print(f"{'selectivity':>11} {'matches':>8} | {'post-filter ms':>14} {'short':>6} | {'pre-filter ms':>13} {'short':>6}")
+
+        for selectivity in SELECTIVITIES:
+            source = f"group-{selectivity}"
+            filter = {'source': source}
+            matches = len(db.metadata_index.match(filter))
+
+            start = time.perf_counter()
+            short_post = 0
+            for query in queries:
+                hits = [hit for hit in db.search_vector(query, args.k * args.overfetch)
+                        if hit['metadata']['source'] == source][:args.k]
+                short_post += len(hits) < min(args.k, matches)
+            post = (time.perf_counter() - start) / args.queries * 1000
+
+            start = time.perf_counter()
+            short_pre = 0
+            for query in queries:
+                short_pre += len(db.search_vector(query, args.k, filter=filter)) < min(args.k, matches)
+            pre = (time.perf_counter() - start) / args.queries * 1000
+
+            print(f"{selectivity:>11} {matches:>8} | {post:>14.2f} {short_post:>6} | {pre:>13.2f} {short_pre:>6}")
+
+
+if __name__ == "__main__":
+    main()
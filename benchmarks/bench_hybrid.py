@@ -0,0 +1,169 @@
+"""Benchmark: lexical (BM25) and hybrid search versus dense-only search
+
+Part 1 measures BM25 query latency over a large synthetic corpus. The
+tokenized corpus is written in the lexical index's on-disk format and loaded
+the way VectorDB does at startup, so the load time is reported too. Terms
+follow a Zipf distribution. Queries made only of stopword-like terms are the
+worst case: every posting of those terms is scored.
+
+Part 2 measures recall@k and latency of dense, lexical and hybrid search
+through VectorDB.search_for_rag. Each chunk is a Thai sentence about a crop
+topic that also carries a product code (e.g. "NPK-04211"). Each query asks
+for one chunk by topic and code, and a hit is that chunk in the top k. The
+default encoder is a hashed bag-of-words that weights codes and numbers
+lightly, which imitates how embedding models blur rare identifiers. Pass
+--model to use the real embedding model instead. Lexical-only search wins
+these exact lookups, but it misses paraphrased questions that dense search
+answers; hybrid keeps both.
+
+Usage:
+    python benchmarks/bench_hybrid.py --n 1000000 --docs 5000 --queries 200 --k 5
+    python benchmarks/bench_hybrid.py --model nomic-ai/nomic-embed-text-v1 --docs 2000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import zlib
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Model.Model_Lexical_Index import (BM25Index, DOC_DTYPE, DOCS_FILE, TERMS_FILE, TFS_FILE, VOCAB_FILE,
+                                       tokenize)
+from Model.Model_Vector_DB import VectorDB
+from Tools.Tools_document import Document
+
+TOPICS = [
+    "การใส่ปุ๋ยนาข้าว", "โรคใบไหม้ในข้าว", "การปลูกมะม่วงน้ำดอกไม้", "การให้น้ำทุเรียน",
+    "แมลงศัตรูพืชในสวนส้ม", "การเก็บเกี่ยวอ้อย", "การปรับปรุงดินเปรี้ยว", "การปลูกผักไฮโดรโปนิกส์",
+]
+DETAILS = ["ควรใช้ในช่วงต้นฤดูฝน", "เหมาะกับดินร่วนปนทราย", "ใช้ได้กับพื้นที่ภาคอีสาน", "ควรปรึกษาเจ้าหน้าที่เกษตร"]
+
+
+class SyntheticEncoder:
+    """Hashed bag-of-words embedding; tokens containing digits get a small weight"""
+
+    def __init__(self, dimension=768, code_weight=0.3):
+        self.dimension = dimension
+        self.code_weight = code_weight
+        self.vectors = {}
+
+    def _vector(self, token):
+        vector = self.vectors.get(token)
+        if vector is None:
+            rng = np.random.default_rng(zlib.crc32(token.encode('utf-8')))
+            vector = self.vectors[token] = rng.standard_normal(self.dimension).astype('float32')
+        return vector
+
+    def encode(self, texts, batch_size=32):
+        out = np.zeros((len(texts), self.dimension), dtype='float32')
+        for i, text in enumerate(texts):
+            for token in tokenize(text):
+                out[i] += self._vector(token) * (self.code_weight if any(c.isdigit() for c in token) else 1.0)
+            out[i] /= max(np.linalg.norm(out[i]), 1e-6)
+        return out
+
+
+def write_synthetic_corpus(path, n, vocab_size, rng):
+    """Write n tokenized documents in the lexical index's file format; returns total postings"""
+    os.makedirs(path, exist_ok=True)
+    draws = rng.integers(20, 120, n)
+    doc_of = np.repeat(np.arange(n, dtype='int64'), draws)
+    # Zipf-distributed term ids, each kept once per document with a term frequency
+    pairs, tfs = np.unique(doc_of * vocab_size + (rng.zipf(1.1, len(doc_of)) - 1) % vocab_size, return_counts=True)
+    terms = (pairs % vocab_size).astype('uint32')
+    docs = np.zeros(n, dtype=DOC_DTYPE)
+    docs['row'] = np.arange(n)
+    docs['count'] = np.bincount(pairs // vocab_size, minlength=n)
+    docs['length'] = draws
+    with open(os.path.join(path, VOCAB_FILE), 'w', encoding='utf-8') as f:
+        f.write(''.join(f"t{i}\n" for i in range(vocab_size)))
+    terms.tofile(os.path.join(path, TERMS_FILE))
+    np.minimum(tfs, 65535).astype('uint16').tofile(os.path.join(path, TFS_FILE))
+    docs.tofile(os.path.join(path, DOCS_FILE))
+    return len(pairs)
+
+
+def bench_lexical_scale(args, rng):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'lexical')
+        postings = write_synthetic_corpus(path, args.n, args.vocab, rng)
+        index = BM25Index(path)
+        start = time.perf_counter()
+        index.load(list(range(args.n)), lambda row: "", args.n)
+        load = time.perf_counter() - start
+        print(f"BM25 over {args.n} docs, {postings} postings, vocab {args.vocab}: load {load:.2f}s")
+
+        # Keyword queries of 2-4 terms; "mixed" pairs stopword-like terms with rarer ones, as real queries do
+        def terms(low, high, count):
+            return [f"t{t}" for t in rng.integers(low, high, count)]
+
+        bands = {
+            'common only': lambda: terms(0, 20, rng.integers(2, 5)),
+            'mixed': lambda: terms(0, 20, rng.integers(1, 3)) + terms(20, args.vocab, rng.integers(1, 3)),
+            'mid terms': lambda: terms(20, 5000, rng.integers(2, 5)),
+            'rare terms': lambda: terms(5000, args.vocab, rng.integers(2, 5)),
+        }
+        for label, make in bands.items():
+            queries = [" ".join(make()) for _ in range(args.queries)]
+            start = time.perf_counter()
+            for query in queries:
+                index.search(query, args.k)
+            ms = (time.perf_counter() - start) / len(queries) * 1000
+            print(f"  {label:>12}: {ms:.2f} ms/query")
+
+
+def make_chunks(count, rng):
+    chunks, codes = [], []
+    for i in range(count):
+        code = f"{rng.choice(['NPK', 'SKU', 'LOT'])}-{i:05d}"
+        topic = TOPICS[i % len(TOPICS)]
+        chunks.append(f"{topic} {rng.choice(DETAILS)} รหัสสินค้า {code} ราคา {rng.integers(100, 2000)} บาท")
+        codes.append((topic, code))
+    return chunks, codes
+
+
+def bench_recall(args, rng):
+    chunks, codes = make_chunks(args.docs, rng)
+    targets = rng.choice(args.docs, args.queries, replace=False)
+    queries = [f"{codes[i][0]} รหัส {codes[i][1]}" for i in targets]
+    encoder = None if args.model else SyntheticEncoder(code_weight=args.code_weight)
+    with tempfile.TemporaryDirectory() as tmp:
+        db = VectorDB(model_name=args.model or 'nomic-ai/nomic-embed-text-v1', db_path=os.path.join(tmp, 'store'),
+                      legacy_db_file=None, encoder=encoder, embedding_cache_path=None)
+        ids = db.add_documents([Document(page_content=chunk, metadata={}) for chunk in chunks])
+        print(f"\n{args.docs} chunks, {args.queries} code lookups, recall@{args.k}")
+        print(f"{'mode':>8} | {'recall':>6} | {'ms/query':>8}")
+        for mode in ('dense', 'lexical', 'hybrid'):
+            db.embedding_cache.clear()  # every mode pays for encoding its queries
+            hits = 0
+            start = time.perf_counter()
+            for query, target in zip(queries, targets):
+                results = db.search_for_rag(query, args.k, mode=mode)
+                hits += any(result['id'] == ids[target] for result in results)
+            ms = (time.perf_counter() - start) / len(queries) * 1000
+            print(f"{mode:>8} | {hits / len(queries):>6.3f} | {ms:>8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--n', type=int, default=1_000_000, help='documents in the BM25 latency test')
+    parser.add_argument('--vocab', type=int, default=200_000)
+    parser.add_argument('--docs', type=int, default=5000, help='chunks in the recall test')
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--code-weight', type=float, default=0.3,
+                        help='weight of tokens with digits in the synthetic encoder (lower = blurrier codes)')
+    parser.add_argument('--model', default=None, help='embedding model for the recall test (default: synthetic)')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    bench_lexical_scale(args, rng)
+    bench_recall(args, rng)
+
+
+if __name__ == "__main__":
+    main()
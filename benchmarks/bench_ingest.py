@@ -0,0 +1,56 @@
+"""Benchmark: chunk ingestion throughput of VectorDB
+
+Compares the per-chunk path (one encode + one save per chunk, as the upload
+pipeline used to do) with the batched ``add_documents`` path.
+
+Usage:
+    python benchmarks/bench_ingest.py --chunks 200 --batch-size 32
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Model.Model_Vector_DB import VectorDB
+from Tools.Tools_document import Document
+
+
+def make_documents(n):
+    base = "โรคใบจุดในพืชเกิดจากเชื้อรา leaf spot disease caused by fungi spreads in humid weather"
+    return [
+        Document(page_content=f"{base} #{i} " * 10, metadata={'source': 'bench', 'chunk_id': i})
+        for i in range(n)
+    ]
+
+
+def run(db, docs, batched, batch_size):
+    start = time.perf_counter()
+    if batched:
+        db.add_documents(docs, batch_size=batch_size)
+    else:
+        for doc in docs:
+            db.add_document(doc)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--chunks', type=int, default=200)
+    parser.add_argument('--batch-size', type=int, default=32)
+    args = parser.parse_args()
+
+    docs = make_documents(args.chunks)
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, batched in (("per-chunk (before)", False), ("batched (after)", True)):
+            db = VectorDB(db_path=os.path.join(tmp, "batched" if batched else "single"), legacy_db_file=None,
+                          embedding_cache_path=None)
+            elapsed = run(db, docs, batched, args.batch_size)
+            print(f"{label:<20} {args.chunks} chunks in {elapsed:.2f}s "
+                  f"-> {args.chunks / elapsed:.1f} chunks/s")
+
+
+if __name__ == "__main__":
+    main()
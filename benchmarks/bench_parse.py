@@ -0,0 +1,152 @@
+"""Benchmark: parsing throughput on a mixed-format corpus, inline vs process pool
+
+Generates a corpus of PDF, DOCX, XLSX, CSV, HTML and Markdown files, then
+extracts their text (1) inline one file after another, as the upload path
+used to, and (2) through the parsing process pool with per-page PDF tasks.
+Reports files/second and files/second per core. With --embed the pool run
+goes through Tools_readfile.import_files, so chunking and embedding overlap
+with parsing.
+
+Usage:
+    python benchmarks/bench_parse.py --files 60 --pdf-pages 40 --workers 4
+    python benchmarks/bench_parse.py --files 60 --workers 4 --embed
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import docx
+import pandas as pd
+
+LINE = "Leaf spot disease is caused by fungi that spread in humid weather. Remove infected leaves."
+
+
+def make_pdf(path, pages):
+    """Minimal multi-page PDF with one line of Helvetica text per row"""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for page in range(pages):
+        lines = " ".join(f"1 0 0 1 40 {780 - row * 14} Tm ({LINE} p{page} r{row}) Tj" for row in range(50))
+        stream = f"BT /F1 10 Tf {lines} ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        content_id = len(objects)
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {pages} >>"
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode('latin-1')
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode('latin-1')
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode('latin-1')
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode('latin-1')
+    with open(path, 'wb') as f:
+        f.write(out)
+
+
+def make_corpus(directory, files, pdf_pages):
+    rows = pd.DataFrame({'plant': [f"plant {i}" for i in range(2000)], 'note': [LINE] * 2000})
+    makers = {
+        'pdf': lambda path: make_pdf(path, pdf_pages),
+        'docx': lambda path: _make_docx(path),
+        'xlsx': lambda path: rows.to_excel(path, index=False),
+        'csv': lambda path: rows.to_csv(path, index=False),
+        'html': lambda path: _write(path, "<html><body>" + "".join(f"<p>{LINE} {i}</p>" for i in range(3000)) + "</body></html>"),
+        'md': lambda path: _write(path, "\n\n".join(f"## Section {i}\n\n{LINE} *{i}*" for i in range(3000))),
+    }
+    kinds = list(makers)
+    paths = []
+    for i in range(files):
+        kind = kinds[i % len(kinds)]
+        path = os.path.join(directory, f"file{i}.{kind}")
+        makers[kind](path)
+        paths.append(path)
+    return paths
+
+
+def _make_docx(path):
+    document = docx.Document()
+    for i in range(1500):
+        document.add_paragraph(f"{LINE} {i}")
+    document.save(path)
+
+
+def _write(path, text):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+
+def run_inline(paths):
+    from Tools import Tools_extract
+    for path in paths:
+        file_type = os.path.splitext(path)[1].lstrip('.')
+        if file_type == 'pdf':
+            Tools_extract.extract_pdf_pages(path, 0, Tools_extract.pdf_page_count(path))
+        else:
+            Tools_extract.EXTRACTORS[file_type](path)
+
+
+def run_pool(paths):
+    from concurrent.futures import as_completed
+    from Tools.Tools_extract import submit_extraction
+    futures = [submit_extraction(path, os.path.splitext(path)[1].lstrip('.')) for path in paths]
+    for future in as_completed(futures):
+        future.result()
+
+
+def run_import(paths, tmp):
+    from Model.Model_Vector_DB import VectorDB
+    from Tools.Tools_readfile import Tools_readfile
+    tools = Tools_readfile(VectorDB(db_path=os.path.join(tmp, 'store'), legacy_db_file=None,
+                                    embedding_cache_path=None))
+    results = tools.import_files(paths)
+    failed = [path for path, ok in results.items() if not ok]
+    if failed:
+        print(f"  {len(failed)} files failed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--files', type=int, default=60)
+    parser.add_argument('--pdf-pages', type=int, default=40)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--embed', action='store_true', help='also chunk and embed (needs the embedding model)')
+    args = parser.parse_args()
+
+    os.environ['PARSE_WORKERS'] = str(args.workers)
+    from Tools import Tools_extract
+    Tools_extract.PARSE_WORKERS = args.workers
+
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus = os.path.join(tmp, 'corpus')
+        os.makedirs(corpus)
+        paths = make_corpus(corpus, args.files, args.pdf_pages)
+        size_mb = sum(os.path.getsize(path) for path in paths) / (1024 * 1024)
+        print(f"corpus: {len(paths)} files, {size_mb:.1f} MB, workers={args.workers}")
+
+        # Start the workers before timing so process start-up is not counted
+        Tools_extract.get_parse_pool().submit(Tools_extract.supports, 'pdf').result()
+
+        runs = [("inline (before)", 1, lambda: run_inline(paths)),
+                ("process pool (after)", args.workers, lambda: run_pool(paths))]
+        if args.embed:
+            runs.append(("pool + embed", args.workers, lambda: run_import(paths, tmp)))
+        for label, cores, run in runs:
+            start = time.perf_counter()
+            run()
+            elapsed = time.perf_counter() - start
+            rate = len(paths) / elapsed
+            print(f"{label:<22} {elapsed:7.2f}s {rate:7.2f} files/s {rate / cores:7.2f} files/s/core")
+        Tools_extract.shutdown_parse_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Benchmark: N searches one at a time against one VectorDB.search_many call
+
+Loads --docs documents into a VectorDB, then for each query count in
+--queries runs the same queries twice: once as a loop of search_for_rag
+calls (what a client of /api/vector/search does), and once through
+search_many (what /api/vector/search/batch does). search_many encodes each
+SEARCH_BATCH_SIZE queries (--batch-size) with one encoder call and runs one
+index search over the query matrix. Both caches are turned off so every
+query is encoded and searched, and the two runs must return the same
+results.
+
+Documents get a synthetic vector seeded by a hash of the text. Queries are
+encoded with --encoder: 'transformer' (default) is the numpy transformer of
+bench_embed_batching.py, whose cost grows with batch size like a real model;
+'hash' has almost no encode cost, so only the index search is compared;
+'model' loads the real SentenceTransformer (--model).
+
+Usage:
+    python benchmarks/bench_search_batch.py --docs 100000 --queries 100,1000
+    python benchmarks/bench_search_batch.py --encoder hash --index hnsw --mode hybrid
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_embed_batching import WORDS, SyntheticTransformer
+from bench_shards import SyntheticEncoder, load, make_documents
+from Model.Model_Vector_DB import VectorDB
+
+
+def make_queries(count, seed):
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 16))) + f" {i}" for i in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--docs', type=int, default=100_000)
+    parser.add_argument('--queries', default='100,1000', help='comma separated query counts')
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--index', default='flat', help='VECTOR_INDEX_TYPE')
+    parser.add_argument('--mode', default='dense', help='dense / lexical / hybrid')
+    parser.add_argument('--batch-size', type=int, default=256, help='SEARCH_BATCH_SIZE')
+    parser.add_argument('--encoder', default='transformer', choices=['transformer', 'hash', 'model'])
+    parser.add_argument('--model', default='nomic-ai/nomic-embed-text-v1')
+    args = parser.parse_args()
+
+    if args.encoder == 'model':
+        from sentence_transformers import SentenceTransformer
+        encoder = SentenceTransformer(args.model, trust_remote_code=True)
+    else:
+        encoder = SyntheticTransformer() if args.encoder == 'transformer' else SyntheticEncoder()
+    encoder.encode(["warm up"])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = VectorDB(db_path=os.path.join(tmp, 'db'), legacy_db_file=None, encoder=SyntheticEncoder(),
+                      index_type=args.index, embedding_cache_path=None, lexical_index=args.mode != 'dense')
+        load(db, make_documents(args.docs))
+        db.encoder = encoder  # documents are in; from here on only queries are encoded
+        db.search_batch_size = args.batch_size
+        db.result_cache.max_size = 0
+        db.embedding_cache.max_size = 0
+
+        print(f"{args.docs} docs, {args.index} index, {args.mode}, {args.encoder} encoder, k={args.k}, "
+              f"batch size {args.batch_size}, {os.cpu_count()} CPUs")
+        print(f"{'queries':>7} | {'one by one QPS':>14} | {'search_many QPS':>15} | speedup | same results")
+        for count in (int(value) for value in args.queries.split(',')):
+            queries = make_queries(count, count)
+
+            start = time.perf_counter()
+            single = [db.search_for_rag(query, args.k, mode=args.mode) for query in queries]
+            single_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            batched = list(db.search_many(queries, args.k, mode=args.mode))
+            batched_seconds = time.perf_counter() - start
+
+            same = sum([result['id'] for result in a] == [result['id'] for result in b]
+                       for a, b in zip(single, batched))
+            print(f"{count:>7} | {count / single_seconds:>14.0f} | {count / batched_seconds:>15.0f} | "
+                  f"{single_seconds / batched_seconds:>6.1f}x | {same}/{count}")
+
+
+if __name__ == "__main__":
+    main()
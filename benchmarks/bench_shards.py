@@ -0,0 +1,204 @@
+"""Benchmark: search QPS and latency of a sharded VectorDB against shard count
+
+Starts N shard workers on localhost (shard_server.create_shard_app in a
+separate process each) and loads --docs documents through a
+ShardedVectorDB coordinator, which partitions them by content hash. Then
+--clients threads run dense searches (search_for_rag, k=--k) through the
+coordinator for --seconds, and QPS, p50 and p99 latency are reported. The
+first row is one in-process VectorDB holding every document.
+
+Each shard count is also checked against the in-process VectorDB: with the
+flat index the merged top-k must hold exactly the same texts.
+
+At the end one shard is paused (SIGSTOP) and one is killed, to show the
+per-shard timeout (--timeout) and partial results from the remaining
+shards.
+
+The encoder is synthetic (a vector seeded by a hash of the text) and the
+lexical index is off, so only index, RPC and merge costs are measured.
+Shards only run in parallel when the machine has spare cores.
+
+Usage:
+    python benchmarks/bench_shards.py --docs 100000 --shards 1,2,4 --clients 8 --seconds 10
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import signal
+import socket
+import sys
+import tempfile
+import threading
+import time
+import zlib
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Model.Model_Shards import ShardedVectorDB, ShardError
+from Model.Model_Vector_DB import VectorDB
+from Tools.Tools_document import Document
+
+
+class SyntheticEncoder:
+    """Deterministic unit vector per text"""
+
+    def __init__(self, dimension=768):
+        self.dimension = dimension
+
+    def encode(self, texts, batch_size=32):
+        out = np.empty((len(texts), self.dimension), dtype='float32')
+        for i, text in enumerate(texts):
+            out[i] = np.random.default_rng(zlib.crc32(text.encode('utf-8'))).standard_normal(self.dimension)
+            out[i] /= np.linalg.norm(out[i])
+        return out
+
+
+def open_db(path, index_type):
+    return VectorDB(db_path=path, legacy_db_file=None, encoder=SyntheticEncoder(), index_type=index_type,
+                    embedding_cache_path=None, lexical_index=False)
+
+
+def serve_shard(path, port, index_type):
+    import uvicorn
+    from shard_server import create_shard_app
+
+    app = create_shard_app(lambda: open_db(path, index_type))
+    uvicorn.run(app, host='127.0.0.1', port=port, log_level='warning')
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_shards(tmp, count, index_type):
+    context = multiprocessing.get_context('spawn')
+    ports = [free_port() for _ in range(count)]
+    processes = [context.Process(target=serve_shard, args=(os.path.join(tmp, f"shard-{count}-{i}"), port, index_type),
+                                 daemon=True)
+                 for i, port in enumerate(ports)]
+    for process in processes:
+        process.start()
+    urls = [f"http://127.0.0.1:{port}" for port in ports]
+    for url, port in zip(urls, ports):
+        deadline = time.monotonic() + 120
+        while True:
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"shard {url} did not start")
+                time.sleep(0.1)
+    return processes, urls
+
+
+def make_documents(count):
+    rng = random.Random(0)
+    return [Document(page_content=f"เอกสาร {row} {rng.random()}", metadata={'group': row % 16})
+            for row in range(count)]
+
+
+def load(db, documents):
+    for start in range(0, len(documents), 5000):
+        db.add_documents(documents[start:start + 5000])
+
+
+def run_clients(db, args):
+    stop = threading.Event()
+    latencies = [[] for _ in range(args.clients)]
+
+    def client(number):
+        rng = random.Random(number)
+        while not stop.is_set():
+            start = time.perf_counter()
+            db.search_for_rag(f"query {number} {rng.random()}", args.k, mode='dense')
+            latencies[number].append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(args.clients)]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    merged = np.array([value for values in latencies for value in values]) * 1000
+    return len(merged) / args.seconds, np.percentile(merged, 50), np.percentile(merged, 99)
+
+
+def matches(db, local, args):
+    exact = 0
+    for i in range(args.checks):
+        query = f"check {i}"
+        expected = [result['text'] for result in local.search_for_rag(query, args.k, mode='dense')]
+        exact += [result['text'] for result in db.search_for_rag(query, args.k, mode='dense')] == expected
+    return exact
+
+
+def partial_results(db, processes, args):
+    print(f"shard 0 paused (SIGSTOP), shard timeout {args.timeout}s:")
+    os.kill(processes[0].pid, signal.SIGSTOP)
+    try:
+        start = time.perf_counter()
+        results, missing = db.search_shards("partial", args.k, mode='dense')
+        print(f"  {len(results)} results in {(time.perf_counter() - start) * 1000:.0f} ms, missing shards {missing}")
+    finally:
+        os.kill(processes[0].pid, signal.SIGCONT)
+    processes[-1].kill()
+    processes[-1].join()
+    start = time.perf_counter()
+    results, missing = db.search_shards("partial", args.k, mode='dense')
+    print(f"shard {len(processes) - 1} killed: {len(results)} results in "
+          f"{(time.perf_counter() - start) * 1000:.0f} ms, missing shards {missing}")
+    for process in processes[:-1]:
+        process.kill()
+    try:
+        db.search_shards("partial", args.k, mode='dense')
+    except ShardError as e:
+        print(f"all shards down: {type(e).__name__}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--docs', type=int, default=100_000)
+    parser.add_argument('--shards', default='1,2,4', help='comma separated shard counts')
+    parser.add_argument('--clients', type=int, default=8, help='concurrent search threads')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--checks', type=int, default=50, help='queries compared with the in-process VectorDB')
+    parser.add_argument('--timeout', type=float, default=1.0, help='per-shard search timeout (SHARD_TIMEOUT)')
+    parser.add_argument('--index', default='flat', help='VECTOR_INDEX_TYPE of every shard')
+    args = parser.parse_args()
+
+    documents = make_documents(args.docs)
+    with tempfile.TemporaryDirectory() as tmp:
+        local = open_db(os.path.join(tmp, 'local'), args.index)
+        load(local, documents)
+        local.result_cache.max_size = 0
+        print(f"{args.docs} docs, {args.index} index, {args.clients} clients, k={args.k}, "
+              f"{os.cpu_count()} CPUs")
+        print(f"{'shards':>9} | {'QPS':>7} | {'p50 ms':>7} | {'p99 ms':>7} | exact top-k")
+        qps, p50, p99 = run_clients(local, args)
+        print(f"{'in-proc':>9} | {qps:>7.0f} | {p50:>7.2f} | {p99:>7.2f} | -")
+
+        counts = [int(count) for count in args.shards.split(',')]
+        for count in counts:
+            processes, urls = start_shards(tmp, count, args.index)
+            db = ShardedVectorDB(urls, SyntheticEncoder(), shard_key=None, timeout=args.timeout)
+            load(db, documents)
+            qps, p50, p99 = run_clients(db, args)
+            exact = matches(db, local, args)
+            print(f"{count:>9} | {qps:>7.0f} | {p50:>7.2f} | {p99:>7.2f} | {exact}/{args.checks}")
+            if count == counts[-1] and count > 1:
+                partial_results(db, processes, args)
+            for process in processes:
+                process.kill()
+                process.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Benchmark: media transcription time vs number of recognizer workers
+
+Synthesizes --minutes of speech-like audio (tone bursts separated by short
+silences), segments it and transcribes the segments with the offline
+recognizer, which sleeps --latency seconds per call to stand in for a
+speech API round trip. Before, a recording was sent as one request, so the
+time grew with file length; with segments the time shrinks with workers.
+
+Usage:
+    python benchmarks/bench_transcribe.py --minutes 10 --latency 1.0 --workers 1 4 8
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from Tools.Tools_media_processor import SAMPLE_RATE, MediaProcessor, OfflineRecognizer
+
+
+def synthesize(minutes, seed=0):
+    """Tone bursts of 5-20 s with 0.3-1 s of silence between them"""
+    rng = np.random.default_rng(seed)
+    total, parts = int(minutes * 60 * SAMPLE_RATE), []
+    length = 0
+    while length < total:
+        t = np.arange(int(rng.uniform(5, 20) * SAMPLE_RATE)) / SAMPLE_RATE
+        parts.append((3000 * np.sin(2 * np.pi * rng.uniform(120, 300) * t)).astype('<i2'))
+        parts.append(np.zeros(int(rng.uniform(0.3, 1.0) * SAMPLE_RATE), dtype='<i2'))
+        length += len(parts[-2]) + len(parts[-1])
+    return np.concatenate(parts)[:total]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--minutes', type=float, default=10)
+    parser.add_argument('--latency', type=float, default=1.0, help='simulated seconds per recognizer call')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 8])
+    args = parser.parse_args()
+
+    pcm = synthesize(args.minutes)
+    recognizer = OfflineRecognizer(delay=args.latency)
+    print(f"audio: {args.minutes:.1f} min, recognizer latency {args.latency:.2f}s per segment")
+    for workers in args.workers:
+        start = time.perf_counter()
+        segments = MediaProcessor.transcribe_pcm(pcm, recognizer=recognizer, workers=workers)
+        elapsed = time.perf_counter() - start
+        print(f"workers={workers:<3} {len(segments):4d} segments {elapsed:7.2f}s "
+              f"{args.minutes * 60 / elapsed:7.1f}x realtime")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""Benchmark: memory and write propagation of several server workers sharing one vector store
+
+Builds a store of --docs documents once, then starts 1, 2 and 4 worker
+processes (fresh interpreters, like uvicorn workers). Each worker loads the
+VectorDB from the same folder and runs a few searches, then reports its
+memory from /proc/self/smaps_rollup:
+  - Rss        pages the worker has mapped, shared or not
+  - Pss        Rss with every shared page split between the processes using it
+  - Anonymous  private memory (Python heap, and the index when it is not mmapped)
+Each worker count runs with SEGMENT_MMAP=0 (every worker reads its own copy
+of the index) and SEGMENT_MMAP=1 (index segments are mmapped from the shared
+files). The sum of Pss over the workers is the machine memory they use.
+
+Worker 0 then adds a document, and every other worker searches for it until
+it is found. The time from the add returning to the first hit is the
+propagation lag (bounded by STORE_REFRESH_SECONDS).
+
+The encoder is synthetic (a vector seeded by a hash of the text) and the
+lexical index is off, so only the vector index and store are measured.
+
+Usage:
+    python benchmarks/bench_workers.py --docs 100000 --workers 1,2,4 --index flat
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+import zlib
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Model.Model_Vector_DB import VectorDB
+from Tools.Tools_document import Document
+
+SMAPS_FIELDS = ('Rss', 'Pss', 'Anonymous')
+
+
+class SyntheticEncoder:
+    """Deterministic unit vector per text"""
+
+    def __init__(self, dimension=768):
+        self.dimension = dimension
+
+    def encode(self, texts, batch_size=32):
+        out = np.empty((len(texts), self.dimension), dtype='float32')
+        for i, text in enumerate(texts):
+            out[i] = np.random.default_rng(zlib.crc32(text.encode('utf-8'))).standard_normal(self.dimension)
+            out[i] /= np.linalg.norm(out[i])
+        return out
+
+
+def open_db(path, index_type):
+    return VectorDB(db_path=path, legacy_db_file=None, encoder=SyntheticEncoder(), index_type=index_type,
+                    embedding_cache_path=None, lexical_index=False)
+
+
+def smaps_mb():
+    values = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            field, _, rest = line.partition(':')
+            if field in SMAPS_FIELDS:
+                values[field] = int(rest.split()[0]) / 1024
+    return values
+
+
+def worker(number, path, index_type, mmap, results, measured, added):
+    os.environ['SEGMENT_MMAP'] = '1' if mmap else '0'
+    db = open_db(path, index_type)
+    encoder = SyntheticEncoder()
+    for i in range(50):
+        db.search_vector(encoder.encode([f"warm {number} {i}"])[0], 5)
+    results.put(('memory', number, smaps_mb()))
+    measured.wait()
+
+    text = f"propagation probe {os.getpid()} {time.time()}"
+    if number == 0:
+        doc_id = db.add_documents([Document(page_content=text, metadata={'source': 'probe'})])[0]
+        results.put(('added', time.monotonic(), (doc_id, text)))
+        return
+    doc_id, text = added.get()
+    query = encoder.encode([text])[0]
+    while True:
+        hits = db.search_vector(query, 1)
+        if hits and hits[0]['id'] == doc_id:
+            results.put(('lag', number, time.monotonic()))
+            return
+        time.sleep(0.005)
+
+
+def run(path, index_type, workers, mmap):
+    context = multiprocessing.get_context('spawn')
+    results, measured = context.Queue(), context.Event()
+    added = [context.Queue() for _ in range(workers)]
+    processes = [context.Process(target=worker, args=(i, path, index_type, mmap, results, measured, added[i]))
+                 for i in range(workers)]
+    for process in processes:
+        process.start()
+    memory = [results.get(timeout=600)[2] for _ in range(workers)]
+    measured.set()
+
+    lags = []
+    _, added_at, probe = results.get(timeout=600)
+    for queue in added[1:]:
+        queue.put(probe)
+    for _ in range(workers - 1):
+        _, _, found_at = results.get(timeout=600)
+        lags.append(found_at - added_at)
+    for process in processes:
+        process.join()
+    return memory, lags
+
+
+def build(path, docs, index_type):
+    rng = random.Random(0)
+    db = open_db(path, index_type)
+    for start in range(0, docs, 10_000):
+        db.add_documents([Document(page_content=f"เอกสาร {row} {rng.random()}", metadata={'source': f"f{row // 50}"})
+                          for row in range(start, min(start + 10_000, docs))])
+    with db._lock, db.write_lock:
+        db._rebuild_index()  # one saved segment, like a store that has been running a while
+        db._publish()
+    segments = ", ".join(f"{segment.kind} x {len(segment)}" for segment in db.snapshot.segments)
+    size = sum(os.path.getsize(os.path.join(db.segment_path, name)) for name in os.listdir(db.segment_path))
+    print(f"{docs} docs, segments [{segments}], {size / 2**20:.0f} MB of segment files, "
+          f"{db.store.rows * db.dimension * 4 / 2**20:.0f} MB of vectors")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--docs', type=int, default=100_000)
+    parser.add_argument('--workers', default='1,2,4', help='comma separated worker counts')
+    parser.add_argument('--index', default='flat', help='VECTOR_INDEX_TYPE of the store')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'store')
+        build(path, args.docs, args.index)
+        print(f"{'workers':>7} | {'mmap':>4} | {'Rss MB/worker':>13} | {'Anon MB/worker':>14} | "
+              f"{'total Pss MB':>12} | propagation lag ms")
+        for workers in (int(count) for count in args.workers.split(',')):
+            for mmap in (False, True):
+                memory, lags = run(path, args.index, workers, mmap)
+                rss = np.mean([values['Rss'] for values in memory])
+                anonymous = np.mean([values['Anonymous'] for values in memory])
+                pss = sum(values['Pss'] for values in memory)
+                lag = (f"max {max(lags) * 1000:.0f}, mean {np.mean(lags) * 1000:.0f}" if lags else "-")
+                print(f"{workers:>7} | {'on' if mmap else 'off':>4} | {rss:>13.0f} | {anonymous:>14.0f} | "
+                      f"{pss:>12.0f} | {lag}")
+
+
+if __name__ == "__main__":
+    main()
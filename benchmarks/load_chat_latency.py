@@ -0,0 +1,104 @@
+"""Load test: chat latency percentiles with and without concurrent uploads
+
+Runs a fixed number of /api/chat/chat requests against a running server,
+first on its own and then while a background loop keeps uploading files.
+With blocking work moved off the event loop, p99 should stay roughly flat.
+
+Usage:
+    python app.py &
+    python benchmarks/load_chat_latency.py --url http://localhost:8000 --requests 100 --concurrency 8 \\
+        --upload-file document.pdf
+"""
+import argparse
+import json
+import os
+import threading
+import time
+import uuid
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+
+def post_json(url, payload):
+    request = urllib.request.Request(
+        url, data=json.dumps(payload).encode('utf-8'),
+        headers={'Content-Type': 'application/json'}, method='POST'
+    )
+    start = time.perf_counter()
+    with urllib.request.urlopen(request, timeout=300) as response:
+        response.read()
+    return time.perf_counter() - start
+
+
+def post_file(url, path):
+    boundary = uuid.uuid4().hex
+    with open(path, 'rb') as f:
+        content = f.read()
+    body = (
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; "
+        f"filename=\"{os.path.basename(path)}\"\r\nContent-Type: application/octet-stream\r\n\r\n"
+    ).encode('utf-8') + content + f"\r\n--{boundary}--\r\n".encode('utf-8')
+    request = urllib.request.Request(
+        url, data=body, headers={'Content-Type': f'multipart/form-data; boundary={boundary}'}, method='POST'
+    )
+    with urllib.request.urlopen(request, timeout=600) as response:
+        job = json.loads(response.read())
+    # Uploads are processed in the background: wait for the job so ingest load stays steady
+    status_url = url.split('/api/')[0] + job['status_url']
+    while True:
+        with urllib.request.urlopen(status_url, timeout=60) as response:
+            if json.loads(response.read())['stage'] in ('done', 'failed'):
+                return
+        time.sleep(0.5)
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+def run_chat(args):
+    payload = {'text': args.question, 'use_agent': True, 'stream': False}
+    url = args.url.rstrip('/') + '/api/chat/chat'
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        return list(pool.map(lambda _: post_json(url, payload), range(args.requests)))
+
+
+def report(label, latencies):
+    print(f"{label:<22} n={len(latencies):<5} p50={percentile(latencies, 50) * 1000:8.0f}ms "
+          f"p99={percentile(latencies, 99) * 1000:8.0f}ms max={max(latencies) * 1000:8.0f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='http://localhost:8000')
+    parser.add_argument('--requests', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--question', default='โรคใบจุดรักษาอย่างไร')
+    parser.add_argument('--upload-file', required=True, help='file uploaded repeatedly during the second phase')
+    parser.add_argument('--upload-concurrency', type=int, default=2)
+    args = parser.parse_args()
+
+    report("chat only", run_chat(args))
+
+    stop = threading.Event()
+    uploads = []
+
+    def upload_loop():
+        url = args.url.rstrip('/') + '/api/vector/vector/upload/file'
+        while not stop.is_set():
+            post_file(url, args.upload_file)
+            uploads.append(1)
+
+    threads = [threading.Thread(target=upload_loop, daemon=True) for _ in range(args.upload_concurrency)]
+    for thread in threads:
+        thread.start()
+    try:
+        report("chat during uploads", run_chat(args))
+    finally:
+        stop.set()
+    print(f"uploads completed during run: {len(uploads)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Load test: server peak RSS while handling concurrent file uploads
+
+Sends --concurrency uploads of the same file at once to a running server and
+samples the server's resident memory (/proc/<pid>/status, Linux only) while
+they run. Reports the peak RSS growth over the idle baseline, in total and per
+concurrent upload. The multipart body is streamed from a temp file, so the
+client does not hold the payload in memory either.
+
+Usage:
+    python app.py &
+    python benchmarks/load_upload_rss.py --pid $! --file video.mp4 --concurrency 4
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+import uuid
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+
+def rss_mb(pid):
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def build_body(path):
+    """Write the multipart body to a temp file and return (path, boundary)"""
+    boundary = uuid.uuid4().hex
+    body = tempfile.NamedTemporaryFile(delete=False, suffix='.multipart')
+    with body, open(path, 'rb') as source:
+        body.write((
+            f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; "
+            f"filename=\"{os.path.basename(path)}\"\r\nContent-Type: application/octet-stream\r\n\r\n"
+        ).encode('utf-8'))
+        while True:
+            block = source.read(1024 * 1024)
+            if not block:
+                break
+            body.write(block)
+        body.write(f"\r\n--{boundary}--\r\n".encode('utf-8'))
+    return body.name, boundary
+
+
+def upload(url, body_path, boundary):
+    start = time.perf_counter()
+    with open(body_path, 'rb') as body:
+        request = urllib.request.Request(url, data=body, method='POST', headers={
+            'Content-Type': f'multipart/form-data; boundary={boundary}',
+            'Content-Length': str(os.path.getsize(body_path))
+        })
+        try:
+            with urllib.request.urlopen(request, timeout=900) as response:
+                status = response.status
+        except urllib.error.HTTPError as e:
+            status = e.code
+    return status, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='http://localhost:8000')
+    parser.add_argument('--pid', type=int, required=True, help='server process id')
+    parser.add_argument('--file', required=True)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--interval', type=float, default=0.05, help='RSS sampling interval (s)')
+    args = parser.parse_args()
+
+    url = args.url.rstrip('/') + '/api/vector/vector/upload/file'
+    body_path, boundary = build_body(args.file)
+    try:
+        baseline = rss_mb(args.pid)
+        peak = [baseline]
+        stop = threading.Event()
+
+        def sample():
+            while not stop.is_set():
+                peak[0] = max(peak[0], rss_mb(args.pid))
+                time.sleep(args.interval)
+
+        sampler = threading.Thread(target=sample, daemon=True)
+        sampler.start()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            results = list(pool.map(lambda _: upload(url, body_path, boundary), range(args.concurrency)))
+        stop.set()
+        sampler.join()
+    finally:
+        os.remove(body_path)
+
+    size_mb = os.path.getsize(args.file) / (1024 * 1024)
+    growth = peak[0] - baseline
+    statuses = sorted({status for status, _ in results})
+    print(f"file: {size_mb:.1f} MB x {args.concurrency} concurrent uploads, statuses {statuses}, "
+          f"slowest {max(elapsed for _, elapsed in results):.1f}s")
+    print(f"RSS baseline {baseline:.0f} MB, peak {peak[0]:.0f} MB, growth {growth:.0f} MB "
+          f"({growth / args.concurrency:.1f} MB per concurrent upload, "
+          f"{growth / args.concurrency / size_mb if size_mb else 0:.2f}x file size)")
+
+
+if __name__ == "__main__":
+    main()
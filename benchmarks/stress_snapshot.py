@@ -0,0 +1,200 @@
+"""Stress test: concurrent search and ingest against one VectorDB
+
+Reader threads run dense (search_vector), filtered and hybrid
+(search_for_rag) searches while writer threads add, update and delete
+documents. Every document's text starts with "[key]", and its metadata
+carries the same key. A write always replaces text and metadata together,
+so a result whose text and metadata disagree was read from a half-applied
+write. Each result list is also checked for duplicate ids, order, length
+<= k and filter matches. After each add, the writer searches for the exact
+vector it just wrote and must get that document back first
+(read-your-writes).
+
+Read latency is reported twice: for readers alone, then with the writers
+running. The encoder is synthetic (a vector seeded by a hash of the text),
+so only index, store and locking costs are measured.
+
+Usage:
+    python benchmarks/stress_snapshot.py --docs 20000 --readers 4 --writers 2 --seconds 20
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import zlib
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Model.Model_Vector_DB import VectorDB
+from Tools.Tools_document import Document
+
+KEYS = [f"k{i}" for i in range(16)]
+
+
+class SyntheticEncoder:
+    """Deterministic unit vector per text"""
+
+    def __init__(self, dimension=768):
+        self.dimension = dimension
+
+    def encode(self, texts, batch_size=32):
+        out = np.empty((len(texts), self.dimension), dtype='float32')
+        for i, text in enumerate(texts):
+            out[i] = np.random.default_rng(zlib.crc32(text.encode('utf-8'))).standard_normal(self.dimension)
+            out[i] /= np.linalg.norm(out[i])
+        return out
+
+
+def make_document(rng, serial):
+    key = rng.choice(KEYS)
+    return Document(page_content=f"[{key}] ปุ๋ยและโรคพืช เอกสาร {serial} {rng.random()}", metadata={'key': key})
+
+
+class Checker:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.errors = []
+        self.results = 0
+
+    def fail(self, message):
+        with self.lock:
+            if len(self.errors) < 20:
+                self.errors.append(message)
+
+    def check(self, results, k, ascending, key=None):
+        ids = [result['id'] for result in results]
+        if len(results) > k:
+            self.fail(f"{len(results)} results for k={k}")
+        if len(set(ids)) != len(ids):
+            self.fail(f"duplicate ids {ids}")
+        scores = [result['score'] for result in results]
+        if scores != sorted(scores, reverse=not ascending):
+            self.fail(f"scores out of order {scores}")
+        for result in results:
+            if not result['text'].startswith(f"[{result['metadata'].get('key')}]"):
+                self.fail(f"text/metadata mismatch {result['id']}: {result['text'][:20]!r} {result['metadata']}")
+            if key is not None and result['metadata'].get('key') != key:
+                self.fail(f"filter {key} returned {result['metadata']}")
+        with self.lock:
+            self.results += len(results)
+
+
+def reader(db, checker, stop, latencies, seed, k):
+    rng = random.Random(seed)
+    encoder = SyntheticEncoder()
+    while not stop.is_set():
+        kind = rng.random()
+        start = time.perf_counter()
+        try:
+            if kind < 0.6:
+                results = db.search_vector(encoder.encode([f"q{rng.random()}"])[0], k)
+                checker.check(results, k, ascending=True)
+            elif kind < 0.8:
+                key = rng.choice(KEYS)
+                results = db.search_for_rag(f"q{rng.random()}", k, filter={'key': key}, mode='dense')
+                checker.check(results, k, ascending=True, key=key)
+            else:
+                results = db.search_for_rag(f"ปุ๋ย เอกสาร {rng.randrange(10_000)}", k, mode='hybrid')
+                checker.check(results, k, ascending=False)
+        except Exception as e:
+            checker.fail(f"search raised {e!r}")
+        latencies.append(time.perf_counter() - start)
+
+
+def writer(db, checker, stop, counts, seed, owned):
+    rng = random.Random(seed)
+    encoder = SyntheticEncoder()
+    serial = 0
+    while not stop.is_set():
+        op = rng.random()
+        try:
+            if op < 0.5 or not owned:
+                batch = [make_document(rng, f"w{seed}-{serial + i}") for i in range(rng.randint(1, 8))]
+                serial += len(batch)
+                ids = db.add_documents(batch)
+                owned.extend(ids)
+                top = db.search_vector(encoder.encode([batch[0].page_content])[0], 1)
+                if not top or top[0]['id'] != ids[0]:
+                    checker.fail(f"read-your-writes: added {ids[0]}, top hit {top[:1]}")
+                counts['add'] += len(batch)
+            elif op < 0.8:
+                doc_id, key = rng.choice(owned), rng.choice(KEYS)
+                db.update_document(doc_id, f"[{key}] แก้ไข {serial} {rng.random()}", {'key': key})
+                serial += 1
+                counts['update'] += 1
+            else:
+                db.delete_document(owned.pop(rng.randrange(len(owned))))
+                counts['delete'] += 1
+        except Exception as e:
+            checker.fail(f"write raised {e!r}")
+
+
+def percentile(values, p):
+    return float(np.percentile(np.array(values) * 1000, p)) if values else float('nan')
+
+
+def run_phase(db, checker, args, writers):
+    stop = threading.Event()
+    latencies = [[] for _ in range(args.readers)]
+    counts = {'add': 0, 'update': 0, 'delete': 0}
+    threads = [threading.Thread(target=reader, args=(db, checker, stop, latencies[i], i, args.k))
+               for i in range(args.readers)]
+    if writers:
+        threads += [threading.Thread(target=writer, args=(db, checker, stop, counts, 100 + i, []))
+                    for i in range(args.writers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    merged = [value for values in latencies for value in values]
+    return merged, counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--docs', type=int, default=20_000, help='documents loaded before the test')
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=20)
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--index', default='auto', help='VECTOR_INDEX_TYPE for the test database')
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        db = VectorDB(db_path=os.path.join(tmp, 'store'), legacy_db_file=None, encoder=SyntheticEncoder(),
+                      index_type=args.index, embedding_cache_path=None)
+        documents = [make_document(rng, i) for i in range(args.docs)]
+        for start in range(0, len(documents), 5000):
+            db.add_documents(documents[start:start + 5000])
+        db.result_cache.max_size = 0  # every search reaches the index
+
+        checker = Checker()
+        print(f"{args.docs} docs, {args.readers} readers, {args.writers} writers, {args.seconds:.0f}s per phase")
+        print(f"{'phase':>13} | {'searches':>8} | {'p50 ms':>7} | {'p99 ms':>7} | writes")
+        for label, writers in (('reads only', False), ('reads+writes', True)):
+            latencies, counts = run_phase(db, checker, args, writers)
+            writes = ", ".join(f"{op} {count}" for op, count in counts.items()) if writers else "-"
+            print(f"{label:>13} | {len(latencies):>8} | {percentile(latencies, 50):>7.2f} | "
+                  f"{percentile(latencies, 99):>7.2f} | {writes}")
+
+        segments = ", ".join(f"{segment.kind} x {len(segment)}" for segment in db.snapshot.segments)
+        print(f"final snapshot: generation {db.snapshot.generation}, segments [{segments}], "
+              f"delta {len(db.snapshot.delta_rows)}, deleted in segments {len(db.snapshot.dead)}")
+        print(f"checked {checker.results} results: "
+              + ("consistent" if not checker.errors else f"{len(checker.errors)} errors"))
+        for error in checker.errors:
+            print("  " + error)
+        if checker.errors:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
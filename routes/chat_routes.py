@@ -3,16 +3,24 @@ from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Optional
 from LLM_Model.Model_llm_gemini import Gemini
-import asyncio
+from Tools.Tools_executor import run_in_pool, stream_in_pool
+import json
 
 router = APIRouter()
 gemini = Gemini()
 
+def sse_event(data: str, event: Optional[str] = None) -> str:
+    """Format one Server-Sent Event (multi-line data is split into several data: lines)"""
+    lines = [f"event: {event}"] if event else []
+    lines += [f"data: {line}" for line in data.split("\n")]
+    return "\n".join(lines) + "\n\n"
+
 class ChatRequest(BaseModel):
     text: Optional[str] = None
     image_base64: Optional[str] = None
     use_agent: bool = False
     stream: bool = False  # เพิ่มพารามิเตอร์สำหรับสตรีม
+    use_cache: Optional[bool] = None  # None = ใช้ค่า RESPONSE_CACHE_ENABLED
 
     class Config:
         schema_extra = {
@@ -35,6 +43,7 @@ class ChatRequest(BaseModel):
     - **image_base64** (string, optional): รูปภาพในรูปแบบ Base64 string
     - **use_agent** (boolean): เลือกใช้ agent (true) หรือไม่ใช้ (false)
     - **stream** (boolean): ส่งผลลัพธ์แบบสตรีมหรือไม่ (default: false)
+    - **use_cache** (boolean, optional): ใช้คำตอบจากแคชถ้ามีคำถามใกล้เคียงกันที่ใช้ข้อมูลอ้างอิงชุดเดียวกัน (default: ตาม RESPONSE_CACHE_ENABLED, ไม่ใช้กับคำขอที่มีรูปภาพ)
 
     ## หมายเหตุ
     - สามารถส่ง text หรือ image_base64 อย่างใดอย่างหนึ่ง หรือส่งทั้งคู่พร้อมกันได้
@@ -73,7 +82,11 @@ class ChatRequest(BaseModel):
 
     ## วิธีรับข้อมูลแบบสตรีม (stream) ฝั่ง client
 
-    เมื่อส่ง `stream: true` ใน payload จะได้รับผลลัพธ์แบบสตรีม (Server-Sent Events)  
+    เมื่อส่ง `stream: true` ใน payload จะได้รับผลลัพธ์แบบสตรีม (Server-Sent Events) ทันทีที่โมเดลสร้างข้อความ  
+    - event แรกคือ `event: citations` ตามด้วย `data:` เป็น JSON รายการแหล่งอ้างอิง (id, source, chunk_id, relevance)
+    - จากนั้นเป็นข้อความคำตอบทีละส่วนในบรรทัด `data:` (ไม่มีชื่อ event)
+    - จบด้วย `event: done` (หรือ `event: error` ถ้าเกิดข้อผิดพลาดระหว่างสร้างคำตอบ)
+
     ตัวอย่างการอ่านผลลัพธ์ทีละ chunk ด้วย JavaScript fetch:
 
     ```js
@@ -92,18 +105,27 @@ class ChatRequest(BaseModel):
 
     const reader = response.body.getReader();
     const decoder = new TextDecoder();
+    let eventName = null;
 
     while (true) {
         const { value, done } = await reader.read();
         if (done) break;
         const chunk = decoder.decode(value);
         // chunk จะมีรูปแบบ "data: ...\\n\\n"
-        const lines = chunk.split('\\n').filter(line => line.trim());
+        const lines = chunk.split('\\n');
         for (const line of lines) {
-            if (line.startsWith('data: ')) {
+            if (!line.trim()) {
+                eventName = null; // บรรทัดว่างคือจบ event
+            } else if (line.startsWith('event: ')) {
+                eventName = line.slice(7); // citations / error / done
+            } else if (line.startsWith('data: ')) {
                 const content = line.slice(6); // ตัด "data: "
-                // นำ content ไปแสดงผลต่อผู้ใช้
-                console.log(content);
+                if (eventName === 'citations') {
+                    console.log('แหล่งอ้างอิง:', JSON.parse(content));
+                } else if (!eventName) {
+                    // นำ content ไปแสดงผลต่อผู้ใช้
+                    console.log(content);
+                }
             }
         }
     }
@@ -114,16 +136,43 @@ class ChatRequest(BaseModel):
     """
 )
 async def chat(request: ChatRequest):
-    response = gemini.grminichat(
+    if request.stream:
+        # Retrieval first so the citations reach the client before generation starts
+        results = await run_in_pool(
+            'search', gemini.retrieve,
+            text=request.text,
+            image=request.image_base64,
+            agent=request.use_agent
+        )
+
+        async def event_stream():
+            yield sse_event(json.dumps(gemini.citations(results), ensure_ascii=False), event="citations")
+            try:
+                async for token in stream_in_pool(
+                    'llm', gemini.grminichat_stream,
+                    text=request.text,
+                    image=request.image_base64,
+                    agent=request.use_agent,
+                    results=results,
+                    use_cache=request.use_cache
+                ):
+                    yield sse_event(token)
+            except Exception as e:
+                yield sse_event(str(e), event="error")
+            yield sse_event("", event="done")
+
+        return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+    response = await run_in_pool(
+        'llm', gemini.grminichat,
         text=request.text,
         image=request.image_base64,
-        agent=request.use_agent
+        agent=request.use_agent,
+        use_cache=request.use_cache
     )
-    if request.stream:
-        async def chunk_text(text, size=50, delay=0.1):
-            for i in range(0, len(text), size):
-                chunk = text[i:i+size]
-                yield f"data: {chunk}\n\n"
-                await asyncio.sleep(delay)
-        return StreamingResponse(chunk_text(response), media_type="text/event-stream")
     return {"response": response}
+
+@router.get("/cache/stats", summary="สถิติแคชคำตอบ")
+async def response_cache_stats():
+    """Hit rate and model latency saved by the response cache"""
+    return {"enabled": gemini.response_cache_enabled, **gemini.response_cache.stats()}
@@ -1,10 +1,18 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Form
-from typing import Optional, List, Dict
+from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import Any, Optional, List, Dict
 from pydantic import BaseModel
 from Model.Model_Vector_DB import VectorDB
+from Model.Model_provider import get_vector_db, reload_vector_db
 from Tools.Tools_readfile import Tools_readfile
+from Tools.Tools_executor import run_in_pool, ExecutorBusyError
+from Tools.Tools_upload_stream import receive_upload, UploadError, UploadTooLargeError
+from Tools.Tools_job_queue import get_job_queue
 import base64
 import io
+import json
+import os
+from itertools import islice
 
 router = APIRouter(
     prefix="/vector",
@@ -16,7 +24,9 @@ router = APIRouter(
     }
 )
 
-vector_db = VectorDB()
+# Ingest job status lives outside the /vector prefix: /api/vector/jobs/{job_id}
+jobs_router = APIRouter(prefix="/jobs", tags=["Vector DB"])
+
 tools = Tools_readfile()
 
 class DocumentMetadata(BaseModel):
@@ -28,13 +38,48 @@ class DocumentUpdate(BaseModel):
     content: str
     metadata: Optional[DocumentMetadata] = None
 
+# upload_file parses the multipart body itself; describe it for the API docs
+UPLOAD_FILE_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["file"],
+                    "properties": {
+                        "file": {"type": "string", "format": "binary"},
+                        "chunk_size": {"type": "integer", "minimum": 1}
+                    }
+                }
+            }
+        }
+    }
+}
+
 class SearchQuery(BaseModel):
     query: str
     k: int = 3
+    nprobe: Optional[int] = None  # สำหรับ index ชนิด ivf / ivfpq
+    ef_search: Optional[int] = None  # สำหรับ index ชนิด hnsw
+    filter: Optional[Dict[str, Any]] = None  # เงื่อนไข metadata เช่น {"source": "a.pdf"}
+    mode: Optional[str] = None  # dense / lexical / hybrid (ค่าเริ่มต้นจาก SEARCH_MODE)
+
+class BatchSearchQuery(BaseModel):
+    queries: List[str]
+    k: int = 3
+    nprobe: Optional[int] = None
+    ef_search: Optional[int] = None
+    filter: Optional[Dict[str, Any]] = None  # ใช้กับทุกคำค้น
+    mode: Optional[str] = None
+
+# Upper bound on queries per /search/batch request
+SEARCH_BATCH_MAX_QUERIES = int(os.environ.get("SEARCH_BATCH_MAX_QUERIES", 10000))
     
 @router.post(
     "/upload/file",
     summary="อัปโหลดไฟล์เข้าระบบ Vector DB",
+    openapi_extra=UPLOAD_FILE_BODY,
     description="""
     # การอัปโหลดไฟล์เข้าระบบ Vector Database
 
@@ -58,19 +103,24 @@ class SearchQuery(BaseModel):
     ### 4. ไฟล์สื่อ
     - **MP3/WAV** (ไม่เกิน 10MB): ไฟล์เสียง
     - **MP4** (ไม่เกิน 10MB): ไฟล์วิดีโอ
-    **หมายเหตุ**: ถ้ามากก่วา 10Mb จะ error 524 Timeout
 
     ## พารามิเตอร์
     - **file**: ไฟล์ที่ต้องการอัปโหลด (รองรับตามประเภทด้านบน)
-    - **chunk_size**: ขนาดการแบ่งข้อความ (ค่าเริ่มต้น: 250 คำ)
+    - **chunk_size**: จำนวน token สูงสุดต่อส่วน (ไม่บังคับ, ค่าเริ่มต้นจาก CHUNK_MAX_TOKENS = 256 token)
 
     ## หมายเหตุ
     - ไฟล์เสียงและวิดีโอจะถูกแปลงเป็นข้อความด้วย Speech Recognition
     - ไฟล์ PDF จะดึงเฉพาะข้อความ
     - ไฟล์ตารางจะถูกแปลงเป็นข้อความ
-    - ระบบจะแบ่งข้อความเป็นส่วนๆ ตาม chunk_size
+    - ระบบจะแบ่งข้อความเป็นส่วนๆ ไม่เกิน chunk_size token
 
     ## การประมวลผล
+    ไฟล์จะถูกรับเข้าคิวแล้วตอบกลับทันที (HTTP 202) พร้อม `job_id`
+    ติดตามความคืบหน้าได้ที่ `GET /api/vector/jobs/{job_id}`
+
+    ถ้ามีไฟล์เนื้อหาเดียวกันอยู่แล้วจะตอบ HTTP 200 พร้อม `dedup` โดยไม่ประมวลผลซ้ำ
+    ไฟล์ชื่อเดิมที่เนื้อหาเปลี่ยนจะ encode เฉพาะ chunk ที่เปลี่ยนและลบ chunk ที่ไม่มีแล้ว (สถิติอยู่ใน `dedup` ของ job)
+
     1. ตรวจสอบประเภทและขนาดไฟล์
     2. แปลงข้อมูลเป็นข้อความ
     3. แบ่งข้อความเป็นส่วนๆ
@@ -82,47 +132,65 @@ class SearchQuery(BaseModel):
     curl -X POST "api/vector/upload/file" \\
          -H "Content-Type: multipart/form-data" \\
          -F "file=@document.pdf" \\
-         -F "chunk_size=250"
+         -F "chunk_size=256"
     ```
     """
 )
-async def upload_file(
-    file: UploadFile = File(...),
-    chunk_size: Optional[int] = Form(250)
-):
+async def upload_file(request: Request):
+    # The body is streamed into a spooled temp file: the size limit is checked as
+    # bytes arrive and processors read from the file instead of an in-memory copy
     try:
-        content = await file.read()
-        file_ext = file.filename.split('.')[-1].lower()
-        
-        if file_ext not in tools.MAX_FILE_SIZES:
-            raise HTTPException(status_code=400, detail="Unsupported file type")
-        
-        if len(content) > tools.MAX_FILE_SIZES[file_ext]:
-            raise HTTPException(
-                status_code=413,
-                detail=f"File too large for type {file_ext}"
-            )
-        
-        success = tools.upload_to_vector(content, file.filename, file_ext)
-        
-        if success:
-            # Reload VectorDB after successful upload
-            vector_db.load_db()
-            return {"message": f"File {file.filename} uploaded and processed successfully"}
-        raise HTTPException(status_code=500, detail="Failed to process file")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        upload = await receive_upload(request, tools.max_file_size)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except UploadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        chunk_size = int(upload.fields['chunk_size']) if upload.fields.get('chunk_size') else None
+        if chunk_size is not None and chunk_size < 1:
+            raise ValueError
+    except ValueError:
+        upload.close()
+        raise HTTPException(status_code=400, detail="chunk_size must be a positive integer")
+
+    # Processing runs in the background job queue; poll /api/vector/jobs/{job_id} for progress
+    try:
+        duplicate_of = await run_in_pool('ingest', tools.find_duplicate_file, upload.file)
+        if duplicate_of is not None:
+            return {
+                "message": f"File {upload.filename} is already stored as {duplicate_of}",
+                "dedup": tools.duplicate_stats(duplicate_of)
+            }
+        job = await run_in_pool('ingest', get_job_queue().submit, upload.file, upload.filename, upload.extension,
+                                chunk_size)
+    finally:
+        upload.close()
+    return JSONResponse(status_code=202, content={
+        "message": f"File {upload.filename} queued for processing",
+        "job_id": job['id'],
+        "status_url": f"/api/vector/jobs/{job['id']}",
+        "job": job
+    })
 
 @router.post("/upload/text")
-async def upload_text(text: str, chunk_size: int = 250):
+async def upload_text(text: str, chunk_size: Optional[int] = None):
+    """chunk_size is a token budget per chunk (default CHUNK_MAX_TOKENS)"""
     try:
-        chunks = tools.chunk_text(text, chunk_size)
-        for chunk in chunks:
-            tools.upload_to_vector(chunk, "direct_input", "text")
-        
-        # Reload VectorDB after successful upload
-        vector_db.load_db()
-        return {"message": "Text uploaded and processed successfully"}
+        dedup = {}
+
+        def progress(stage, **counts):
+            if stage == 'dedup':
+                dedup.update(counts)
+
+        success = await run_in_pool('ingest', tools.process_text, text, "direct_input", chunk_size,
+                                    progress=progress)
+        if not success:
+            raise HTTPException(status_code=500, detail="Failed to process text")
+        return {"message": "Text uploaded and processed successfully", "dedup": dedup}
+    except HTTPException:
+        raise
+    except ExecutorBusyError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -151,13 +219,18 @@ async def upload_text(text: str, chunk_size: int = 250):
     ```
     """
 )
-async def list_documents(skip: int = 0, limit: int = 10):
+async def list_documents(skip: int = 0, limit: int = 10, vector_db: VectorDB = Depends(get_vector_db)):
+    def page():
+        return vector_db.list_documents(skip, limit), len(vector_db)
+
     try:
-        docs = vector_db.list_documents(skip, limit)
+        docs, total = await run_in_pool('search', page)
         return {
-            "total": len(vector_db.documents),
+            "total": total,
             "documents": docs
         }
+    except ExecutorBusyError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -180,8 +253,8 @@ async def list_documents(skip: int = 0, limit: int = 10):
     ```
     """
 )
-async def get_document(doc_id: str):
-    doc = vector_db.get_document(doc_id)
+async def get_document(doc_id: str, vector_db: VectorDB = Depends(get_vector_db)):
+    doc = await run_in_pool('search', vector_db.get_document, doc_id)
     if not doc:
         raise HTTPException(status_code=404, detail="Document not found")
     return doc
@@ -209,8 +282,11 @@ async def get_document(doc_id: str):
     ```
     """
 )
-async def update_document(doc_id: str, update: DocumentUpdate):
-    success = vector_db.update_document(doc_id, update.content, update.metadata.dict() if update.metadata else None)
+async def update_document(doc_id: str, update: DocumentUpdate, vector_db: VectorDB = Depends(get_vector_db)):
+    success = await run_in_pool(
+        'ingest', vector_db.update_document,
+        doc_id, update.content, update.metadata.dict() if update.metadata else None
+    )
     if not success:
         raise HTTPException(status_code=404, detail="Document not found")
     return {"message": "Document updated successfully"}
@@ -230,8 +306,8 @@ async def update_document(doc_id: str, update: DocumentUpdate):
     3. อัพเดตฐานข้อมูล
     """
 )
-async def delete_document(doc_id: str):
-    success = vector_db.delete_document(doc_id)
+async def delete_document(doc_id: str, vector_db: VectorDB = Depends(get_vector_db)):
+    success = await run_in_pool('ingest', vector_db.delete_document, doc_id)
     if not success:
         raise HTTPException(status_code=404, detail="Document not found")
     return {"message": "Document deleted successfully"}
@@ -245,12 +321,22 @@ async def delete_document(doc_id: str):
     ### พารามิเตอร์:
     - **query**: ข้อความที่ต้องการค้นหา
     - **k**: จำนวนผลลัพธ์ที่ต้องการ (ค่าเริ่มต้น: 3)
+    - **nprobe**: จำนวน cluster ที่ค้นหา เมื่อใช้ index ชนิด ivf/ivfpq (ไม่บังคับ, มากขึ้น = แม่นขึ้นแต่ช้าลง)
+    - **ef_search**: ขนาดรายการผู้สมัคร เมื่อใช้ index ชนิด hnsw (ไม่บังคับ, มากขึ้น = แม่นขึ้นแต่ช้าลง)
+    - **filter**: ค้นหาเฉพาะเอกสารที่ metadata ตรงเงื่อนไข (ไม่บังคับ) ทุกฟิลด์ต้องตรงพร้อมกัน
+      ค่าเดียว เช่น `{"source": "a.pdf"}` หรือหลายค่า เช่น `{"type": {"$in": ["pdf", "docx"]}}`
+      เอกสารจะถูกคัดก่อนค้นหา จึงได้ครบ k รายการถ้ามีเอกสารที่ตรงเงื่อนไขพอ
+    - **mode**: วิธีค้นหา (ไม่บังคับ, ค่าเริ่มต้นจาก SEARCH_MODE)
+      `dense` ค้นด้วยเวกเตอร์, `lexical` ค้นด้วยคำ (BM25), `hybrid` รวมทั้งสองแบบ
+      โหมด hybrid เหมาะกับคำค้นที่มีชื่อเฉพาะ รหัสสินค้า หรือตัวเลข และผลลัพธ์จะมี `ranks` บอกอันดับจากแต่ละวิธี
     
     ### ตัวอย่าง Request:
     ```json
     {
         "query": "วิธีการดูแลต้นไม้",
-        "k": 5
+        "k": 5,
+        "filter": {"type": "pdf"},
+        "mode": "hybrid"
     }
     ```
     
@@ -270,6 +356,124 @@ async def delete_document(doc_id: str):
     ```
     """
 )
-async def search_documents(query: SearchQuery):
-    results = vector_db.search_for_rag(query.query, query.k)
+async def search_documents(query: SearchQuery, vector_db: VectorDB = Depends(get_vector_db)):
+    try:
+        results = await run_in_pool(
+            'search', vector_db.search_for_rag,
+            query.query, query.k, nprobe=query.nprobe, ef_search=query.ef_search, filter=query.filter,
+            mode=query.mode
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     return {"results": results}
+
+@router.post(
+    "/search/batch",
+    summary="ค้นหาเอกสารหลายคำค้นในคำขอเดียว",
+    description="""
+    ## ค้นหาหลายคำค้นพร้อมกัน (เช่น ประเมินผลหรือทำ re-index แบบออฟไลน์)
+
+    พารามิเตอร์เหมือน `/search` แต่ส่ง **queries** เป็นรายการคำค้น (ไม่เกิน `SEARCH_BATCH_MAX_QUERIES` คำ ค่าเริ่มต้น 10000)
+    `k`, `nprobe`, `ef_search`, `filter` และ `mode` ใช้กับทุกคำค้น
+
+    คำค้นจะถูก encode และค้นใน index ครั้งละ `SEARCH_BATCH_SIZE` คำ (ค่าเริ่มต้น 256) แทนการค้นทีละคำ
+    ผลส่งกลับแบบสตรีมเป็น NDJSON (`application/x-ndjson`) หนึ่งบรรทัดต่อคำค้นตามลำดับที่ส่งมา
+    ถ้าเกิดข้อผิดพลาดระหว่างสตรีม บรรทัดสุดท้ายจะเป็น `{"error": "..."}`
+
+    ### ตัวอย่าง Request:
+    ```json
+    {
+        "queries": ["วิธีการดูแลต้นไม้", "โรคใบไหม้ในข้าว"],
+        "k": 5
+    }
+    ```
+
+    ### ผลลัพธ์ (หนึ่งบรรทัดต่อคำค้น):
+    ```
+    {"index": 0, "query": "วิธีการดูแลต้นไม้", "results": [{"id": "...", "text": "...", "metadata": {}, "score": 0.42, "relevance": 0.7}]}
+    {"index": 1, "query": "โรคใบไหม้ในข้าว", "results": [...]}
+    ```
+    """
+)
+async def search_documents_batch(query: BatchSearchQuery, vector_db: VectorDB = Depends(get_vector_db)):
+    if len(query.queries) > SEARCH_BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=400, detail=f"Too many queries (limit {SEARCH_BATCH_MAX_QUERIES})")
+    try:
+        # Validates mode and filter now, so a bad request fails before the stream starts
+        batches = vector_db.search_many(
+            query.queries, query.k, nprobe=query.nprobe, ef_search=query.ef_search, filter=query.filter,
+            mode=query.mode
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    def next_batch():
+        return list(islice(batches, vector_db.search_batch_size))
+
+    async def ndjson():
+        index = 0
+        try:
+            # One pool task per search batch: the worker is free again while the client reads the results
+            while True:
+                batch = await run_in_pool('search', next_batch)
+                if not batch:
+                    break
+                for results in batch:
+                    yield json.dumps({"index": index, "query": query.queries[index], "results": results},
+                                     ensure_ascii=False) + "\n"
+                    index += 1
+        except Exception as e:
+            yield json.dumps({"error": str(e)}, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+@router.post(
+    "/reload",
+    summary="โหลดฐานข้อมูลใหม่จากไฟล์",
+    description="""
+    ## โหลด Vector DB ใหม่จากไฟล์บนดิสก์
+
+    ใช้เมื่อไฟล์ฐานข้อมูลถูกแก้ไขจากภายนอก (เช่น restore จาก backup)
+    การอัปโหลด/แก้ไข/ลบผ่าน API จะเห็นผลทันทีโดยไม่ต้องเรียก endpoint นี้
+    """
+)
+async def reload_db():
+    vector_db = await run_in_pool('ingest', reload_vector_db)
+    return {"message": "Vector DB reloaded", "total": await run_in_pool('search', len, vector_db)}
+
+@router.get(
+    "/cache/stats",
+    summary="สถิติแคชการค้นหา",
+    description="""
+    ## จำนวน hit/miss ของแคช
+
+    - **query_embeddings**: แคชเวกเตอร์ของคำค้น (ไม่ต้อง encode คำค้นซ้ำ)
+    - **search_results**: แคชผลการค้นหา top-k (ล้างอัตโนมัติเมื่อมีการเพิ่ม/แก้ไข/ลบเอกสาร)
+
+    ขนาดและอายุของแคชกำหนดด้วย environment variables
+    `QUERY_EMBEDDING_CACHE_SIZE`, `QUERY_EMBEDDING_CACHE_TTL`, `SEARCH_RESULT_CACHE_SIZE`, `SEARCH_RESULT_CACHE_TTL`
+    """
+)
+async def cache_stats(vector_db: VectorDB = Depends(get_vector_db)):
+    return await run_in_pool('search', vector_db.cache_stats)
+
+@jobs_router.get(
+    "/{job_id}",
+    summary="สถานะงานนำเข้าไฟล์",
+    description="""
+    ## ความคืบหน้าของไฟล์ที่อัปโหลด
+
+    - **stage**: queued / parsing / chunking / embedding / done / failed
+    - **chunks_total**, **chunks_done**: จำนวน chunk ทั้งหมดและที่บันทึกแล้ว
+    - **chunks_per_second**: ความเร็วในการสร้าง embedding
+    - **queue_position**: ลำดับในคิว (เมื่อ stage เป็น queued)
+    - **error**: สาเหตุเมื่อ stage เป็น failed
+
+    งานที่ยังไม่เสร็จจะถูกทำต่อเมื่อเซิร์ฟเวอร์เริ่มใหม่
+    """
+)
+async def get_job(job_id: str):
+    job = get_job_queue().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
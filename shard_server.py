@@ -0,0 +1,129 @@
+"""Shard worker: serves one VectorDB shard over HTTP for Model.Model_Shards.ShardedVectorDB
+
+Run one process per shard, each with its own store folder and port, then
+point the API server at them:
+
+    SHARD_PATH=vector_store/shards/0 SHARD_PORT=8101 python shard_server.py
+    SHARD_PATH=vector_store/shards/1 SHARD_PORT=8102 python shard_server.py
+    VECTOR_SHARDS=http://127.0.0.1:8101,http://127.0.0.1:8102 python app.py
+
+Every endpoint is a JSON POST. It is an internal interface between the
+coordinator and its shards, not part of the public API.
+"""
+import os
+import threading
+from typing import Any, Callable, Dict
+
+from fastapi import Body, FastAPI, HTTPException
+
+from Model.Model_Shards import decode_vector
+from Model.Model_Vector_DB import VectorDB
+from Tools.Tools_document import Document
+
+
+def create_shard_app(open_db: Callable[[], VectorDB]) -> FastAPI:
+    """FastAPI app for one shard; open_db() opens the shard's VectorDB (again on /reload)"""
+    app = FastAPI(title="Vector DB shard", docs_url=None, redoc_url=None, openapi_url=None)
+    changes = threading.local()
+
+    def collect_changes(doc_ids):
+        # replace_source reports changed ids to listeners on the calling thread
+        collected = getattr(changes, 'doc_ids', None)
+        if collected is not None:
+            collected.extend(doc_ids)
+
+    def load():
+        db = open_db()
+        db.add_change_listener(collect_changes)
+        return db
+
+    state = {'db': load()}
+
+    def documents(payload: Dict) -> list:
+        return [Document(page_content=doc['content'], metadata=doc.get('metadata') or {})
+                for doc in payload['documents']]
+
+    @app.post('/search')
+    def search(payload: Dict[str, Any] = Body(...)):
+        vector = payload.get('vector')
+        try:
+            return state['db'].search_for_rag(
+                payload['query'], payload.get('k', 3), nprobe=payload.get('nprobe'),
+                ef_search=payload.get('ef_search'), filter=payload.get('filter'), mode=payload.get('mode'),
+                query_vector=decode_vector(vector) if vector else None
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    @app.post('/search_many')
+    def search_many(payload: Dict[str, Any] = Body(...)):
+        queries, vectors = payload['queries'], payload.get('vectors')
+        try:
+            return list(state['db'].search_many(
+                queries, payload.get('k', 3), nprobe=payload.get('nprobe'), ef_search=payload.get('ef_search'),
+                filter=payload.get('filter'), mode=payload.get('mode'),
+                query_vectors=decode_vector(vectors).reshape(len(queries), -1) if vectors else None
+            ))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    @app.post('/documents')
+    def add_documents(payload: Dict[str, Any] = Body(...)):
+        return state['db'].add_documents(documents(payload), batch_size=payload.get('batch_size', 32),
+                                         skip_existing=payload.get('skip_existing', False))
+
+    @app.post('/replace_source')
+    def replace_source(payload: Dict[str, Any] = Body(...)):
+        changes.doc_ids = []
+        try:
+            removed = state['db'].replace_source(payload['source'], payload['file_hash'], documents(payload))
+            return {'removed': removed, 'changed': changes.doc_ids}
+        finally:
+            changes.doc_ids = None
+
+    @app.post('/delete')
+    def delete_document(payload: Dict[str, Any] = Body(...)):
+        return state['db'].delete_document(payload['id'])
+
+    @app.post('/update')
+    def update_document(payload: Dict[str, Any] = Body(...)):
+        return state['db'].update_document(payload['id'], payload['content'], payload.get('metadata'))
+
+    @app.post('/get')
+    def get_document(payload: Dict[str, Any] = Body(...)):
+        return state['db'].get_document(payload['id'])
+
+    @app.post('/list')
+    def list_documents(payload: Dict[str, Any] = Body(...)):
+        return state['db'].list_documents(payload.get('skip', 0), payload.get('limit', 10))
+
+    @app.post('/count')
+    def count(payload: Dict[str, Any] = Body(default={})):
+        source = payload.get('source')
+        return len(state['db']) if source is None else state['db'].count_source(source)
+
+    @app.post('/find_file')
+    def find_file(payload: Dict[str, Any] = Body(...)):
+        return state['db'].find_file(payload['file_hash'])
+
+    @app.post('/stats')
+    def stats(payload: Dict[str, Any] = Body(default={})):
+        return dict(state['db'].cache_stats(), documents=len(state['db']))
+
+    @app.post('/reload')
+    def reload(payload: Dict[str, Any] = Body(default={})):
+        state['db'] = load()
+        return len(state['db'])
+
+    return app
+
+
+if __name__ == "__main__":
+    import uvicorn
+    from Model.Model_provider import get_encoder
+
+    path = os.environ.get("SHARD_PATH", "vector_store/shards/0")
+    port = int(os.environ.get("SHARD_PORT", 8101))
+    app = create_shard_app(lambda: VectorDB(db_path=path, legacy_db_file=None, encoder=get_encoder()))
+    print(f"Serving shard {path} on port {port}")
+    uvicorn.run(app, host=os.environ.get("SHARD_HOST", "127.0.0.1"), port=port, log_level="warning")